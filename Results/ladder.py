@@ -0,0 +1,112 @@
+#!/usr/bin/python3.8
+# coding=utf-8
+"""Script for estimating the time saved by the epsilon ladder on stored VeriNet benchmark logs.
+
+The bisection order of VeriNet.verify_epsilon_ladder() is replayed using the stored result of each instance.
+Instances implied by a safe result at a larger epsilon or an unsafe result at a smaller epsilon are counted
+as skipped and their stored time as saved. Counter example reuse is not simulated, since the logs do not contain
+the counter examples, so the estimate is conservative.
+
+Keyword arguments:
+-f file [file ...] -- files with VeriNet logs
+"""
+
+import argparse
+import re
+
+
+def read_log(lines):
+    """
+    Reads the results from a VeriNet benchmark log.
+
+    Returns:
+        Dictionary mapping the input number to a dictionary mapping epsilon to (result, time).
+    """
+    results = {}
+    epsilon = None
+
+    for line in lines:
+        if line.startswith("Benchmarking with epsilon ="):
+            epsilon = float(re.findall(r'\d+\.*\d*', line)[0])
+            continue
+        if not line.startswith("Final result of input") or "Skipped" in line:
+            continue
+
+        reged = re.findall(r'\d+\.*\d*', line)
+        if "Unsafe" in line:
+            result = "Unsafe"
+        elif "Safe" in line:
+            result = "Safe"
+        else:
+            result = "Undecided"
+
+        results.setdefault(int(reged[0]), {})[epsilon] = (result, float(reged[-1]))
+
+    return results
+
+
+def ladder_order(eps_results):
+    """
+    Replays the epsilon ladder for one input.
+
+    Returns:
+        List of the epsilons the ladder verifies, in the order they are verified.
+    """
+    epsilons = sorted(eps_results.keys())
+    resolved = set()
+    verified = []
+
+    while True:
+        unresolved = [eps for eps in epsilons if eps not in resolved]
+        if len(unresolved) == 0:
+            return verified
+
+        eps = unresolved[len(unresolved) // 2]
+        verified.append(eps)
+        resolved.add(eps)
+
+        if eps_results[eps][0] == "Safe":
+            resolved.update(smaller for smaller in epsilons if smaller < eps)
+        elif eps_results[eps][0] == "Unsafe":
+            resolved.update(larger for larger in epsilons if larger > eps)
+
+
+def parse_args():
+    """
+    Function parses arguments from command line.
+    """
+    parser = argparse.ArgumentParser(description='Estimates the time saved by the epsilon ladder.')
+    parser.add_argument('-f', '--filenames', dest='filenames', metavar='f', type=argparse.FileType('r'), nargs='+',
+                        help='Names of input files')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.filenames is None:
+        print("No file has been choosen")
+        exit(-1)
+
+    for file in args.filenames:
+        results = read_log(file.readlines())
+
+        total_time = 0
+        ladder_time = 0
+        skipped = {}
+        num_instances = 0
+
+        for eps_results in results.values():
+            total_time += sum(time_spent for _, time_spent in eps_results.values())
+            num_instances += len(eps_results)
+            verified = ladder_order(eps_results)
+            ladder_time += sum(eps_results[eps][1] for eps in verified)
+            for eps in eps_results:
+                if eps not in verified:
+                    skipped[eps] = skipped.get(eps, 0) + 1
+
+        saved = total_time - ladder_time
+        print(f"{file.name}:")
+        print(f"    Instances: {num_instances}, skipped: {sum(skipped.values())}, "
+              f"skipped per epsilon: {dict(sorted(skipped.items()))}")
+        print(f"    Time without ladder: {total_time:.2f} s, with ladder: {ladder_time:.2f} s, "
+              f"saved: {saved:.2f} s ({100 * saved / total_time if total_time > 0 else 0:.1f} %)")
@@ -6,13 +6,13 @@ Taken by: David Hudák
 """
 
 
-import os
-
-from src.scripts.benchmark import run_benchmark
+from src.scripts.benchmark import run_benchmark, parse_benchmark_args, strategy_result_path
 from src.data_loader.input_data_loader import load_mnist_human_readable
 import numpy as np
 
 if __name__ == "__main__":
+    args = parse_benchmark_args(memory=5)
+
     # 1, 2, 5, 10, 15 -- missing epsilons
     epsilons = [ 5, 10, 15] 
     timeout = 3600
@@ -20,13 +20,13 @@ if __name__ == "__main__":
     num_images = 100
     img_dir: str = f"./data/mnist_neurify/test_images_100/"
 
-    if not os.path.isdir("./benchmark_results"):
-        os.mkdir("./benchmark_results")
-
     run_benchmark(images=load_mnist_human_readable(img_dir, list(range(num_images))).reshape(num_images, -1),
                   epsilons=epsilons,
                   timeout=timeout,
                   conv=False,
                   model_path="./data/marabou/mnist6x256.nnet",
-                  result_path=f"./benchmark_results/mnist_{num_images}_imgs_6x256_relu.txt",
-                  memory=5)
+                  result_path=strategy_result_path("./benchmark_results", f"mnist_{num_images}_imgs_6x256_relu.txt",
+                                                   args.strategy, args.memory),
+                  memory=args.memory,
+                  strategy=args.strategy,
+                  max_procs=args.max_procs)
@@ -6,11 +6,9 @@ https://github.com/eth-sri/eran
 Author: Patrick Henriksen <patrick@henriksen.as>
 """
 
-import os
-
 import numpy as np
 
-from src.scripts.benchmark import run_benchmark
+from src.scripts.benchmark import run_benchmark, parse_benchmark_args, strategy_result_path
 from src.util.logger import get_logger
 from src.util.config import *
 
@@ -40,13 +38,12 @@ def load_images() -> tuple:
 
 
 if __name__ == "__main__":
+    args = parse_benchmark_args(memory=1)
+
 	#  0.005, 0.01, 0.015,
     epsilons = [ 0.02, 0.025, 0.03 ]
     timeout = 1200
 
-    if not os.path.isdir("./benchmark_results"):
-        os.mkdir("./benchmark_results")
-
     images, targets = load_images()
     images = images/255
 
@@ -55,6 +52,9 @@ if __name__ == "__main__":
                   timeout=timeout,
                   conv=False,
                   model_path="./data/models_nnet/ffnnSIGMOID__PGDK_w_0.1_6_500.nnet",
-                  result_path=f"./benchmark_results/mnist_sigmoid.txt",
+                  result_path=strategy_result_path("./benchmark_results", f"mnist_sigmoid.txt",
+                                                   args.strategy, args.memory),
                   targets=targets,
-                  memory=1)
+                  memory=args.memory,
+                  strategy=args.strategy,
+                  max_procs=args.max_procs)
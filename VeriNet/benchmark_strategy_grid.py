@@ -0,0 +1,70 @@
+"""
+Script for running a grid of benchmarks over the branching strategies.
+
+Each benchmark script is run once for every strategy, and once for every memory size for the memory based
+strategies, using the --strategy, --memory and --max-procs arguments of the benchmark scripts. The runs are
+independent processes, so up to --jobs runs are executed in parallel. The results of each run are stored in the
+strategy subdirectories of ./benchmark_results, see strategy_result_path(), and the output of each run in
+./benchmark_results/grid_logs.
+
+Example, run from this folder:
+
+$ python benchmark_strategy_grid.py --benchmarks benchmark_mnist48.py benchmark_mnist10x10.py --jobs 2
+"""
+
+import os
+import sys
+import argparse
+import subprocess
+import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor
+
+from src.algorithm.strategist import STRATEGY_NAMES, MEMORY_STRATEGIES
+
+
+def run_config(benchmark: str, strategy: str, memory: int, max_procs: int, log_dir: str) -> int:
+
+    """
+    Runs one benchmark script with the given strategy.
+
+    Returns:
+        The return code of the benchmark process
+    """
+
+    env = dict(os.environ, CUDA_DEVICE_ORDER="PCI_BUS_ID", CUDA_VISIBLE_DEVICES="", OMP_NUM_THREADS="1")
+    command = [sys.executable, benchmark, "--strategy", strategy, "--memory", str(memory),
+               "--max-procs", str(max_procs)]
+    name = os.path.splitext(os.path.basename(benchmark))[0]
+    log_path = os.path.join(log_dir, f"{name}_{strategy}_memory_{memory}.log")
+
+    with open(log_path, "w") as log:
+        return subprocess.run(command, stdout=log, stderr=subprocess.STDOUT, env=env).returncode
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--benchmarks", nargs="+", default=["benchmark_mnist48.py"],
+                        help="The benchmark scripts to run")
+    parser.add_argument("--strategies", nargs="+", choices=list(STRATEGY_NAMES), default=list(STRATEGY_NAMES),
+                        help="The branching strategies")
+    parser.add_argument("--memories", nargs="+", type=int, default=[10, 20],
+                        help="The memory sizes used for the memory based strategies")
+    parser.add_argument("--jobs", type=int, default=1, help="The number of benchmarks run in parallel")
+    args = parser.parse_args()
+
+    log_dir = "./benchmark_results/grid_logs"
+    os.makedirs(log_dir, exist_ok=True)
+    max_procs = max(mp.cpu_count() // args.jobs, 1)
+
+    configs = [(benchmark, strategy, memory)
+               for benchmark in args.benchmarks
+               for strategy in args.strategies
+               for memory in (args.memories if strategy in MEMORY_STRATEGIES else [1])]
+
+    with ThreadPoolExecutor(args.jobs) as executor:
+        return_codes = list(executor.map(lambda config: run_config(*config, max_procs, log_dir), configs))
+
+    for (benchmark, strategy, memory), return_code in zip(configs, return_codes):
+        status = "finished" if return_code == 0 else f"failed with return code {return_code}"
+        print(f"{benchmark}, strategy: {strategy}, memory: {memory}: {status}")
@@ -0,0 +1,187 @@
+"""
+This file contains the batched projected gradient descent (PGD) search for counter examples.
+
+All restarts are stacked into one batch, so each iteration is a single forward and backward pass through the network,
+and the loss of the verification objective targets all potential counter classes at once.
+"""
+
+import time
+from collections import deque
+from typing import Optional
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from src.algorithm.esip import ESIP
+from src.algorithm.verification_objectives import VerificationObjective
+
+
+class PGDAttack:
+
+    """
+    Searches for counter examples with batched projected gradient descent.
+
+    The batch contains the given start points, for example the LP solution of a branch, the previously found
+    counter examples projected to the input bounds and num_restarts uniformly random points in the input bounds. Each
+    iteration takes a signed gradient step of step_size times the width of the input bounds and projects the points
+    back to the bounds.
+    """
+
+    def __init__(self, model: nn, num_restarts: int = 16, max_iters: int = 10, step_size: float = 0.1,
+                 memory_size: int = 8, seed: int = 0):
+
+        """
+        Args:
+            model           : The torch neural network, has to implement the attribute logits.
+            num_restarts    : The number of random start points.
+            max_iters       : The number of gradient steps.
+            step_size       : The step size relative to the width of the input bounds.
+            memory_size     : The number of previously found counter examples used as start points.
+            seed            : The seed of the random start points.
+        """
+
+        self._model = model
+        self._num_restarts = num_restarts
+        self._max_iters = max_iters
+        self._step_size = step_size
+        self._memory = deque(maxlen=memory_size)
+        self._generator = torch.Generator().manual_seed(seed)
+
+        self.forward_passes = 0
+
+    def remember(self, counter_example: np.array):
+
+        """
+        Stores a counter example, used as start point in later runs.
+
+        Args:
+            counter_example: The counter example
+        """
+
+        if self._memory.maxlen > 0:
+            self._memory.append(torch.Tensor(np.array(counter_example, dtype=np.float32)).reshape(-1))
+
+    def falsify(self, objective: VerificationObjective, time_budget: float,
+                num_samples: int = 1024) -> Optional[np.array]:
+
+        """
+        Searches for a counter example before any bounds are calculated.
+
+        num_samples random points are checked first, then the attack is repeated with new random restarts until a
+        counter example is found or the time budget is used.
+
+        Args:
+            objective   : The VerificationObjective, has to implement attack_losses().
+            time_budget : The maximum number of seconds used.
+            num_samples : The number of random samples checked before the attack.
+        Returns:
+            The counter example with shape (1, *input_shape) if found, else None.
+        """
+
+        deadline = time.time() + time_budget
+        counter_example = self.sample(objective, num_samples)
+
+        while counter_example is None and time.time() < deadline:
+            counter_example = self.run(objective, deadline=deadline)
+
+        return counter_example
+
+    def sample(self, objective: VerificationObjective, num_samples: int) -> Optional[np.array]:
+
+        """
+        Checks uniformly random points in the input bounds in one batch.
+
+        Args:
+            objective   : The VerificationObjective
+            num_samples : The number of random points
+        Returns:
+            The counter example with shape (1, *input_shape) if found, else None.
+        """
+
+        if num_samples <= 0:
+            return None
+
+        input_bounds = torch.Tensor(objective.input_bounds_flat)
+        lower, upper = input_bounds[:, 0], input_bounds[:, 1]
+        x = lower + torch.rand((num_samples, lower.shape[0]), generator=self._generator) * (upper - lower)
+
+        with torch.no_grad():
+            y = self._get_logits(x.view(num_samples, *objective.input_shape))
+
+        return self._first_counter_example(objective, x, y)
+
+    def run(self, objective: VerificationObjective, bounds: Optional[ESIP] = None, starts: Optional[list] = None,
+            deadline: Optional[float] = None) -> Optional[np.array]:
+
+        """
+        Runs the attack.
+
+        Args:
+            objective   : The VerificationObjective, has to implement attack_losses().
+            bounds      : The ESIP object used by the objective to select the potential counter classes. If None,
+                          all classes are targeted.
+            starts      : A list of additional start points, for example the LP solution.
+            deadline    : If given, no more iterations are started after this time.
+        Returns:
+            The counter example with shape (1, *input_shape) if found, else None.
+        """
+
+        input_bounds = torch.Tensor(objective.input_bounds_flat)
+        lower, upper = input_bounds[:, 0], input_bounds[:, 1]
+
+        points = [torch.Tensor(np.array(start, dtype=np.float32)).reshape(-1) for start in (starts or [])]
+        points += list(self._memory)
+        x = torch.stack(points) if len(points) > 0 else torch.zeros((0, lower.shape[0]))
+        x = torch.min(torch.max(x, lower), upper)
+
+        random_points = torch.rand((self._num_restarts, lower.shape[0]), generator=self._generator)
+        x = torch.cat((x, lower + random_points * (upper - lower)))
+
+        step = self._step_size * (upper - lower)
+
+        for i in range(self._max_iters + 1):
+
+            x.requires_grad = True
+            y = self._get_logits(x.view(x.shape[0], *objective.input_shape))
+
+            counter_example = self._first_counter_example(objective, x, y)
+            if counter_example is not None:
+                return counter_example
+
+            if i == self._max_iters or (deadline is not None and time.time() >= deadline):
+                break
+
+            losses = objective.attack_losses(y, bounds)
+            grad, = torch.autograd.grad(losses.sum(), x)
+            x = torch.min(torch.max(x.detach() - step * grad.sign(), lower), upper)
+
+        return None
+
+    def _first_counter_example(self, objective: VerificationObjective, x: torch.Tensor,
+                               y: torch.Tensor) -> Optional[np.array]:
+
+        """
+        Returns the first input in the batch x that is a counter example, or None. The counter example is remembered.
+        """
+
+        found = np.argwhere(objective.counter_examples(y.detach().numpy()))[:, 0]
+        if len(found) == 0:
+            return None
+
+        counter_example = x[found[0]].detach().numpy().reshape(1, *objective.input_shape)
+        self.remember(counter_example)
+
+        return counter_example
+
+    def _get_logits(self, x: torch.Tensor) -> torch.Tensor:
+
+        """
+        Returns the logits of the model for the batch x.
+        """
+
+        self._model(x)
+        self.forward_passes += 1
+        logits = self._model.logits
+
+        return logits if len(logits.shape) > 1 else logits.unsqueeze(0)
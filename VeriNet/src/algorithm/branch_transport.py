@@ -0,0 +1,350 @@
+"""
+Transports used for sending branches between the VeriNet worker processes.
+
+Two transports are implemented:
+
+    ManagerBranchQueue      : Pickles the full Branch object, including the forced input bounds, and sends it
+                              through a mp.Manager().Queue().
+    SharedMemoryBranchQueue : Encodes the branch in a compact binary format (depth, priority, split list, LP
+                              tightened bounds, safe classes and strategy state) and writes it into a slot of a
+                              shared memory buffer. Only the slot index is sent through a queue and the receiving
+                              worker rebuilds the forced input bounds from the split list and tightened bounds.
+
+Both transports record the number of branches sent, the number of bytes and the time spent encoding and decoding.
+"""
+
+import time
+import queue
+import pickle
+import struct
+
+import multiprocessing as mp
+import numpy as np
+
+from src.algorithm.verinet_util import Branch
+from src.algorithm.splitmans import Splitmans
+
+_SPLIT_DTYPE = np.dtype([("layer", "<i4"), ("node", "<i4"), ("split_x", "<f8"), ("upper", "u1")])
+_TIGHTENED_DTYPE = np.dtype([("layer", "<i4"), ("node", "<i4"), ("lower", "<f8"), ("upper", "<f8")])
+_HEADER = struct.Struct("<iiiiid")
+_SPLITMANS_HEADER = struct.Struct("<iiii")
+
+
+def encode_branch(branch: Branch) -> bytes:
+
+    """
+    Encodes the branch in a compact binary format.
+
+    The forced input bounds and LPSolver constraints are not encoded, the forced bounds can be recreated from the
+    split list and tightened bounds using ESIP.forced_bounds_from_split_list().
+
+    Args:
+        branch  : The branch
+    Returns:
+        The encoded branch
+    """
+
+    splits = np.zeros(len(branch.split_list), dtype=_SPLIT_DTYPE)
+    for i, split in enumerate(branch.split_list):
+        splits[i] = (split["layer"], split["node"], split["split_x"], split["upper"])
+
+    tightened = np.array([tuple(bounds) for bounds in branch.tightened_bounds], dtype=_TIGHTENED_DTYPE)
+    safe_classes = np.array(branch.safe_classes, dtype="<i4")
+    splitmans = branch.splitmans
+
+    # The priority used by the best-first frontiers is encoded as NaN if not set
+    priority = np.nan if branch.priority is None else branch.priority
+
+    data = [_HEADER.pack(branch.depth, splits.shape[0], tightened.shape[0], safe_classes.shape[0],
+                         splitmans is not None, priority),
+            splits.tobytes(),
+            tightened.tobytes(),
+            safe_classes.tobytes()]
+
+    if splitmans is not None:
+        memory = splitmans.memory
+        memory_rows = -1 if memory is None else memory.reshape(-1, 2).shape[0]
+        data.append(_SPLITMANS_HEADER.pack(splitmans.index, splitmans.memory_size, splitmans.layer, memory_rows))
+        if memory_rows > 0:
+            data.append(memory.astype("<i8").tobytes())
+
+    return b"".join(data)
+
+
+def decode_branch(data: bytes) -> Branch:
+
+    """
+    Decodes a branch encoded by encode_branch().
+
+    Args:
+        data    : The encoded branch
+    Returns:
+        The branch with forced_input_bounds set to None
+    """
+
+    offset = 0
+    depth, num_splits, num_tightened, num_safe_classes, has_splitmans, priority = _HEADER.unpack_from(data, offset)
+    offset += _HEADER.size
+
+    splits = np.frombuffer(data, dtype=_SPLIT_DTYPE, count=num_splits, offset=offset)
+    offset += splits.nbytes
+    split_list = [{"layer": int(split["layer"]), "node": int(split["node"]), "split_x": float(split["split_x"]),
+                   "upper": bool(split["upper"])} for split in splits]
+
+    tightened = np.frombuffer(data, dtype=_TIGHTENED_DTYPE, count=num_tightened, offset=offset)
+    offset += tightened.nbytes
+
+    safe_classes = np.frombuffer(data, dtype="<i4", count=num_safe_classes, offset=offset)
+    offset += safe_classes.nbytes
+
+    splitmans = None
+    if has_splitmans:
+        index, memory_size, layer, memory_rows = _SPLITMANS_HEADER.unpack_from(data, offset)
+        offset += _SPLITMANS_HEADER.size
+
+        if memory_rows > 0:
+            memory = np.frombuffer(data, dtype="<i8", count=2 * memory_rows, offset=offset).reshape(-1, 2)
+        else:
+            memory = np.empty((0,), dtype=int)
+
+        splitmans = Splitmans(start_index=index, memory_size=memory_size, memory=memory, layer=layer)
+        if memory_rows < 0:
+            splitmans.set_memory(None)
+
+    branch = Branch(depth, None, split_list, splitmans)
+    branch.safe_classes = [int(safe_class) for safe_class in safe_classes]
+    branch.priority = None if np.isnan(priority) else priority
+    branch.tightened_bounds = [(int(bounds["layer"]), int(bounds["node"]), float(bounds["lower"]),
+                                float(bounds["upper"])) for bounds in tightened]
+
+    return branch
+
+
+class BranchQueue:
+
+    """
+    Abstract class for the transports used to send branches between processes.
+
+    None can be put into the queue and is received as None, this is used as a poison pill for the workers. Each
+    message is tagged with the id of the verification job, so that branches left over from a finished job can be
+    recognised and dropped by the receiver.
+    """
+
+    def __init__(self):
+
+        # branches, bytes, encode seconds, decode seconds
+        self._stats = mp.Array("d", 4)
+
+    @property
+    def name(self) -> str:
+        raise NotImplementedError("name not implemented in subclass")
+
+    @property
+    def stats(self) -> dict:
+
+        """
+        Returns a dictionary with the number of branches sent, the number of bytes sent, the time spent encoding and
+        decoding branches and the resulting branch throughput.
+        """
+
+        with self._stats.get_lock():
+            branches, num_bytes, encode_time, decode_time = self._stats[:]
+
+        transport_time = encode_time + decode_time
+
+        return {"transport": self.name,
+                "branches": int(branches),
+                "bytes": int(num_bytes),
+                "encode_seconds": encode_time,
+                "decode_seconds": decode_time,
+                "branches_per_second": branches / transport_time if transport_time > 0 else 0.}
+
+    def reset_stats(self):
+
+        """
+        Resets the statistics.
+        """
+
+        with self._stats.get_lock():
+            self._stats[:] = [0, 0, 0, 0]
+
+    def _add_stats(self, branches: int = 0, num_bytes: int = 0, encode_time: float = 0, decode_time: float = 0):
+
+        with self._stats.get_lock():
+            self._stats[0] += branches
+            self._stats[1] += num_bytes
+            self._stats[2] += encode_time
+            self._stats[3] += decode_time
+
+    def put(self, branch: Branch, job_id: int = 0):
+
+        """
+        Puts the branch into the queue.
+
+        Args:
+            branch  : The branch, or None
+            job_id  : The id of the verification job the branch belongs to
+        """
+
+        raise NotImplementedError("put() not implemented in subclass")
+
+    def get(self) -> tuple:
+
+        """
+        Removes a branch from the queue, blocking until one is available.
+
+        Returns:
+            The tuple (job_id, branch)
+        """
+
+        raise NotImplementedError("get() not implemented in subclass")
+
+
+class ManagerBranchQueue(BranchQueue):
+
+    """
+    Sends pickled branches through a mp.Manager().Queue().
+    """
+
+    def __init__(self, manager: mp.Manager):
+
+        """
+        Args:
+            manager : The multiprocessing manager used to create the queue
+        """
+
+        super().__init__()
+        self._queue = manager.Queue()
+
+    @property
+    def name(self) -> str:
+        return "manager"
+
+    def put(self, branch: Branch, job_id: int = 0):
+
+        if branch is None:
+            self._queue.put((job_id, None))
+            return
+
+        start = time.perf_counter()
+        data = pickle.dumps(branch, protocol=pickle.HIGHEST_PROTOCOL)
+        self._queue.put((job_id, data))
+        self._add_stats(branches=1, num_bytes=len(data), encode_time=time.perf_counter() - start)
+
+    def get(self) -> tuple:
+
+        job_id, data = self._queue.get()
+
+        if data is None:
+            return job_id, None
+
+        start = time.perf_counter()
+        branch = pickle.loads(data)
+        self._add_stats(decode_time=time.perf_counter() - start)
+
+        return job_id, branch
+
+
+class SharedMemoryBranchQueue(BranchQueue):
+
+    """
+    Sends encoded branches through slots in a shared memory buffer.
+
+    The free slots and the slots ready for reading are kept in two queues, which only carry the slot indices. If no
+    slot is free, or the encoded branch is larger than the slot size, the encoded branch is sent through the queue
+    instead.
+
+    The buffer is shared through inheritance, so the queue has to be created before the worker processes are
+    started.
+    """
+
+    def __init__(self, num_slots: int = 64, slot_size: int = 2 ** 14):
+
+        """
+        Args:
+            num_slots   : The number of slots in the shared memory buffer
+            slot_size   : The size of each slot in bytes
+        """
+
+        super().__init__()
+
+        self._num_slots = num_slots
+        self._slot_size = slot_size
+
+        self._buffer = mp.RawArray("B", num_slots * slot_size)
+        self._free_slots = mp.Queue()
+        self._ready = mp.Queue()
+
+        for slot in range(num_slots):
+            self._free_slots.put(slot)
+
+    @property
+    def name(self) -> str:
+        return "shared_memory"
+
+    def put(self, branch: Branch, job_id: int = 0):
+
+        if branch is None:
+            self._ready.put((job_id, None))
+            return
+
+        start = time.perf_counter()
+        data = encode_branch(branch)
+
+        slot = None
+        if len(data) <= self._slot_size:
+            try:
+                slot = self._free_slots.get_nowait()
+            except queue.Empty:
+                pass
+
+        if slot is None:
+            self._ready.put((job_id, data))
+        else:
+            offset = slot * self._slot_size
+            memoryview(self._buffer).cast("B")[offset:offset + len(data)] = data
+            self._ready.put((job_id, (slot, len(data))))
+
+        self._add_stats(branches=1, num_bytes=len(data), encode_time=time.perf_counter() - start)
+
+    def get(self) -> tuple:
+
+        job_id, item = self._ready.get()
+
+        if item is None:
+            return job_id, None
+
+        start = time.perf_counter()
+
+        if isinstance(item, bytes):
+            data = item
+        else:
+            slot, size = item
+            offset = slot * self._slot_size
+            data = bytes(memoryview(self._buffer).cast("B")[offset:offset + size])
+            self._free_slots.put(slot)
+
+        branch = decode_branch(data)
+        self._add_stats(decode_time=time.perf_counter() - start)
+
+        return job_id, branch
+
+
+def create_branch_queue(transport: str, manager: mp.Manager = None) -> BranchQueue:
+
+    """
+    Creates the branch queue for the given transport.
+
+    Args:
+        transport   : "shared_memory" or "manager"
+        manager     : The multiprocessing manager, only used by the "manager" transport
+    Returns:
+        The BranchQueue
+    """
+
+    if transport == "shared_memory":
+        return SharedMemoryBranchQueue()
+    elif transport == "manager":
+        return ManagerBranchQueue(manager if manager is not None else mp.Manager())
+    else:
+        raise ValueError(f"Unknown branch transport: {transport}")
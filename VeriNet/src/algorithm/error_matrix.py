@@ -0,0 +1,158 @@
+"""
+A factored representation of the ESIP error matrices after non-linear layers.
+
+After a non-linear layer, the error matrix consists of the old errors scaled by the lower relaxation,
+a_low * E_prev, followed by a block with exactly one non-zero value in each column (the new errors introduced by
+the relaxation). Rows with a_low = 0, for example inactive ReLU nodes, are zero in the first block. The factored
+matrix only stores the non-zero rows of the first block and the diagonal values of the second block.
+
+The next fully-connected layer is propagated as W[:, rows] @ old_block | W[:, err_idx] * max_err, which avoids
+the multiplications with the zero rows and the identity-like block.
+"""
+
+import numpy as np
+
+from src.algorithm import esip_util
+from src.algorithm.mappings.abstract_mapping import AbstractMapping
+from src.algorithm.mappings.layers import FC
+
+
+class FactoredErrorMatrix:
+
+    """
+    The error matrix [a_low * E_prev | D], where D has the values max_err in the rows err_idx of its columns.
+    """
+
+    def __init__(self, layer_size: int, rows: np.array, old_block: np.array, num_old_err: int, err_idx: np.array,
+                 max_err: np.array):
+
+        """
+        Args:
+            layer_size  : The number of nodes in the layer
+            rows        : The indices of the non-zero rows of the old error block
+            old_block   : A len(rows) x num_old_err array with the non-zero rows of the old error block
+            num_old_err : The number of columns in the old error block
+            err_idx     : The row indices of the new errors, one for each column of the new error block
+            max_err     : The values of the new errors
+        """
+
+        self.layer_size = layer_size
+        self.rows = rows
+        self.old_block = old_block
+        self.num_old_err = num_old_err
+        self.err_idx = err_idx
+        self.max_err = max_err.astype(np.float32)
+
+    @property
+    def shape(self) -> tuple:
+        return self.layer_size, self.num_old_err + self.err_idx.shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return self.rows.nbytes + self.old_block.nbytes + self.err_idx.nbytes + self.max_err.nbytes
+
+    @classmethod
+    def from_relaxation(cls, error_matrix, a_low: np.array, err_idx: np.array, max_err: np.array):
+
+        """
+        Creates the error matrix for a non-linear layer.
+
+        Args:
+            error_matrix    : The error matrix of the previous layer, dense or factored
+            a_low           : The slopes of the lower relaxations
+            err_idx         : The indices of the nodes with non-zero relaxation errors
+            max_err         : The relaxation errors of the nodes in err_idx
+        Returns:
+            The FactoredErrorMatrix
+        """
+
+        error_matrix = to_dense(error_matrix)
+        num_old_err = error_matrix.shape[1]
+
+        if num_old_err > 0:
+            rows = np.argwhere(a_low != 0)[:, 0]
+            old_block = np.empty((rows.shape[0], num_old_err), dtype=np.float32)
+            old_block[:] = a_low[rows, np.newaxis] * error_matrix[rows]
+        else:
+            rows = np.zeros(0, dtype=int)
+            old_block = np.zeros((0, 0), dtype=np.float32)
+
+        return cls(error_matrix.shape[0], rows, old_block, num_old_err, err_idx, max_err)
+
+    def toarray(self) -> np.array:
+
+        """
+        Returns the dense error matrix.
+        """
+
+        dense = np.zeros(self.shape, dtype=np.float32)
+        dense[self.rows, :self.num_old_err] = self.old_block
+        dense[self.err_idx, self.num_old_err + np.arange(self.err_idx.shape[0])] = self.max_err
+
+        return dense
+
+    def propagate(self, mapping: AbstractMapping) -> np.array:
+
+        """
+        Propagates the error matrix through a linear mapping.
+
+        Args:
+            mapping     : The linear mapping
+        Returns:
+            The dense error matrix after the mapping
+        """
+
+        if not isinstance(mapping, FC):
+            return mapping.propagate(self.toarray(), add_bias=False)
+
+        weight = mapping.params["weight"]
+        result = np.empty((weight.shape[0], self.shape[1]), dtype=np.result_type(weight.dtype, np.float32))
+
+        if self.num_old_err > 0:
+            result[:, :self.num_old_err] = weight[:, self.rows] @ self.old_block
+        result[:, self.num_old_err:] = weight[:, self.err_idx] * self.max_err
+
+        return result
+
+    def sum_error(self) -> np.array:
+
+        """
+        Calculates the lower and upper error for each node, see esip_util.sum_error().
+        """
+
+        errors = np.zeros((self.layer_size, 2))
+
+        if self.rows.shape[0] > 0:
+            errors[self.rows] = esip_util.sum_error(self.old_block)
+
+        negative = self.max_err < 0
+        errors[self.err_idx[negative], 0] += self.max_err[negative]
+        errors[self.err_idx[~negative], 1] += self.max_err[~negative]
+
+        return errors
+
+
+def to_dense(error_matrix) -> np.array:
+
+    """
+    Returns the error matrix as a dense np.array.
+
+    Args:
+        error_matrix    : A dense or factored error matrix
+    """
+
+    return error_matrix.toarray() if isinstance(error_matrix, FactoredErrorMatrix) else error_matrix
+
+
+def sum_error(error_matrix) -> np.array:
+
+    """
+    Calculates the lower and upper error for each node of a dense or factored error matrix.
+
+    Args:
+        error_matrix    : A dense or factored error matrix
+    """
+
+    if isinstance(error_matrix, FactoredErrorMatrix):
+        return error_matrix.sum_error()
+    return esip_util.sum_error(error_matrix)
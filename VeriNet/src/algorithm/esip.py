@@ -10,6 +10,7 @@ Brightness and Contrast constraints.
 Author: Patrick Henriksen <patrick@henriksen.as>
 """
 
+from collections import OrderedDict
 from typing import Optional
 
 import torch
@@ -18,7 +19,8 @@ import numpy as np
 
 from src.algorithm.mappings.abstract_mapping import AbstractMapping
 from src.neural_networks.verinet_nn import VeriNetNN
-from src.algorithm.esip_util import concretise_symbolic_bounds_jit, sum_error_jit
+from src.algorithm.esip_util import concretise_symbolic_bounds, weighted_error_top_k_jit
+from src.algorithm.error_matrix import FactoredErrorMatrix, sum_error, to_dense
 
 
 class ESIP:
@@ -29,7 +31,9 @@ class ESIP:
 
     def __init__(self,
                  model: VeriNetNN,
-                 input_shape):
+                 input_shape,
+                 error_matrix_backend: str = "dense",
+                 snapshot_cache_size: int = 2**26):
 
         """
         Args:
@@ -37,10 +41,24 @@ class ESIP:
             model                       : The VeriNetNN neural network as defined in src/neural_networks/verinet_nn.py
             input_shape                 : The shape of the input, (input_size,) for 1D input or
                                           (channels, height, width) for 2D.
+            error_matrix_backend        : "dense" or "factored". With "factored", the error matrices after non-linear
+                                          layers are stored as FactoredErrorMatrix objects, see error_matrix.py. The
+                                          error matrix of the last layer is always dense.
+            snapshot_cache_size         : The maximum number of bytes used by the layer snapshots, see
+                                          save_snapshot(). If 0, no snapshots are stored.
         """
 
+        if error_matrix_backend not in ("dense", "factored"):
+            raise ValueError(f"Unknown error matrix backend: {error_matrix_backend}")
+
         self._model = model
         self._input_shape = input_shape
+        self._error_matrix_backend = error_matrix_backend
+
+        self._snapshot_cache_size = snapshot_cache_size
+        self._snapshots = OrderedDict()
+        self._snapshots_nbytes = 0
+        self._snapshot_stats = {"hits": 0, "misses": 0, "evictions": 0}
 
         self._mappings = None
         self._layer_sizes = None
@@ -56,9 +74,16 @@ class ESIP:
         self._relaxations: Optional[list] = None
         self._forced_input_bounds: Optional[list] = None
 
+        # (final error matrix, output weights, weighted error) of the last call to weighted_error()
+        self._weighted_error_cache: Optional[tuple] = None
+
         self._read_mappings_from_torch_model(model)
         self._init_datastructure()
 
+    @property
+    def input_shape(self):
+        return self._input_shape
+
     @property
     def layer_sizes(self):
         return self._layer_sizes
@@ -106,8 +131,32 @@ class ESIP:
 
     @property
     def error_matrix(self):
+
+        """
+        The error matrices of the layers.
+
+        With the "factored" backend, the matrices of hidden non-linear layers are FactoredErrorMatrix objects, while
+        the matrix of the last layer is always a dense np.array.
+        """
+
         return self._error_matrix
 
+    @property
+    def error_matrix_backend(self) -> str:
+        return self._error_matrix_backend
+
+    @property
+    def snapshot_stats(self) -> dict:
+
+        """
+        The number of snapshot hits, misses and evictions since the last call to reset_snapshot_stats().
+        """
+
+        return self._snapshot_stats
+
+    def reset_snapshot_stats(self):
+        self._snapshot_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
     def reset_datastruct(self):
 
         """
@@ -115,6 +164,84 @@ class ESIP:
         """
 
         self._init_datastructure()
+        self.clear_snapshots()
+
+    def save_snapshot(self, key, num_layers: int, state: tuple = None):
+
+        """
+        Stores the state of the first num_layers layers, so they can be restored by restore_snapshot().
+
+        The calculated arrays are never modified in place, so the snapshot only keeps references to them. The least
+        recently used snapshots are evicted when the snapshots use more than snapshot_cache_size bytes.
+
+        Args:
+            key         : A hashable key identifying the snapshot.
+            num_layers  : The number of layers to store, starting at the input layer.
+            state       : The state to store, as returned by calc_bounds_batch(). If None, the current state is
+                          stored.
+        """
+
+        if self._snapshot_cache_size <= 0:
+            return
+
+        self.discard_snapshot(key)
+
+        state = tuple(layer_list[:num_layers] for layer_list in (self._get_state() if state is None else state))
+
+        unique_arrays = {id(arr): arr for layer_arrays in state for arr in layer_arrays if arr is not None}
+        nbytes = sum(arr.nbytes for arr in unique_arrays.values())
+
+        self._snapshots[key] = (state, nbytes)
+        self._snapshots_nbytes += nbytes
+
+        while self._snapshots_nbytes > self._snapshot_cache_size and len(self._snapshots) > 0:
+            _, (_, evicted_nbytes) = self._snapshots.popitem(last=False)
+            self._snapshots_nbytes -= evicted_nbytes
+            self._snapshot_stats["evictions"] += 1
+
+    def restore_snapshot(self, key) -> Optional[int]:
+
+        """
+        Restores and removes the snapshot stored with the given key.
+
+        Layers after the restored layers are not modified and have to be recalculated with calc_bounds().
+
+        Args:
+            key         : The key of the snapshot.
+        Returns:
+            The number of restored layers, or None if the snapshot was not found.
+        """
+
+        if self._snapshot_cache_size <= 0:
+            return None
+
+        if key not in self._snapshots:
+            self._snapshot_stats["misses"] += 1
+            return None
+
+        state, nbytes = self._snapshots.pop(key)
+        self._snapshots_nbytes -= nbytes
+        self._snapshot_stats["hits"] += 1
+
+        num_layers = len(state[0])
+        for current, stored in zip(self._get_state(), state):
+            current[:num_layers] = stored
+
+        return num_layers
+
+    def discard_snapshot(self, key):
+
+        """
+        Removes the snapshot stored with the given key, if any.
+        """
+
+        if key in self._snapshots:
+            _, nbytes = self._snapshots.pop(key)
+            self._snapshots_nbytes -= nbytes
+
+    def clear_snapshots(self):
+        self._snapshots.clear()
+        self._snapshots_nbytes = 0
 
     def calc_bounds(self, input_constraints: np.array, from_layer: int=1) -> bool:
 
@@ -139,6 +266,78 @@ class ESIP:
         assert from_layer >= 1, "From layer should be >= 1"
         assert isinstance(input_constraints, np.ndarray), "input_constraints should be a np array"
 
+        self._init_calc_bounds(input_constraints, from_layer)
+
+        for layer_num in range(from_layer, self.num_layers):
+
+            success = self._prop_bounds_and_errors(layer_num)
+            if not success:
+                return False
+
+        return True
+
+    def calc_bounds_batch(self, input_constraints: np.array, forced_input_bounds_batch: list,
+                          from_layer: int = 1) -> list:
+
+        """
+        Calculates the bounds for a batch of branches that share all layers before from_layer with the current state.
+
+        The coefficient matrices of the branches are stacked column-wise, so each linear mapping is applied once for
+        the whole batch instead of once for each branch. The non-linear layers are calculated separately for each
+        branch. The current state, including the forced input bounds, is not modified.
+
+        Args:
+            input_constraints           : The constraints on the input, see calc_bounds().
+            forced_input_bounds_batch   : A list with the forced input bounds of each branch.
+            from_layer                  : Updates this layer and all later layers
+        Returns:
+            A list with the state of each branch, which can be stored with save_snapshot(), or None if the bounds of
+            the branch are invalid.
+        """
+
+        assert from_layer >= 1, "From layer should be >= 1"
+        assert isinstance(input_constraints, np.ndarray), "input_constraints should be a np array"
+
+        current_state = self._get_state()
+        current_forced = self._forced_input_bounds
+
+        states = []
+        for forced_input_bounds in forced_input_bounds_batch:
+            self._set_state(tuple(layer_list.copy() for layer_list in current_state))
+            self._forced_input_bounds = forced_input_bounds
+            self._init_calc_bounds(input_constraints, from_layer)
+            states.append(self._get_state())
+
+        try:
+            for layer_num in range(from_layer, self.num_layers):
+
+                active = [i for i in range(len(states)) if states[i] is not None]
+                batch_linear = self._mappings[layer_num].is_linear and len(active) > 1
+
+                if batch_linear:
+                    self._prop_linear_batch(layer_num, [states[i] for i in active])
+
+                for i in active:
+                    self._set_state(states[i])
+                    self._forced_input_bounds = forced_input_bounds_batch[i]
+
+                    if not batch_linear:
+                        self._prop_symbolic_bounds_and_errors(layer_num)
+                    if not self._calc_layer_bounds_concrete(layer_num):
+                        states[i] = None
+
+        finally:
+            self._set_state(current_state)
+            self._forced_input_bounds = current_forced
+
+        return states
+
+    def _init_calc_bounds(self, input_constraints: np.array, from_layer: int):
+
+        """
+        Sets the input bounds and recalculates the concrete bounds of the layer before from_layer.
+        """
+
         self._bounds_concrete[0] = input_constraints
 
         # Concrete bounds from previous layer might have to be recalculated due to new split-constraints
@@ -152,13 +351,71 @@ class ESIP:
                 self._adjust_bounds_from_forced_bounds(self.bounds_concrete[from_layer - 1],
                                                        self._forced_input_bounds[from_layer - 1])
 
-        for layer_num in range(from_layer, self.num_layers):
+    def _get_state(self) -> tuple:
 
-            success = self._prop_bounds_and_errors(layer_num)
-            if not success:
-                return False
+        """
+        Returns the lists with the calculated arrays of all layers.
+        """
 
-        return True
+        return (self._bounds_concrete, self._bounds_symbolic, self._error_matrix, self._error_matrix_to_node_indices,
+                self._error, self._relaxations)
+
+    def _set_state(self, state: tuple):
+
+        """
+        Sets the lists with the calculated arrays of all layers, see _get_state().
+        """
+
+        (self._bounds_concrete, self._bounds_symbolic, self._error_matrix, self._error_matrix_to_node_indices,
+         self._error, self._relaxations) = state
+
+    def _prop_linear_batch(self, layer_num: int, states: list):
+
+        """
+        Propagates the symbolic bounds and error matrices of a batch of states through a linear layer.
+
+        The matrices are stacked column-wise and propagated with one call to the mapping, then split and written to
+        the states.
+
+        Args:
+            layer_num   : The layer number, the mapping of the layer has to be linear.
+            states      : The states, see _get_state().
+        """
+
+        mapping = self._mappings[layer_num]
+
+        symbolic = [state[1][layer_num - 1] for state in states]
+        bias = mapping.propagate(np.zeros((symbolic[0].shape[0], 1), dtype=symbolic[0].dtype), add_bias=True)[:, 0]
+
+        for state, bounds_symbolic in zip(states, self._propagate_stacked(mapping, symbolic)):
+            bounds_symbolic[:, -1] += bias
+            state[1][layer_num] = bounds_symbolic
+
+        dense_idx = [i for i, state in enumerate(states)
+                     if not isinstance(state[2][layer_num - 1], FactoredErrorMatrix)]
+        error_matrices = self._propagate_stacked(mapping, [states[i][2][layer_num - 1] for i in dense_idx])
+        for i, error_matrix in zip(dense_idx, error_matrices):
+            states[i][2][layer_num] = error_matrix
+
+        for state in states:
+            if isinstance(state[2][layer_num - 1], FactoredErrorMatrix):
+                state[2][layer_num] = state[2][layer_num - 1].propagate(mapping)
+            state[3][layer_num] = state[3][layer_num - 1].copy()
+
+    @staticmethod
+    def _propagate_stacked(mapping: AbstractMapping, matrices: list) -> list:
+
+        """
+        Propagates the matrices through the linear mapping without bias, stacked column-wise.
+        """
+
+        if len(matrices) == 0:
+            return []
+
+        widths = [matrix.shape[1] for matrix in matrices]
+        result = mapping.propagate(np.hstack(matrices), add_bias=False)
+
+        return np.split(result, np.cumsum(widths)[:-1], axis=1)
 
     def _prop_bounds_and_errors(self, layer_num: int) -> bool:
 
@@ -173,11 +430,29 @@ class ESIP:
             True if the resulting concrete bounds are valid, else false.
         """
 
+        self._prop_symbolic_bounds_and_errors(layer_num)
+
+        return self._calc_layer_bounds_concrete(layer_num)
+
+    def _prop_symbolic_bounds_and_errors(self, layer_num: int):
+
+        """
+        Calculates the symbolic bounds, relaxations and error matrix of the given layer.
+
+        Args:
+            layer_num: The layer number
+        """
+
         mapping = self._mappings[layer_num]
 
         if mapping.is_linear:
             self._bounds_symbolic[layer_num] = mapping.propagate(self._bounds_symbolic[layer_num - 1], add_bias=True)
-            self._error_matrix[layer_num] = mapping.propagate(self._error_matrix[layer_num - 1], add_bias=False)
+
+            if isinstance(self._error_matrix[layer_num - 1], FactoredErrorMatrix):
+                self._error_matrix[layer_num] = self._error_matrix[layer_num - 1].propagate(mapping)
+            else:
+                self._error_matrix[layer_num] = mapping.propagate(self._error_matrix[layer_num - 1], add_bias=False)
+
             self._error_matrix_to_node_indices[layer_num] = self._error_matrix_to_node_indices[layer_num - 1].copy()
 
         else:
@@ -187,12 +462,33 @@ class ESIP:
             self._bounds_symbolic[layer_num] = self._prop_equation_trough_relaxation(self._bounds_symbolic[layer_num-1],
                                                                                      self._relaxations[layer_num])
 
-            self._error_matrix[layer_num], self._error_matrix_to_node_indices[layer_num] = \
-                self._prop_error_matrix_trough_relaxation(self._error_matrix[layer_num - 1],
-                                                          self._relaxations[layer_num],
-                                                          self._bounds_concrete[layer_num - 1],
-                                                          self._error_matrix_to_node_indices[layer_num - 1],
-                                                          layer_num)
+            if self._error_matrix_backend == "factored" and layer_num < self.num_layers - 1:
+                self._error_matrix[layer_num], self._error_matrix_to_node_indices[layer_num] = \
+                    self._prop_factored_error_matrix_trough_relaxation(self._error_matrix[layer_num - 1],
+                                                                       self._relaxations[layer_num],
+                                                                       self._bounds_concrete[layer_num - 1],
+                                                                       self._error_matrix_to_node_indices[layer_num - 1],
+                                                                       layer_num)
+            else:
+                self._error_matrix[layer_num], self._error_matrix_to_node_indices[layer_num] = \
+                    self._prop_error_matrix_trough_relaxation(self._error_matrix[layer_num - 1],
+                                                              self._relaxations[layer_num],
+                                                              self._bounds_concrete[layer_num - 1],
+                                                              self._error_matrix_to_node_indices[layer_num - 1],
+                                                              layer_num)
+
+    def _calc_layer_bounds_concrete(self, layer_num: int) -> bool:
+
+        """
+        Calculates the concrete bounds of the given layer from the symbolic bounds and error matrix.
+
+        Args:
+            layer_num: The layer number
+        Returns:
+            True if the resulting concrete bounds are valid, else false.
+        """
+
+        mapping = self._mappings[layer_num]
 
         if mapping.is_1d_to_1d:
             self._bounds_concrete[layer_num] = mapping.propagate(self._bounds_concrete[layer_num - 1])
@@ -223,13 +519,13 @@ class ESIP:
             symbolic_bounds : A Nx(M+1) array with the symbolic bounds, where N is the number of nodes in the layer
                               and M is the input dimension of the network.
             error_matrix    : A NxN' with the errors, where N is the number of nodes in the layer and N' is the
-                              total number of nodes in all previous layers.
+                              total number of nodes in all previous layers. May also be a FactoredErrorMatrix.
         Returns
             (concrete_bounds, errors), where concrete_bounds and errors are Nx2 arrays.
         """
 
-        concrete_bounds = concretise_symbolic_bounds_jit(input_bounds, symbolic_bounds)
-        errors = sum_error_jit(error_matrix)
+        concrete_bounds = concretise_symbolic_bounds(input_bounds, symbolic_bounds)
+        errors = sum_error(error_matrix)
         concrete_bounds += errors
 
         return concrete_bounds, errors
@@ -352,6 +648,67 @@ class ESIP:
             input arguments.
         """
 
+        a_low = relaxations[0, :, 0]
+        max_err, err_idx = ESIP._relaxation_errors(relaxations, bounds_concrete)
+        num_err = err_idx.shape[0]
+
+        error_matrix = to_dense(error_matrix)
+
+        # Create error_matrix and propagate old errors through the relaxations
+        layer_size = error_matrix.shape[0]
+        num_old_err = error_matrix.shape[1]
+        error_matrix_new = np.empty((layer_size, num_old_err + num_err), np.float32)
+
+        if num_old_err > 0:
+            error_matrix_new[:, :num_old_err] = a_low[:, np.newaxis] * error_matrix
+
+        # Calculate the new errors.
+        if num_err > 0:
+            error_matrix_new[:, num_old_err:] = 0
+            error_matrix_new[:, num_old_err:][err_idx, np.arange(num_err)] = max_err[err_idx]
+
+        error_matrix_to_node_indices_new = ESIP._extend_error_matrix_to_node_indices(error_matrix_to_node_indices,
+                                                                                     err_idx, layer_num)
+
+        return error_matrix_new, error_matrix_to_node_indices_new
+
+    @staticmethod
+    def _prop_factored_error_matrix_trough_relaxation(error_matrix,
+                                                      relaxations: np.array,
+                                                      bounds_concrete: np.array,
+                                                      error_matrix_to_node_indices: np.array,
+                                                      layer_num: int) -> tuple:
+
+        """
+        Same as _prop_error_matrix_trough_relaxation(), but returns a FactoredErrorMatrix.
+
+        Returns:
+            (error_matrix_new, error_matrix_to_node_indices_new)
+        """
+
+        max_err, err_idx = ESIP._relaxation_errors(relaxations, bounds_concrete)
+
+        error_matrix_new = FactoredErrorMatrix.from_relaxation(error_matrix, relaxations[0, :, 0], err_idx,
+                                                               max_err[err_idx])
+        error_matrix_to_node_indices_new = ESIP._extend_error_matrix_to_node_indices(error_matrix_to_node_indices,
+                                                                                     err_idx, layer_num)
+
+        return error_matrix_new, error_matrix_to_node_indices_new
+
+    @staticmethod
+    def _relaxation_errors(relaxations: np.array, bounds_concrete: np.array) -> tuple:
+
+        """
+        Calculates the maximum errors of the linear relaxations.
+
+        Args:
+            relaxations     : A 2xNx2 array with the relaxations, see _prop_error_matrix_trough_relaxation()
+            bounds_concrete : A Nx2 array with the concrete lower and upper input bounds.
+        Returns:
+            (max_err, err_idx), where max_err contains the maximum error for each node and err_idx are the indices of
+            the nodes with non-zero error.
+        """
+
         # Get the relaxation parameters
         a_low, a_up = relaxations[0, :, 0], relaxations[1, :, 0]
         b_low, b_up = relaxations[0, :, 1], relaxations[1, :, 1]
@@ -365,29 +722,24 @@ class ESIP:
         # Add the errors introduced by the linear relaxations
         max_err = np.max((error_lower, error_upper), axis=0)
         err_idx = np.argwhere(max_err != 0)[:, 0]
-        num_err = err_idx.shape[0]
 
-        # Create error_matrix and propagate old errors through the relaxations
-        layer_size = error_matrix.shape[0]
-        num_old_err = error_matrix.shape[1]
-        error_matrix_new = np.empty((layer_size, num_old_err + num_err), np.float32)
+        return max_err, err_idx
 
-        if num_old_err > 0:
-            error_matrix_new[:, :num_old_err] = a_low[:, np.newaxis] * error_matrix
+    @staticmethod
+    def _extend_error_matrix_to_node_indices(error_matrix_to_node_indices: np.array, err_idx: np.array,
+                                             layer_num: int) -> np.array:
 
-        # Calculate the new errors.
-        if num_err > 0:
-            error_matrix_new[:, num_old_err:] = 0
-            error_matrix_new[:, num_old_err:][err_idx, np.arange(num_err)] = max_err[err_idx]
+        """
+        Adds the nodes with new errors in this layer to the error_matrix_to_node_indices array.
+        """
 
-            error_matrix_to_node_indices_new = np.hstack((np.zeros(err_idx.shape, dtype=int)[:, np.newaxis] + layer_num,
-                                                          err_idx[:, np.newaxis]))
-            error_matrix_to_node_indices_new = np.vstack((error_matrix_to_node_indices,
-                                                          error_matrix_to_node_indices_new))
-        else:
-            error_matrix_to_node_indices_new = error_matrix_to_node_indices.copy()
+        if err_idx.shape[0] == 0:
+            return error_matrix_to_node_indices.copy()
 
-        return error_matrix_new, error_matrix_to_node_indices_new
+        error_matrix_to_node_indices_new = np.hstack((np.zeros(err_idx.shape, dtype=int)[:, np.newaxis] + layer_num,
+                                                      err_idx[:, np.newaxis]))
+
+        return np.vstack((error_matrix_to_node_indices, error_matrix_to_node_indices_new))
 
     def merge_current_bounds_into_forced(self):
 
@@ -410,6 +762,52 @@ class ESIP:
                 better_upper = self.forced_input_bounds[i][:, 1] > self._bounds_concrete[i][:, 1]
                 self.forced_input_bounds[i][better_upper, 1] = self._bounds_concrete[i][better_upper, 1]
 
+    def forced_bounds_from_split_list(self, split_list: list, tightened_bounds: list = None) -> list:
+
+        """
+        Creates forced input bounds from a list of splits.
+
+        The forced bounds are unbounded except for the split nodes and the nodes with tightened bounds, so they are
+        looser than the forced bounds stored in a branch. This is used for branches received from other processes,
+        where only the split list and the tightened bounds are transferred.
+
+        Args:
+            split_list          : The list of splits as stored in Branch.split_list
+            tightened_bounds    : A list of (layer, node, lower, upper) as stored in Branch.tightened_bounds
+        Returns:
+            The list of forced input bounds, with None for layers without splits.
+        """
+
+        forced_input_bounds = [None] * self.num_layers
+
+        for split in split_list:
+
+            layer, node, split_x = split["layer"] - 1, split["node"], split["split_x"]
+
+            if forced_input_bounds[layer] is None:
+                forced_input_bounds[layer] = np.zeros((self.layer_sizes[layer], 2), dtype=np.float64)
+                forced_input_bounds[layer][:, 0] = -np.inf
+                forced_input_bounds[layer][:, 1] = np.inf
+
+            if split["upper"]:
+                forced_input_bounds[layer][node, 0] = max(forced_input_bounds[layer][node, 0], split_x)
+            else:
+                forced_input_bounds[layer][node, 1] = min(forced_input_bounds[layer][node, 1], split_x)
+
+        for layer, node, lower, upper in (tightened_bounds if tightened_bounds is not None else []):
+
+            layer -= 1
+
+            if forced_input_bounds[layer] is None:
+                forced_input_bounds[layer] = np.zeros((self.layer_sizes[layer], 2), dtype=np.float64)
+                forced_input_bounds[layer][:, 0] = -np.inf
+                forced_input_bounds[layer][:, 1] = np.inf
+
+            forced_input_bounds[layer][node, 0] = max(forced_input_bounds[layer][node, 0], lower)
+            forced_input_bounds[layer][node, 1] = min(forced_input_bounds[layer][node, 1], upper)
+
+        return forced_input_bounds
+
     def largest_error_split_node(self, output_weights: np.array=None) -> Optional[tuple]:
 
         """
@@ -432,22 +830,43 @@ class ESIP:
         output_weights = np.ones((self.layer_sizes[-1], 2)) if output_weights is None else output_weights
         output_weights[output_weights <= 0] = 0.01
 
-        err_matrix_neg = self._error_matrix[-1].copy()
-        err_matrix_neg[err_matrix_neg > 0] = 0
-        err_matrix_pos = self._error_matrix[-1].copy()
-        err_matrix_pos[err_matrix_pos < 0] = 0
-
-        err_matrix_neg = - err_matrix_neg * output_weights[:, 0:1]
-        err_matrix_pos = err_matrix_pos * output_weights[:, 1:2]
-
-        weighted_error = (err_matrix_neg + err_matrix_pos).sum(axis=0)
-        max_err_idx = np.argmax(weighted_error)
+        weighted_error = self.weighted_error(output_weights)
+        max_err_idx = int(np.argmax(weighted_error))
 
         if weighted_error[max_err_idx] <= 0:
             return None
         else:
             return self._error_matrix_to_node_indices[-1][max_err_idx]
 
+    def weighted_error(self, output_weights: np.array) -> np.array:
+
+        """
+        Returns the weighted error effect on the output of each column of the final error matrix.
+
+        The result is cached until the final error matrix changes, so the branching strategy, the lp-tightening and
+        the memory refresh of a branch share one pass over the matrix. Since the calculated arrays are never modified
+        in place, a new final error matrix is always a new array and the cache is keyed on its identity. The returned
+        array should not be modified.
+
+        Args:
+            output_weights  : A Nx2 array with the weights for the lower bounds in column 1 and the upper bounds
+                              in column 2. All weights should be > 0.
+        Returns:
+            The weighted errors, the nodes are given by _error_matrix_to_node_indices[-1]. See
+            esip_util.weighted_error_top_k_jit().
+        """
+
+        error_matrix = self._error_matrix[-1]
+        cache = self._weighted_error_cache
+
+        if cache is not None and cache[0] is error_matrix and np.array_equal(cache[1], output_weights):
+            return cache[2]
+
+        weighted_error, _ = weighted_error_top_k_jit(error_matrix, output_weights, 0)
+        self._weighted_error_cache = (error_matrix, output_weights.copy(), weighted_error)
+
+        return weighted_error
+
     def _init_datastructure(self):
 
         """
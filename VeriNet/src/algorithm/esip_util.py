@@ -6,9 +6,95 @@ Author: Patrick Henriksen <patrick@henriksen.as>
 """
 
 from enum import Enum
+from typing import Optional
+
+import numba
 import numpy as np
 from numba import jit, prange
 
+KERNEL_MODES = ("serial", "parallel", "vectorised")
+_kernel_mode = "serial"
+
+
+def set_kernel_mode(mode: str, num_threads: Optional[int] = None):
+
+    """
+    Selects the kernels used by concretise_symbolic_bounds() and sum_error() in this process.
+
+    The mode is set per process, so the worker processes of VeriNet can use the serial kernels while a single process
+    uses the parallel ones without oversubscribing the cpu.
+
+    Args:
+        mode        : "serial" for the serial jit kernels, "parallel" for the multi-threaded jit kernels or
+                      "vectorised" for numpy/ BLAS based kernels.
+        num_threads : The number of numba threads used by the parallel kernels, if None numba's default is kept.
+                      Only used with "parallel" and numba >= 0.49, older versions always use all threads.
+    """
+
+    global _kernel_mode
+
+    if mode not in KERNEL_MODES:
+        raise ValueError(f"Unknown kernel mode: {mode}")
+
+    _kernel_mode = mode
+
+    if mode == "parallel":
+        _select_fork_safe_threading_layer()
+
+    # numba.set_num_threads() was added in numba 0.49
+    if mode == "parallel" and num_threads is not None and hasattr(numba, "set_num_threads"):
+        numba.set_num_threads(max(1, min(num_threads, numba.config.NUMBA_NUM_THREADS)))
+
+
+def _select_fork_safe_threading_layer():
+
+    """
+    Selects numba's workqueue threading layer for the parallel kernels, unless a layer was chosen by the user or the
+    parallel kernels have already been launched.
+
+    VeriNet forks its worker processes, and a process which has started the tbb threading layer hangs at exit after
+    forking, while GNU OpenMP aborts the forked process. The workqueue layer is fork-safe. It isn't thread-safe, but
+    the kernels are only called from one thread in each process.
+    """
+
+    if numba.config.THREADING_LAYER != "default":
+        return
+
+    try:
+        numba.threading_layer()  # Raises ValueError until the first parallel kernel has been launched
+    except ValueError:
+        numba.config.THREADING_LAYER = "workqueue"
+
+
+def get_kernel_mode() -> str:
+    return _kernel_mode
+
+
+def concretise_symbolic_bounds(input_bounds: np.array, symbolic_bounds: np.array) -> np.array:
+
+    """
+    Calculates the concrete input bounds from the symbolic using the kernel selected with set_kernel_mode().
+    """
+
+    if _kernel_mode == "parallel":
+        return concretise_symbolic_bounds_parallel_jit(input_bounds, symbolic_bounds)
+    elif _kernel_mode == "vectorised":
+        return concretise_symbolic_bounds_vectorised(input_bounds, symbolic_bounds)
+    return concretise_symbolic_bounds_jit(input_bounds, symbolic_bounds)
+
+
+def sum_error(error_matrix: np.array) -> np.array:
+
+    """
+    Calculates the lower and upper error for each node using the kernel selected with set_kernel_mode().
+    """
+
+    if _kernel_mode == "parallel":
+        return sum_error_parallel_jit(error_matrix)
+    elif _kernel_mode == "vectorised":
+        return sum_error_vectorised(error_matrix)
+    return sum_error_jit(error_matrix)
+
 
 @jit(nopython=True, cache=True)
 def concretise_symbolic_bounds_jit(input_bounds: np.array, symbolic_bounds: np.array, outward_round: float=0):
@@ -76,3 +162,177 @@ def sum_error_jit(error_matrix: np.array):
         concrete_error[j] = temp_error_lower, temp_error_upper
 
     return concrete_error
+
+
+@jit(nopython=True, cache=True, parallel=True)
+def concretise_symbolic_bounds_parallel_jit(input_bounds: np.array, symbolic_bounds: np.array,
+                                            outward_round: float=0):
+
+    """
+    Multi-threaded version of concretise_symbolic_bounds_jit(), the nodes are distributed over the threads.
+    """
+
+    layer_size = symbolic_bounds.shape[0]
+    concrete_bounds_in = np.empty((layer_size, 2))
+
+    for j in prange(layer_size):
+
+        # Add bias
+        temp_lower = symbolic_bounds[j, -1]
+        temp_upper = symbolic_bounds[j, -1]
+
+        for i in range(input_bounds.shape[0]):
+
+            coeff = symbolic_bounds[j, i]
+
+            if coeff < 0:
+                temp_lower += coeff * input_bounds[i, 1] - outward_round
+                temp_upper += coeff * input_bounds[i, 0] + outward_round
+            else:
+                temp_lower += coeff * input_bounds[i, 0] - outward_round
+                temp_upper += coeff * input_bounds[i, 1] + outward_round
+
+        concrete_bounds_in[j, 0] = temp_lower
+        concrete_bounds_in[j, 1] = temp_upper
+
+    return concrete_bounds_in
+
+
+@jit(nopython=True, cache=True, parallel=True)
+def sum_error_parallel_jit(error_matrix: np.array):
+
+    """
+    Multi-threaded version of sum_error_jit(), the nodes are distributed over the threads.
+    """
+
+    layer_size = error_matrix.shape[0]
+    concrete_error = np.empty((layer_size, 2))
+
+    for j in prange(layer_size):
+
+        temp_error_lower = 0.
+        temp_error_upper = 0.
+
+        for i in range(error_matrix.shape[1]):
+
+            error = error_matrix[j, i]
+
+            if error < 0:
+                temp_error_lower += error
+            else:
+                temp_error_upper += error
+
+        concrete_error[j, 0] = temp_error_lower
+        concrete_error[j, 1] = temp_error_upper
+
+    return concrete_error
+
+
+def concretise_symbolic_bounds_vectorised(input_bounds: np.array, symbolic_bounds: np.array) -> np.array:
+
+    """
+    Vectorised version of concretise_symbolic_bounds_jit().
+
+    The positive and negative coefficients are multiplied with the input bounds as two matrix-vector products, so
+    the work is done by BLAS. The summation order differs from the jit kernels, so the results may differ by
+    rounding errors.
+    """
+
+    coeffs = symbolic_bounds[:, :-1]
+    positive = np.maximum(coeffs, 0)
+    negative = np.minimum(coeffs, 0)
+    input_bounds = input_bounds.astype(coeffs.dtype, copy=False)
+
+    concrete_bounds_in = np.empty((symbolic_bounds.shape[0], 2))
+    concrete_bounds_in[:, 0] = positive @ input_bounds[:, 0] + negative @ input_bounds[:, 1]
+    concrete_bounds_in[:, 1] = positive @ input_bounds[:, 1] + negative @ input_bounds[:, 0]
+    concrete_bounds_in += symbolic_bounds[:, -1:]
+
+    return concrete_bounds_in
+
+
+def sum_error_vectorised(error_matrix: np.array) -> np.array:
+
+    """
+    Vectorised version of sum_error_jit().
+    """
+
+    concrete_error = np.empty((error_matrix.shape[0], 2))
+    concrete_error[:, 0] = np.minimum(error_matrix, 0).sum(axis=1)
+    concrete_error[:, 1] = np.maximum(error_matrix, 0).sum(axis=1)
+
+    return concrete_error
+
+
+@jit(nopython=True, cache=True)
+def weighted_error_top_k_jit(error_matrix: np.array, output_weights: np.array, k: int):
+
+    """
+    Calculates the weighted error effect on the output of each column of the error matrix and the k largest.
+
+    The negative errors of each row are weighted with the first column of output_weights and the positive errors
+    with the second column, and the absolute values are summed for each column. This is done in one pass over the
+    error matrix without any temporary matrices. The indices of the k largest values are then found with top_k_jit().
+
+    Args:
+        error_matrix    : The NxM error matrix of the output layer, where N is the number of outputs
+        output_weights  : A Nx2 array with the weights for the negative errors in the first column and the positive
+                          errors in the second column
+        k               : The number of indices returned
+    Returns:
+        (weighted_error, top_k), where weighted_error is the array with the M weighted errors and top_k the indices of
+        the min(k, M) largest, in decreasing order. Equal values are ordered by index.
+    """
+
+    num_rows, num_cols = error_matrix.shape
+    weighted_error = np.zeros(num_cols)
+
+    for i in range(num_rows):
+
+        lower_weight = output_weights[i, 0]
+        upper_weight = output_weights[i, 1]
+
+        for j in range(num_cols):
+
+            error = error_matrix[i, j]
+
+            if error < 0:
+                weighted_error[j] -= error * lower_weight
+            else:
+                weighted_error[j] += error * upper_weight
+
+    return weighted_error, top_k_jit(weighted_error, k)
+
+
+@jit(nopython=True, cache=True)
+def top_k_jit(values: np.array, k: int):
+
+    """
+    Returns the indices of the min(k, len(values)) largest values in decreasing order, equal values are ordered by
+    index.
+
+    The indices are found by partial selection with a sorted buffer of size k, instead of sorting all values.
+    """
+
+    k = min(k, values.shape[0])
+    top_k = np.empty(k, dtype=np.int64)
+    num_selected = 0
+
+    for j in range(values.shape[0]):
+
+        value = values[j]
+
+        if num_selected < k:
+            pos = num_selected
+            num_selected += 1
+        elif k > 0 and value > values[top_k[k - 1]]:
+            pos = k - 1
+        else:
+            continue
+
+        while pos > 0 and values[top_k[pos - 1]] < value:
+            top_k[pos] = top_k[pos - 1]
+            pos -= 1
+        top_k[pos] = j
+
+    return top_k
@@ -0,0 +1,187 @@
+"""
+The frontiers ordering the open branches of a VeriNetWorker.
+
+All frontiers have the interface of the deque used as a depth-first stack: append() adds a branch, pop() returns
+the next branch to explore and popleft()/appendleft() take and return the oldest branch, which is donated to idle
+workers. The best-first frontiers order the branches by Branch.priority, the output margin of the branch that was
+split, see VerificationObjective.output_margin(). Branches with a small margin are the closest to a counter example,
+so exploring them first finds counter examples sooner than the depth-first order.
+"""
+
+import heapq
+from collections import deque
+
+import numpy as np
+
+from src.algorithm.verinet_util import Branch
+
+# The number of branches explored depth-first between each best-first restart of the hybrid frontier
+HYBRID_RESTART_INTERVAL = 32
+
+
+def _priority(branch: Branch) -> float:
+
+    """
+    Returns the priority of the branch, branches without a priority are explored first.
+    """
+
+    return -np.inf if branch.priority is None else branch.priority
+
+
+class DepthFirstFrontier(deque):
+
+    """
+    The depth-first stack, the last added branch is explored first.
+    """
+
+    needs_priority = False
+
+
+class BestFirstFrontier:
+
+    """
+    A heap returning the branch with the smallest priority. Equal priorities are ordered like the depth-first stack,
+    so the two branches created by a split are explored in the same order as with DepthFirstFrontier.
+
+    The heap entries are also kept in insertion order in a deque for popleft(). An entry removed from one of the two
+    is marked by setting its branch to None and skipped when reached in the other, so both pop() and popleft() are
+    O(log n) amortised.
+    """
+
+    needs_priority = True
+
+    def __init__(self):
+
+        self._heap = []
+        self._order = deque()
+        self._len = 0
+        self._next_order = 0
+        self._first_order = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def append(self, branch: Branch):
+
+        entry = [_priority(branch), -self._next_order, branch]
+        self._next_order += 1
+
+        heapq.heappush(self._heap, entry)
+        self._order.append(entry)
+        self._len += 1
+
+    def appendleft(self, branch: Branch):
+
+        """
+        Adds the branch as the oldest branch.
+        """
+
+        self._first_order -= 1
+        entry = [_priority(branch), -self._first_order, branch]
+
+        heapq.heappush(self._heap, entry)
+        self._order.appendleft(entry)
+        self._len += 1
+
+    def pop(self) -> Branch:
+
+        if self._len == 0:
+            raise IndexError("pop from an empty frontier")
+
+        entry = heapq.heappop(self._heap)
+        while entry[2] is None:
+            entry = heapq.heappop(self._heap)
+
+        return self._remove(entry)
+
+    def popleft(self) -> Branch:
+
+        """
+        Removes and returns the oldest branch.
+        """
+
+        if self._len == 0:
+            raise IndexError("pop from an empty frontier")
+
+        entry = self._order.popleft()
+        while entry[2] is None:
+            entry = self._order.popleft()
+
+        return self._remove(entry)
+
+    def _remove(self, entry: list) -> Branch:
+
+        """
+        Marks the entry as removed and returns its branch.
+
+        The removed entries left in the heap and the deque are dropped when they outnumber the branches in the
+        frontier, so the memory stays linear in the number of branches.
+        """
+
+        branch = entry[2]
+        entry[2] = None
+        self._len -= 1
+
+        if len(self._heap) + len(self._order) > 4 * (self._len + 1):
+            self._heap = [item for item in self._heap if item[2] is not None]
+            heapq.heapify(self._heap)
+            self._order = deque(item for item in self._order if item[2] is not None)
+
+        return branch
+
+
+class HybridFrontier(DepthFirstFrontier):
+
+    """
+    The depth-first stack, restarting from the branch with the smallest priority every restart_interval branches.
+    """
+
+    needs_priority = True
+
+    def __init__(self, restart_interval: int = HYBRID_RESTART_INTERVAL):
+
+        """
+        Args:
+            restart_interval    : The number of branches popped depth-first between each restart
+        """
+
+        super().__init__()
+        self._restart_interval = restart_interval
+        self._num_pops = 0
+
+    def pop(self) -> Branch:
+
+        self._num_pops += 1
+        if self._num_pops % self._restart_interval != 0 or len(self) < 2:
+            return super().pop()
+
+        # The newest of the branches with the smallest priority, found in one pass since indexing a deque is O(n)
+        best, best_branch, best_priority = 0, self[0], _priority(self[0])
+        for i, branch in enumerate(self):
+            priority = _priority(branch)
+            if priority <= best_priority:
+                best, best_branch, best_priority = i, branch, priority
+
+        del self[best]
+
+        return best_branch
+
+
+# The frontiers selectable by name, see VeriNetWorker
+FRONTIERS = {
+    "dfs": DepthFirstFrontier,
+    "best_first": BestFirstFrontier,
+    "hybrid": HybridFrontier,
+}
+
+
+def get_frontier(frontier: str):
+
+    """
+    Returns a new, empty frontier of the given name, see FRONTIERS.
+    """
+
+    if frontier not in FRONTIERS:
+        raise ValueError(f"Unknown frontier: {frontier}")
+
+    return FRONTIERS[frontier]()
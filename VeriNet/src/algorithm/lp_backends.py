@@ -0,0 +1,709 @@
+"""
+This file contains the LP backends used by the LPSolver.
+
+An LP backend holds a feasibility problem over a fixed number of continuous variables with box bounds and linear
+constraints. The LPSolver uses the first variables for the input nodes and the remaining for the output nodes of the
+network. Two backends are available:
+
+- GurobiBackend ("gurobi"), which requires gurobipy >= 9.5 and a Gurobi license. The matrix API (addMVar(),
+  addMConstr(), MVar.fromlist()) and the params argument of Env() are used, which older versions don't have.
+- ScipyBackend ("scipy"), which uses the HiGHS solver from scipy.optimize.linprog and doesn't need a license.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import numpy as np
+import scipy.sparse as sparse
+from scipy.optimize import linprog
+
+try:
+    import gurobipy as grb
+except ImportError:
+    grb = None
+
+# The first gurobipy version with all parts of the matrix API used by the GurobiBackend
+GUROBI_MIN_VERSION = (9, 5, 0)
+
+
+class LPBackend:
+
+    """
+    Abstract class for the LP backends.
+    """
+
+    def __init__(self, num_variables: int):
+
+        """
+        Args:
+            num_variables   : The number of variables, all variables are initially unbounded.
+        """
+
+        self._num_variables = num_variables
+        self._iterations = 0
+        self._executor = None
+        self._executor_threads = 0
+
+    @property
+    def num_variables(self) -> int:
+        return self._num_variables
+
+    def set_bounds(self, var_idx: np.array, lower: np.array, upper: np.array):
+
+        """
+        Sets the lower and upper bounds of the given variables.
+
+        Args:
+            var_idx : The indices of the variables
+            lower   : The lower bounds, -np.inf for no bound
+            upper   : The upper bounds, np.inf for no bound
+        """
+
+        raise NotImplementedError(f"set_bounds() not implemented in {self.__class__.__name__}")
+
+    def get_bounds(self, var_idx: np.array) -> tuple:
+
+        """
+        Returns (lower, upper) with the bounds of the given variables.
+        """
+
+        raise NotImplementedError(f"get_bounds() not implemented in {self.__class__.__name__}")
+
+    def add_constraint(self, var_idx: np.array, coeffs: np.array, sense: str, rhs: float):
+
+        """
+        Adds the linear constraint coeffs @ x[var_idx] (sense) rhs.
+
+        Args:
+            var_idx : The indices of the variables in the constraint
+            coeffs  : The coefficients of the variables
+            sense   : ">=" or "<="
+            rhs     : The right hand side
+        Returns:
+            A handle used to remove the constraint with remove_constraint()
+        """
+
+        raise NotImplementedError(f"add_constraint() not implemented in {self.__class__.__name__}")
+
+    def add_constraints(self, var_idx: np.array, coeffs: np.array, senses: list, rhs: np.array) -> list:
+
+        """
+        Adds the linear constraints coeffs[i] @ x[var_idx] (senses[i]) rhs[i].
+
+        Args:
+            var_idx : The indices of the variables in the constraints
+            coeffs  : A KxN matrix with the coefficients of the K constraints
+            senses  : A list with ">=" or "<=" for each constraint
+            rhs     : The right hand sides
+        Returns:
+            A list with the handle of each constraint
+        """
+
+        return [self.add_constraint(var_idx, coeffs[i], senses[i], rhs[i]) for i in range(len(senses))]
+
+    def remove_constraint(self, constr):
+
+        """
+        Removes a constraint added by add_constraint().
+        """
+
+        raise NotImplementedError(f"remove_constraint() not implemented in {self.__class__.__name__}")
+
+    def solve(self) -> bool:
+
+        """
+        Solves the feasibility problem.
+
+        Returns:
+            True if the problem is feasible, else False
+        """
+
+        raise NotImplementedError(f"solve() not implemented in {self.__class__.__name__}")
+
+    def get_values(self) -> Optional[np.array]:
+
+        """
+        Returns the values assigned to the variables by the last feasible solve(), or None.
+        """
+
+        raise NotImplementedError(f"get_values() not implemented in {self.__class__.__name__}")
+
+    def minimize(self, var_idx: np.array, coeffs: np.array) -> Optional[float]:
+
+        """
+        Minimises coeffs @ x[var_idx] subject to the current bounds and constraints.
+
+        The objective is only used for this call, solve() remains a feasibility problem.
+
+        Args:
+            var_idx : The indices of the variables in the objective
+            coeffs  : The coefficients of the variables
+        Returns:
+            The minimum, or None if the problem is infeasible
+        """
+
+        raise NotImplementedError(f"minimize() not implemented in {self.__class__.__name__}")
+
+    def solve_each(self, var_idx: np.array, coeffs: np.array, senses: list, rhs: np.array,
+                   num_threads: int = 1) -> list:
+
+        """
+        Solves the feasibility problem once for each of the given constraints, with only that constraint added.
+
+        The constraints aren't kept. Backends may solve the problems concurrently, the default implementation
+        solves them one after the other.
+
+        Args:
+            var_idx     : The indices of the variables in the constraints
+            coeffs      : A KxN matrix with the coefficients of the K constraints
+            senses      : A list with ">=" or "<=" for each constraint
+            rhs         : The right hand sides
+            num_threads : The maximum number of threads used to solve the problems
+        Returns:
+            A list with (feasible, values) for each constraint, where values is None if the problem is infeasible
+        """
+
+        results = []
+        iterations = 0
+
+        for i in range(len(senses)):
+            constr = self.add_constraint(var_idx, coeffs[i], senses[i], rhs[i])
+            feasible = self.solve()
+            iterations += self.iterations
+            results.append((feasible, self.get_values() if feasible else None))
+            self.remove_constraint(constr)
+
+        self._iterations = iterations
+
+        return results
+
+    @property
+    def iterations(self) -> int:
+
+        """
+        The number of simplex iterations used by the last solve() or solve_each(), 0 if the backend doesn't report
+        it.
+        """
+
+        return self._iterations
+
+    def _get_executor(self, num_threads: int) -> ThreadPoolExecutor:
+
+        """
+        Returns a thread pool with num_threads threads, kept between calls.
+        """
+
+        if self._executor_threads != num_threads:
+            if self._executor is not None:
+                self._executor.shutdown()
+            self._executor = ThreadPoolExecutor(num_threads)
+            self._executor_threads = num_threads
+
+        return self._executor
+
+    def get_basis(self):
+
+        """
+        Returns the basis of the last solve(), or None if no basis is available.
+
+        Has to be called before the problem is modified. The basis can be passed to set_basis() to warm start a later
+        solve, also after constraints were added or removed.
+        """
+
+        return None
+
+    def set_basis(self, basis):
+
+        """
+        Uses the given basis, from get_basis(), as starting point for the next solve(). Ignored by backends
+        without warm start.
+        """
+
+        pass
+
+    def reset_basis(self):
+
+        """
+        Discards the basis kept from the last solve(), so the next solve() starts from scratch.
+        """
+
+        pass
+
+
+class GurobiBackend(LPBackend):
+
+    """
+    LP backend using the Gurobi solver.
+
+    The variables are stored as one MVar and the constraints are added with addMConstr(). No explicit updates are
+    done, all changes made when switching branch are applied by Gurobi in the next optimize.
+
+    solve_each() with several threads solves the problems on copies of the model. Gurobi environments aren't
+    thread-safe, so each thread uses its own environment and copy. The copies are made once, from the calling
+    thread, and brought up to date with the bounds and constraints of the model before each solve_each().
+    """
+
+    def __init__(self, num_variables: int):
+
+        """
+        Args:
+            num_variables   : The number of variables, all variables are initially unbounded.
+        """
+
+        if grb is None:
+            raise LPBackendNotAvailableException("The gurobi LP backend requires gurobipy")
+        if tuple(grb.gurobi.version()) < GUROBI_MIN_VERSION:
+            raise LPBackendNotAvailableException(
+                f"The gurobi LP backend requires gurobipy >= {'.'.join(map(str, GUROBI_MIN_VERSION))}, found "
+                f"{'.'.join(map(str, grb.gurobi.version()))}. Upgrade gurobipy or use the scipy LP backend.")
+
+        super().__init__(num_variables)
+
+        # Disable the automatically created Gurobi log file
+        grb.setParam("OutputFlag", 0)
+        grb.setParam("LogFile", "")
+
+        self._model = grb.Model("NN")
+
+        # Using dual simplex as it is numerically stable and the fastest for our tests
+        self._model.setParam("Method", 0)
+
+        self._variables = self._model.addMVar(num_variables, lb=-grb.GRB.INFINITY, ub=grb.GRB.INFINITY,
+                                              vtype=grb.GRB.CONTINUOUS, name="x")
+        self._model.update()
+
+        # Copy of the variable bounds, so reading them doesn't require an update of the model
+        self._bounds = np.zeros((num_variables, 2))
+        self._bounds[:, 0] = -np.inf
+        self._bounds[:, 1] = np.inf
+
+        self._constraints = {}
+        self._next_handle = 0
+        self._thread_models = []
+
+    @property
+    def model(self):
+        return self._model
+
+    def set_bounds(self, var_idx: np.array, lower: np.array, upper: np.array):
+
+        self._bounds[var_idx, 0] = lower
+        self._bounds[var_idx, 1] = upper
+
+        variables = self._variables[var_idx]
+        variables.setAttr("LB", self._bounds[var_idx, 0])
+        variables.setAttr("UB", self._bounds[var_idx, 1])
+
+    def get_bounds(self, var_idx: np.array) -> tuple:
+        return self._bounds[var_idx, 0].copy(), self._bounds[var_idx, 1].copy()
+
+    def add_constraint(self, var_idx: np.array, coeffs: np.array, sense: str, rhs: float):
+
+        handle = self._next_handle
+        self._next_handle += 1
+
+        # The constraint is added to the model with the next update or optimize
+        self._constraints[handle] = self._model.addMConstr(sparse.csr_matrix(np.atleast_2d(coeffs)),
+                                                           self._variables[var_idx], self._grb_sense(sense),
+                                                           np.array([rhs]))[0]
+
+        return handle
+
+    def add_constraints(self, var_idx: np.array, coeffs: np.array, senses: list, rhs: np.array) -> list:
+
+        if len(senses) == 0:
+            return []
+
+        constrs = self._model.addMConstr(sparse.csr_matrix(coeffs), self._variables[var_idx],
+                                         np.array([self._grb_sense(sense) for sense in senses]), np.asarray(rhs))
+
+        handles = list(range(self._next_handle, self._next_handle + len(senses)))
+        self._next_handle += len(senses)
+        for i, handle in enumerate(handles):
+            self._constraints[handle] = constrs[i]
+
+        return handles
+
+    @staticmethod
+    def _grb_sense(sense: str) -> str:
+        return grb.GRB.GREATER_EQUAL if sense == ">=" else grb.GRB.LESS_EQUAL
+
+    def remove_constraint(self, constr):
+        # The removal is applied with the next update or optimize
+        self._model.remove(self._constraints.pop(constr))
+
+    def solve(self) -> bool:
+
+        self._model.optimize()
+        self._iterations = int(self._model.IterCount)
+
+        return self._feasible(self._model)
+
+    def minimize(self, var_idx: np.array, coeffs: np.array) -> Optional[float]:
+
+        self._model.setObjective(np.asarray(coeffs, dtype=np.float64) @ self._variables[var_idx],
+                                 grb.GRB.MINIMIZE)
+
+        try:
+            self._model.optimize()
+            self._iterations = int(self._model.IterCount)
+
+            # All variables used by VeriNet are bounded, so INF_OR_UNBD from presolve means infeasible
+            if self._model.status == grb.GRB.INF_OR_UNBD:
+                return None
+
+            return self._model.ObjVal if self._feasible(self._model) else None
+
+        finally:
+            self._model.setObjective(grb.LinExpr())
+
+    def solve_each(self, var_idx: np.array, coeffs: np.array, senses: list, rhs: np.array,
+                   num_threads: int = 1) -> list:
+
+        num_threads = min(num_threads, len(senses))
+        if num_threads <= 1:
+            return super().solve_each(var_idx, coeffs, senses, rhs)
+
+        # The copies are made and updated here, before any thread uses them, since the model isn't thread-safe
+        self._model.update()
+        while len(self._thread_models) < num_threads:
+            self._thread_models.append(_GurobiModelCopy(self._model, self._constraints, self._bounds))
+        for model_copy in self._thread_models[:num_threads]:
+            self._update_copy(model_copy)
+
+        groups = [list(range(i, len(senses), num_threads)) for i in range(num_threads)]
+        executor = self._get_executor(num_threads)
+        futures = [executor.submit(self._solve_group, self._thread_models[i], var_idx, coeffs, senses, rhs, group)
+                   for i, group in enumerate(groups)]
+
+        results = [None] * len(senses)
+        self._iterations = 0
+
+        for group, future in zip(groups, futures):
+            group_results, iterations = future.result()
+            self._iterations += iterations
+            for i, result in zip(group, group_results):
+                results[i] = result
+
+        return results
+
+    def _update_copy(self, model_copy):
+
+        """
+        Updates the bounds and constraints of a copy used by solve_each() to those of the model.
+
+        The model has to be updated before calling this method.
+
+        Args:
+            model_copy  : The _GurobiModelCopy
+        """
+
+        changed = np.nonzero((model_copy.bounds != self._bounds).any(axis=1))[0]
+        if len(changed) > 0:
+            model_copy.mvar[changed].setAttr("LB", self._bounds[changed, 0])
+            model_copy.mvar[changed].setAttr("UB", self._bounds[changed, 1])
+            model_copy.bounds[changed] = self._bounds[changed]
+
+        for handle in [handle for handle in model_copy.constraints if handle not in self._constraints]:
+            model_copy.model.remove(model_copy.constraints.pop(handle))
+
+        for handle, constr in self._constraints.items():
+            if handle not in model_copy.constraints:
+                constr = constr.item()
+                row = self._model.getRow(constr)
+                expr = grb.LinExpr([row.getCoeff(j) for j in range(row.size())],
+                                   [model_copy.variables[row.getVar(j).index] for j in range(row.size())])
+                model_copy.constraints[handle] = model_copy.model.addLConstr(expr, constr.Sense, constr.RHS)
+
+    def _solve_group(self, model_copy, var_idx: np.array, coeffs: np.array, senses: list, rhs: np.array,
+                     group: list) -> tuple:
+
+        """
+        Solves the problems of solve_each() with the indices in group on a copy of the model.
+
+        Returns:
+            (list with (feasible, values) for each index in group, the total number of simplex iterations)
+        """
+
+        model = model_copy.model
+        variables = model_copy.mvar[var_idx]
+
+        results = []
+        iterations = 0
+
+        for i in group:
+            constr = model.addMConstr(sparse.csr_matrix(np.atleast_2d(coeffs[i])), variables,
+                                      self._grb_sense(senses[i]), np.array([rhs[i]]))
+            model.optimize()
+            iterations += int(model.IterCount)
+
+            feasible = self._feasible(model)
+            results.append((feasible, np.array(model.getAttr("X", model_copy.variables)) if feasible else None))
+            model.remove(constr)
+
+        # Applies the removal, so the copy matches the model in the next _update_copy()
+        model.update()
+
+        return results, iterations
+
+    @staticmethod
+    def _feasible(model) -> bool:
+
+        """
+        Returns True if the last optimize found an assignment and False if the system is infeasible.
+        """
+
+        if model.status == grb.GRB.OPTIMAL:  # Found an assignment
+            return True
+        elif model.status == grb.GRB.INFEASIBLE:  # Infeasible system
+            return False
+        else:
+            raise UnexpectedGurobiStatusException(f"Gurobi status: {model.status}")
+
+    def get_values(self) -> Optional[np.array]:
+
+        try:
+            return self._variables.X.copy()
+        except (AttributeError, grb.GurobiError):
+            # Values not assigned, solve() probably hasn't been called
+            return None
+
+    def get_basis(self) -> Optional[tuple]:
+
+        """
+        Returns (VBasis, {constraint handle: CBasis}) of the last solve, or None if Gurobi has no basis.
+        """
+
+        try:
+            vbasis = self._variables.VBasis
+            cbasis = {handle: int(constr.CBasis) for handle, constr in self._constraints.items()}
+        except (AttributeError, grb.GurobiError):
+            return None
+
+        return vbasis, cbasis
+
+    def set_basis(self, basis: tuple):
+
+        """
+        Sets VBasis and CBasis from a basis returned by get_basis().
+
+        Constraints added after the basis was stored get a basic slack, which keeps the basis dual feasible so the
+        dual simplex continues from it.
+        """
+
+        vbasis, cbasis = basis
+
+        self._variables.setAttr("VBasis", vbasis)
+        for handle, constr in self._constraints.items():
+            constr.setAttr("CBasis", cbasis.get(handle, 0))
+
+    def reset_basis(self):
+        self._model.reset(0)
+
+
+class _GurobiModelCopy:
+
+    """
+    A copy of the model of a GurobiBackend in its own environment, used by one thread in solve_each().
+    """
+
+    def __init__(self, model, constraints: dict, bounds: np.array):
+
+        """
+        Args:
+            model       : The updated Gurobi model to copy
+            constraints : A dict with the constraint handles of the backend and the Gurobi constraints
+            bounds      : The Nx2 array with the variable bounds of the model
+        """
+
+        self.env = grb.Env(params={"OutputFlag": 0, "LogFile": ""})
+        self.model = model.copy(env=self.env)
+        self.variables = self.model.getVars()
+        self.mvar = grb.MVar.fromlist(self.variables)
+
+        copied_constraints = self.model.getConstrs()
+        self.constraints = {handle: copied_constraints[constr.item().index] for handle, constr in constraints.items()}
+        self.bounds = bounds.copy()
+
+
+class ScipyBackend(LPBackend):
+
+    """
+    LP backend using the HiGHS solver through scipy.optimize.linprog.
+
+    The constraints are stored as dense rows and the constraint matrix is only rebuilt when the constraints changed
+    since the last solve. linprog doesn't accept a starting basis, so every solve starts from scratch.
+    """
+
+    def __init__(self, num_variables: int):
+
+        """
+        Args:
+            num_variables   : The number of variables, all variables are initially unbounded.
+        """
+
+        super().__init__(num_variables)
+
+        self._bounds = np.zeros((num_variables, 2))
+        self._bounds[:, 0] = -np.inf
+        self._bounds[:, 1] = np.inf
+
+        self._constraints = {}
+        self._next_handle = 0
+        self._a_ub = None
+        self._b_ub = None
+        self._values = None
+
+    def set_bounds(self, var_idx: np.array, lower: np.array, upper: np.array):
+        self._bounds[var_idx, 0] = lower
+        self._bounds[var_idx, 1] = upper
+
+    def get_bounds(self, var_idx: np.array) -> tuple:
+        return self._bounds[var_idx, 0].copy(), self._bounds[var_idx, 1].copy()
+
+    def add_constraint(self, var_idx: np.array, coeffs: np.array, sense: str, rhs: float):
+
+        # Stored as a <= constraint
+        sign = -1 if sense == ">=" else 1
+        row = np.zeros(self._num_variables)
+        row[var_idx] = sign * np.asarray(coeffs, dtype=np.float64)
+
+        handle = self._next_handle
+        self._next_handle += 1
+        self._constraints[handle] = (row, sign * rhs)
+        self._a_ub = None
+
+        return handle
+
+    def remove_constraint(self, constr):
+        del self._constraints[constr]
+        self._a_ub = None
+
+    def solve(self) -> bool:
+
+        self._values = None
+        self._iterations = 0
+
+        if (self._bounds[:, 0] > self._bounds[:, 1]).any():
+            return False
+
+        feasible, self._values, self._iterations = self._linprog(*self._constraint_matrix())
+
+        return feasible
+
+    def minimize(self, var_idx: np.array, coeffs: np.array) -> Optional[float]:
+
+        self._iterations = 0
+
+        if (self._bounds[:, 0] > self._bounds[:, 1]).any():
+            return None
+
+        objective = np.zeros(self._num_variables)
+        objective[var_idx] = coeffs
+
+        a_ub, b_ub = self._constraint_matrix()
+        result = linprog(objective, A_ub=a_ub, b_ub=b_ub, bounds=self._bounds, method="highs")
+        self._iterations = int(result.nit)
+
+        if result.status == 0:
+            return result.fun
+        elif result.status == 2:  # Infeasible system
+            return None
+        else:
+            raise UnexpectedLPStatusException(f"HiGHS status: {result.status}, {result.message}")
+
+    def solve_each(self, var_idx: np.array, coeffs: np.array, senses: list, rhs: np.array,
+                   num_threads: int = 1) -> list:
+
+        self._iterations = 0
+
+        if (self._bounds[:, 0] > self._bounds[:, 1]).any():
+            return [(False, None)] * len(senses)
+
+        a_ub, b_ub = self._constraint_matrix()
+
+        def solve_one(i: int) -> tuple:
+            sign = -1 if senses[i] == ">=" else 1
+            row = np.zeros((1, self._num_variables))
+            row[0, var_idx] = sign * np.asarray(coeffs[i], dtype=np.float64)
+
+            if a_ub is None:
+                return self._linprog(row, np.array([sign * rhs[i]]))
+            return self._linprog(np.vstack((a_ub, row)), np.append(b_ub, sign * rhs[i]))
+
+        num_threads = min(num_threads, len(senses))
+        if num_threads > 1:
+            results = list(self._get_executor(num_threads).map(solve_one, range(len(senses))))
+        else:
+            results = [solve_one(i) for i in range(len(senses))]
+
+        self._iterations = sum(iterations for _, _, iterations in results)
+
+        return [(feasible, values) for feasible, values, _ in results]
+
+    def _constraint_matrix(self) -> tuple:
+
+        """
+        Returns (A_ub, b_ub) with the current constraints, or (None, None) if there are no constraints.
+        """
+
+        if len(self._constraints) == 0:
+            return None, None
+
+        if self._a_ub is None:
+            self._a_ub = np.vstack([row for row, _ in self._constraints.values()])
+            self._b_ub = np.array([rhs for _, rhs in self._constraints.values()])
+
+        return self._a_ub, self._b_ub
+
+    def _linprog(self, a_ub: Optional[np.array], b_ub: Optional[np.array]) -> tuple:
+
+        """
+        Solves the feasibility problem with the current bounds and the given constraints.
+
+        Returns:
+            (feasible, values or None, simplex iterations)
+        """
+
+        result = linprog(np.zeros(self._num_variables), A_ub=a_ub, b_ub=b_ub, bounds=self._bounds, method="highs")
+
+        if result.status == 0:  # Found an assignment
+            return True, result.x, int(result.nit)
+        elif result.status == 2:  # Infeasible system
+            return False, None, int(result.nit)
+        else:
+            raise UnexpectedLPStatusException(f"HiGHS status: {result.status}, {result.message}")
+
+    def get_values(self) -> Optional[np.array]:
+        return self._values
+
+
+LP_BACKENDS = {"gurobi": GurobiBackend, "scipy": ScipyBackend}
+
+
+def create_lp_backend(backend: str, num_variables: int) -> LPBackend:
+
+    """
+    Creates the LP backend with the given name, see LP_BACKENDS.
+    """
+
+    if backend not in LP_BACKENDS:
+        raise ValueError(f"Unknown LP backend: {backend}")
+
+    return LP_BACKENDS[backend](num_variables)
+
+
+class LPSolverException(Exception):
+    pass
+
+
+class LPBackendNotAvailableException(LPSolverException):
+    pass
+
+
+class UnexpectedLPStatusException(LPSolverException):
+    pass
+
+
+class UnexpectedGurobiStatusException(UnexpectedLPStatusException):
+    pass
@@ -2,91 +2,113 @@
 """
 This file contains the LPSolver part of the algorithm
 
-The LPSolver uses the symbolic bounds and the Gurobi solver to verify properties as Safe, or to produce candidates for
-counter examples.
+The LPSolver uses the symbolic bounds and an LP solver, see lp_backends.py, to verify properties as Safe, or to produce
+candidates for counter examples.
 
 Author: Patrick Henriksen <patrick@henriksen.as>
 """
 
-import os
+import time
+from typing import Optional
+
 import numpy as np
-import gurobipy as grb
 
 from src.algorithm.esip import ESIP
+from src.algorithm.lp_backends import create_lp_backend, LPBackend, LPSolverException, \
+    UnexpectedGurobiStatusException, UnexpectedLPStatusException, LPBackendNotAvailableException
 
 
 class LPSolver:
 
     """
-    The LPSolver class combines the symbolic bounds from ESIP and Gurobi LPSolver to verify properties as safe
+    The LPSolver class combines the symbolic bounds from ESIP and an LP solver to verify properties as safe
     or produce candidates for counter examples
     """
 
-    def __init__(self, input_size: int, output_size: int):
+    def __init__(self, input_size: int, output_size: int, backend: str = "gurobi", warm_start: bool = False):
 
         """
         Args:
               input_size    : The number of input nodes
               output_size   : The number of output nodes
+              backend       : The LP backend, "gurobi" or "scipy". See lp_backends.py.
+              warm_start    : If true, the basis of the last solve is kept, see basis and set_basis(). If false,
+                              the backend continues from the basis it has, see reset_basis().
         """
-        self._disable_log()
 
-        self._grb_solver = grb.Model("NN")
         self._input_size = input_size
         self._output_size = output_size
 
-        self._input_variables = None
-        self._output_variables = None
+        self._backend = create_lp_backend(backend, input_size + output_size)
+        self._input_idx = np.arange(input_size)
+        self._output_idx = np.arange(input_size, input_size + output_size)
+
+        self._warm_start = warm_start
+        self._basis = None
+
+        self._num_solves = 0
+        self._num_iterations = 0
+        self._solve_seconds = 0.
 
-        self._init_variables()
+    @property
+    def backend(self) -> LPBackend:
+        return self._backend
 
     @property
-    def grb_solver(self):
-        return self._grb_solver
+    def input_size(self) -> int:
+        return self._input_size
 
     @property
-    def input_variables(self):
-        return self._input_variables
+    def output_size(self) -> int:
+        return self._output_size
 
     @property
-    def output_variables(self):
-        return self._output_variables
+    def warm_start(self) -> bool:
+        return self._warm_start
 
-    def _init_variables(self):
+    @property
+    def basis(self):
 
         """
-        Initializes the Gurobi input and output variables
+        The basis of the last solve(), None if it didn't produce one or if warm start is disabled.
+        """
+
+        return self._basis
+
+    def set_basis(self, basis):
 
-        The default bounds on the variables are from the ESIP object. If output bounds are also given the
-        these are used to refine the bounds.
         """
+        Warm starts the next solve() from the given basis, typically stored from the parent branch.
 
-        self._remove_variables()
+        Args:
+            basis   : A basis from the basis property, ignored if None or if warm start is disabled.
+        """
 
-        self._input_variables = (self._grb_solver.addVars(range(self._input_size), lb=-grb.GRB.INFINITY,
-                                                          ub=grb.GRB.INFINITY,
-                                                          vtype=grb.GRB.CONTINUOUS, name="Input"))
-        self._output_variables = (self._grb_solver.addVars(range(self._output_size), lb=-grb.GRB.INFINITY,
-                                                           ub=grb.GRB.INFINITY,
-                                                           vtype=grb.GRB.CONTINUOUS, name="Output"))
+        if self._warm_start and basis is not None:
+            self._backend.set_basis(basis)
 
-        self._grb_solver.update()
+    def reset_basis(self):
 
-    # noinspection PyArgumentList
-    def _remove_variables(self):
+        """
+        Discards the basis kept by the backend, so the next solve() starts from scratch.
+        """
+
+        self._backend.reset_basis()
+
+    @property
+    def stats(self) -> dict:
 
         """
-        Removes all variables initialized from nn_bounds
+        The number of calls to solve(), the simplex iterations and the total time spent in them, since the last call
+        to reset_stats().
         """
 
-        if self._input_variables is not None:
-            self.grb_solver.remove(self._input_variables)
-            self._input_variables = None
-        if self._output_variables is not None:
-            self.grb_solver.remove(self._output_variables)
-            self._node_variables = None
+        return {"solves": self._num_solves, "iterations": self._num_iterations, "solve_seconds": self._solve_seconds}
 
-        self._grb_solver.update()
+    def reset_stats(self):
+        self._num_solves = 0
+        self._num_iterations = 0
+        self._solve_seconds = 0.
 
     def solve(self) -> bool:
 
@@ -101,20 +123,145 @@ class LPSolver:
             True if the system is feasible, else False
         """
 
-        # Uncommenting this line avoids gurobi _status code 4(INF_OR_UNBD)
-        # self._grb_solver.setParam("DualReductions", 0)
+        start = time.time()
+        result = self._backend.solve()
+
+        if self._warm_start:
+            # The basis has to be read before the next modification of the problem
+            self._basis = self._backend.get_basis()
+
+        self._num_solves += 1
+        self._num_iterations += self._backend.iterations
+        self._solve_seconds += time.time() - start
+
+        return result
+
+    def minimize_input(self, coeffs: np.array, constant: float) -> Optional[float]:
+
+        """
+        Minimises coeffs @ x + constant, where x are the input variables, subject to the current constraints.
+
+        Args:
+            coeffs      : The coefficients of the input variables
+            constant    : The constant term
+        Returns:
+            The minimum, or None if the system is infeasible
+        """
+
+        start = time.time()
+        value = self._backend.minimize(self._input_idx, coeffs)
+
+        self._num_solves += 1
+        self._num_iterations += self._backend.iterations
+        self._solve_seconds += time.time() - start
+
+        return None if value is None else value + constant
+
+    def maximize_input(self, coeffs: np.array, constant: float) -> Optional[float]:
+
+        """
+        Maximises coeffs @ x + constant, where x are the input variables, subject to the current constraints.
+
+        Args:
+            coeffs      : The coefficients of the input variables
+            constant    : The constant term
+        Returns:
+            The maximum, or None if the system is infeasible
+        """
+
+        value = self.minimize_input(-np.asarray(coeffs), -constant)
+
+        return None if value is None else -value
+
+    def solve_each_input_constraint(self, coeffs: np.array, constants: np.array, senses: list, rhs: np.array,
+                                    num_threads: int = 1) -> list:
+
+        """
+        Solves the system once for each of the given input constraints, with only that constraint added.
+
+        The constraints aren't kept and the basis isn't stored for warm starts.
+
+        Args:
+            coeffs      : A KxN matrix with the coefficients of the input variables
+            constants   : The constant terms of the left hand sides
+            senses      : A list with ">=" or "<=" for each constraint
+            rhs         : The right hand sides
+            num_threads : The maximum number of threads used to solve the systems concurrently
+        Returns:
+            A list with (feasible, input_values, output_values) for each constraint. The values are None if the
+            system is infeasible.
+        """
+
+        start = time.time()
 
-        # Using dual simplex as it is numerically stable and the fastest for our tests
-        self._grb_solver.setParam("Method", 0)
+        results = self._backend.solve_each(self._input_idx, coeffs, senses,
+                                           np.asarray(rhs, dtype=np.float64) - np.asarray(constants), num_threads)
 
-        self._grb_solver.optimize()
+        self._num_solves += len(senses)
+        self._num_iterations += self._backend.iterations
+        self._solve_seconds += time.time() - start
 
-        if self._grb_solver.status == 2:  # Found an assignment
-            return True
-        elif self._grb_solver.status == 3:  # Infeasible system
-            return False
-        else:
-            raise UnexpectedGurobiStatusException(f"Gurobi _status: {self._grb_solver._status}")
+        return [(feasible, None, None) if values is None else
+                (feasible, values[self._input_idx], values[self._output_idx]) for feasible, values in results]
+
+    def add_input_constraint(self, coeffs: np.array, constant: float, sense: str, rhs: float):
+
+        """
+        Adds the constraint coeffs @ x + constant (sense) rhs, where x are the input variables.
+
+        Args:
+            coeffs      : The coefficients of the input variables
+            constant    : The constant term of the left hand side
+            sense       : ">=" or "<="
+            rhs         : The right hand side
+        Returns:
+            The constraint handle, used with remove_constraint()
+        """
+
+        return self._backend.add_constraint(self._input_idx, coeffs, sense, rhs - constant)
+
+    def add_input_constraints(self, coeffs: np.array, constants: np.array, senses: list, rhs: np.array) -> list:
+
+        """
+        Adds the constraints coeffs[i] @ x + constants[i] (senses[i]) rhs[i] in one call to the backend.
+
+        Args:
+            coeffs      : A KxN matrix with the coefficients of the input variables
+            constants   : The constant terms of the left hand sides
+            senses      : A list with ">=" or "<=" for each constraint
+            rhs         : The right hand sides
+        Returns:
+            A list with the constraint handles, used with remove_constraint()
+        """
+
+        return self._backend.add_constraints(self._input_idx, coeffs, senses,
+                                             np.asarray(rhs, dtype=np.float64) - np.asarray(constants))
+
+    def remove_constraint(self, constr):
+
+        """
+        Removes a constraint added with add_input_constraint().
+        """
+
+        self._backend.remove_constraint(constr)
+
+    def output_upper_bound(self, node: int) -> float:
+
+        """
+        Returns the current upper bound of the given output variable.
+        """
+
+        return self._backend.get_bounds(self._output_idx[node:node + 1])[1][0]
+
+    def set_output_upper_bound(self, node: int, upper: float):
+
+        """
+        Sets the upper bound of the given output variable, keeping the lower bound.
+        """
+
+        idx = self._output_idx[node:node + 1]
+        lower = self._backend.get_bounds(idx)[0]
+        self._backend.set_bounds(idx, lower, np.array([upper]))
 
     # noinspection PyArgumentList
     def set_variable_bounds(self, bounds: ESIP, output_bounds: np.array=None, set_input: bool=True):
@@ -130,15 +277,8 @@ class LPSolver:
             set_input       : If False, the input variables aren't adjusted
         """
 
-        if self._input_variables is None or self._output_variables is None:
-            raise VariablesNotInitializedException("set_input_bounds() called before input variables where initialized")
-
         if set_input:
-            input_bounds_lower = bounds.bounds_concrete[0][:, 0]
-            input_bounds_upper = bounds.bounds_concrete[0][:, 1]
-
-            for node_num, var in enumerate(self._input_variables.select()):
-                var.lb, var.ub = input_bounds_lower[node_num], input_bounds_upper[node_num]
+            self._backend.set_bounds(self._input_idx, bounds.bounds_concrete[0][:, 0], bounds.bounds_concrete[0][:, 1])
 
         output_bounds_lower = bounds.bounds_concrete[-1][:, 0].copy()
         output_bounds_upper = bounds.bounds_concrete[-1][:, 1].copy()
@@ -150,10 +290,7 @@ class LPSolver:
             output_bounds_lower[better_lower_idx] = output_bounds[better_lower_idx, 0]
             output_bounds_upper[better_upper_idx] = output_bounds[better_upper_idx, 1]
 
-        for node_num, var in enumerate(self._output_variables.select()):
-            var.lb, var.ub = output_bounds_lower[node_num], output_bounds_upper[node_num]
-
-        self._grb_solver.update()
+        self._backend.set_bounds(self._output_idx, output_bounds_lower, output_bounds_upper)
 
     # noinspection PyArgumentList
     def get_assigned_values(self) -> tuple:
@@ -167,44 +304,14 @@ class LPSolver:
             (input_values, output_values)
         """
 
-        try:
-            input_values = [var.x for var in self._input_variables.select()]
-        except AttributeError:
-            # Values not assigned, solve() probably hasn't been called
-            input_values = None
+        values = self._backend.get_values()
 
-        try:
-            output_values = [var.x for var in self._output_variables.select()]
-        except AttributeError:
+        if values is None:
             # Values not assigned, solve() probably hasn't been called
-            output_values = None
+            return np.array(None), np.array(None)
 
-        return np.array(input_values), np.array(output_values)
-
-    # noinspection PyMethodMayBeStatic
-    def _disable_log(self):
-
-        """
-        Remove the automatically created Gurobi log file and disable future logging.
-        """
-
-        # Get rid of log file
-        grb.setParam("OutputFlag", 0)
-        grb.setParam("LogFile", "")
-        try:
-            # os.remove("./gurobi.log")
-            pass
-        except FileNotFoundError:
-            pass
-
-
-class LPSolverException(Exception):
-    pass
+        return values[self._input_idx], values[self._output_idx]
 
 
 class VariablesNotInitializedException(LPSolverException):
     pass
-
-
-class UnexpectedGurobiStatusException(LPSolverException):
-    pass
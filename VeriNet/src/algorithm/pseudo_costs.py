@@ -0,0 +1,252 @@
+"""
+Pseudo-costs of the hidden nodes, used by the "pseudo_cost" branching strategy.
+
+The pseudo-cost of a node is the mean improvement observed when splitting the node, see
+Strategist.split_improvement(). The statistics are stored in a fixed size hash table, so the table can be created
+and shared between the worker processes before the layer sizes of the network are known. Each slot stores the
+(layer, node) key it was claimed for and collisions are resolved by linear probing, so different nodes never share
+statistics. Only split nodes are recorded, which are far fewer than the slots even for large convolutional
+networks; if no free slot is found within PSEUDO_COST_MAX_PROBES slots, the observation is dropped.
+"""
+
+import os
+from typing import Optional
+
+import numpy as np
+
+from src.algorithm.esip import ESIP
+from src.algorithm.splitmans import Splitmans
+from src.algorithm.strategist import Strategist
+from src.algorithm.verification_objectives import VerificationObjective
+
+# The number of slots in the table of pseudo-costs
+PSEUDO_COST_SLOTS = 2**16
+
+# The maximum number of slots searched for a node
+PSEUDO_COST_MAX_PROBES = 64
+
+# The size of the statistics array, the counts, summed improvements and keys of all slots
+PSEUDO_COST_STATS_SIZE = 3 * PSEUDO_COST_SLOTS
+
+
+class PseudoCosts:
+
+    """
+    A store of pseudo-costs, called like the strategies in strategist.STRATEGIES.
+
+    The strategy selects the node with the largest score, where the score is the weighted error of the node
+    normalised by the largest weighted error plus weight times the pseudo-cost normalised by the largest
+    pseudo-cost of the candidates. Nodes without observations get the mean pseudo-cost of the observed candidates.
+    """
+
+    def __init__(self, shared_stats=None, weight: float = 1.):
+
+        """
+        Args:
+            shared_stats    : A multiprocessing Array("d", PSEUDO_COST_STATS_SIZE) with the counts, the summed
+                              improvements and the keys of the slots, shared by all workers. If None, the statistics
+                              are only kept locally.
+            weight          : The weight of the pseudo-costs in the score
+        """
+
+        self._shared_stats = shared_stats
+        self._weight = weight
+
+        if shared_stats is None:
+            stats = np.zeros(PSEUDO_COST_STATS_SIZE)
+        else:
+            stats = np.frombuffer(shared_stats.get_obj(), dtype=np.float64)
+
+        self._stats = stats
+        self._counts = stats[:PSEUDO_COST_SLOTS]
+        self._improvements = stats[PSEUDO_COST_SLOTS:2 * PSEUDO_COST_SLOTS]
+        self._keys = stats[2 * PSEUDO_COST_SLOTS:]
+
+    @property
+    def num_observations(self) -> int:
+        return int(self._counts.sum())
+
+    @staticmethod
+    def _keys_of(layers: np.array, nodes: np.array) -> np.array:
+
+        """
+        Returns the keys of the given nodes, 0 is used for empty slots.
+
+        The keys are exact in the float64 statistics array for layers < 2**20 and nodes < 2**32.
+        """
+
+        return np.asarray(layers, dtype=np.int64) * 2**32 + np.asarray(nodes, dtype=np.int64) + 1
+
+    @staticmethod
+    def _first_slots(keys: np.array) -> np.array:
+
+        """
+        Returns the first slot searched for each key, using Fibonacci hashing.
+        """
+
+        hashed = np.atleast_1d(keys).astype(np.uint64) * np.uint64(11400714819323198485)
+
+        return (hashed >> np.uint64(64 - 16)).astype(np.int64) % PSEUDO_COST_SLOTS
+
+    def _slot(self, layer: int, node: int, claim: bool = False) -> Optional[int]:
+
+        """
+        Returns the slot of the node, or None if the node has no slot.
+
+        Args:
+            layer   : The layer of the node
+            node    : The node
+            claim   : If true, a free slot is claimed for the node if it doesn't have one
+        """
+
+        key = self._keys_of(layer, node)
+        first_slot = int(self._first_slots(key)[0])
+
+        for probe in range(PSEUDO_COST_MAX_PROBES):
+
+            slot = (first_slot + probe) % PSEUDO_COST_SLOTS
+
+            if self._keys[slot] == key:
+                return slot
+            if self._keys[slot] == 0:
+                if not claim:
+                    return None
+                self._keys[slot] = key
+                return slot
+
+        return None
+
+    def _slots(self, layers: np.array, nodes: np.array) -> np.array:
+
+        """
+        Returns the slots of the given nodes, -1 for nodes without a slot.
+        """
+
+        keys = self._keys_of(layers, nodes)
+        first_slots = self._first_slots(keys)
+        slots = -np.ones(len(keys), dtype=np.int64)
+        searching = np.arange(len(keys))
+
+        for probe in range(PSEUDO_COST_MAX_PROBES):
+
+            candidates = (first_slots[searching] + probe) % PSEUDO_COST_SLOTS
+            candidate_keys = self._keys[candidates]
+
+            found = candidate_keys == keys[searching]
+            slots[searching[found]] = candidates[found]
+
+            searching = searching[~found & (candidate_keys != 0)]
+            if len(searching) == 0:
+                break
+
+        return slots
+
+    def record(self, layer: int, node: int, improvement: float):
+
+        """
+        Records the improvement observed for a branch created by splitting the node.
+
+        Args:
+            layer       : The layer of the split node
+            node        : The split node
+            improvement : The improvement, see Strategist.split_improvement()
+        """
+
+        if self._shared_stats is None:
+            self._add_observation(layer, node, improvement)
+        else:
+            with self._shared_stats.get_lock():
+                self._add_observation(layer, node, improvement)
+
+    def _add_observation(self, layer: int, node: int, improvement: float):
+
+        """
+        Adds the observation to the slot of the node, dropping it if no free slot is found.
+        """
+
+        slot = self._slot(layer, node, claim=True)
+
+        if slot is not None:
+            self._counts[slot] += 1
+            self._improvements[slot] += improvement
+
+    def costs(self, node_indices: np.array) -> np.array:
+
+        """
+        Returns the pseudo-costs of the given nodes.
+
+        Args:
+            node_indices    : A Nx2 array with (layer_num, node_num) of each node
+        Returns:
+            The pseudo-cost of each node, nodes without observations get the mean of the observed nodes, or 0.
+        """
+
+        slots = self._slots(node_indices[:, 0], node_indices[:, 1])
+        counts = np.where(slots >= 0, self._counts[slots], 0)
+        observed = counts > 0
+
+        costs = np.zeros(len(slots))
+        costs[observed] = self._improvements[slots[observed]] / counts[observed]
+        if observed.any():
+            costs[~observed] = costs[observed].mean()
+
+        return costs
+
+    def __call__(self, bounds: ESIP, verification_objective: VerificationObjective, splitmans: Splitmans):
+
+        """
+        Returns the node with the largest score, see PseudoCosts.
+
+        Args:
+            See Strategist.default()
+        Returns:
+            (layer_num, node_num) of the node to split, None if no node has a positive weighted error.
+        """
+
+        if bounds.error_matrix[-1].shape[1] == 0:
+            return None
+
+        output_weights = verification_objective.output_refinement_weights(bounds)
+        weighted_error = Strategist.weighted_error(bounds, output_weights=output_weights)
+        max_error = weighted_error.max()
+        if max_error <= 0:
+            return None
+
+        node_indices = bounds._error_matrix_to_node_indices[-1]
+        costs = self.costs(node_indices)
+        max_cost = costs.max()
+
+        scores = weighted_error / max_error
+        if max_cost > 0:
+            scores += self._weight * costs / max_cost
+        scores[weighted_error <= 0] = -np.inf
+
+        return node_indices[np.argmax(scores)]
+
+    def save(self, path: str):
+
+        """
+        Saves the pseudo-costs to a .npy file, the path should end with ".npy".
+        """
+
+        np.save(path, self._stats)
+
+    def load(self, path: str) -> bool:
+
+        """
+        Loads pseudo-costs saved by save(), replacing the current statistics.
+
+        Returns:
+            True if the file existed and was loaded, else False.
+        """
+
+        if not os.path.isfile(path):
+            return False
+
+        stats = np.load(path)
+        if stats.shape != (PSEUDO_COST_STATS_SIZE,):
+            raise ValueError(f"Pseudo-costs in {path} don't match the table size {PSEUDO_COST_SLOTS}")
+
+        self._stats[:] = stats
+
+        return True
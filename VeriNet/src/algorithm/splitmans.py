@@ -60,7 +60,8 @@ class Splitmans:
         """
         self._structure = structure[-1][:, 0]
         self._list_layers = np.unique(self._structure)
-        self._layer %= self._list_layers.size
+        if self._list_layers.size > 0:
+            self._layer %= self._list_layers.size
 
     def raise_layer(self) -> int:
         """
@@ -86,6 +87,21 @@ class Splitmans:
         """
         self._memory = memory
 
+    def filter_memory(self, keep: np.array, from_end: bool = False):
+        """
+        Memory-based strategy function. Removes the nodes of the stack that are not popped yet and not kept.
+
+        Args:
+            keep        : A boolean array with one element for each node in the stack.
+            from_end    : True if the stack is popped from the end.
+        """
+        pending = np.zeros(self.memory.shape[0], dtype=bool)
+        if from_end:
+            pending[:max(self.memory.shape[0] - self.index, 0)] = True
+        else:
+            pending[self.index:] = True
+        self._memory = self.memory[~pending | keep]
+
     def sort_by_layer(self):
         """
         Sorted and reverse sorted memory strategies function. Sorts stack.
@@ -21,15 +21,37 @@ import torch.optim as optim
 import numpy as np
 
 from src.algorithm.esip import ESIP
+from src.algorithm.esip_util import top_k_jit, weighted_error_top_k_jit
 from src.algorithm.verification_objectives import VerificationObjective
 from src.algorithm.splitmans import Splitmans
 
 
+# The number of candidates split tentatively by the lookahead strategy
+LOOKAHEAD_CANDIDATES = 4
+
+
 class Strategist:
     """ 
     Static class, where we define our strategies.
     """
 
+    def default(bounds: ESIP, verification_objective: VerificationObjective, splitmans: Splitmans):
+        """ 
+        Function implements the default VeriNet strategy.
+        Args:
+            bounds          : Neural network representation.
+
+            Splitmans       : Structure of the current strategy data, not used by this strategy.
+
+            verification_objective: The verification objective
+
+        Returns:
+            (layer_num, node_num) of the node with largest error effect on the output.
+        """
+        refine_output_weights = verification_objective.output_refinement_weights(
+            bounds)
+        return bounds.largest_error_split_node(output_weights=refine_output_weights)
+
     def load_new_set(bounds: ESIP, verification_objective: VerificationObjective, splitmans: Splitmans):
         """ 
         Function implements load of a list of nodes by memory-based strategies.
@@ -41,11 +63,73 @@ class Strategist:
             verification_objective: The verification objective
 
         Returns:
-            list[splitmans.memory_size] of the nodes (layer_num, node_num) with largest error effect on the output
+            list[splitmans.memory_size] of the nodes (layer_num, node_num) with largest error effect on the output,
+            fewer if fewer nodes have a positive error effect.
+        """
+        refine_output_weights = verification_objective.output_refinement_weights(
+            bounds)
+        weighted_error = Strategist.weighted_error(bounds, output_weights=refine_output_weights)
+        max_err_idx = top_k_jit(weighted_error, splitmans.memory_size)
+        return bounds._error_matrix_to_node_indices[-1][max_err_idx[weighted_error[max_err_idx] > 0]]
+
+    def valid_splits(bounds: ESIP, verification_objective: VerificationObjective, nodes: np.array) -> np.array:
+        """
+        Returns which of the given nodes still have a positive weighted error effect on the output.
+
+        Nodes split in an earlier branch are stable in this branch, so they have no column in the final error matrix.
+        Args:
+            bounds          : Neural network representation.
+
+            verification_objective: The verification objective
+
+            nodes           : A Nx2 array with (layer_num, node_num) of each node
+
+        Returns:
+            A boolean array with one element for each node.
         """
+        node_indices = bounds._error_matrix_to_node_indices[-1]
+        if node_indices.shape[0] == 0:
+            return np.zeros(nodes.shape[0], dtype=bool)
+
         refine_output_weights = verification_objective.output_refinement_weights(
             bounds)
-        return Strategist.largest_error_split_node(bounds, splitmans.memory_size, output_weights=refine_output_weights)
+        weighted_error = Strategist.weighted_error(bounds, output_weights=refine_output_weights)
+        positive = node_indices[weighted_error > 0]
+
+        stride = max(bounds.layer_sizes)
+        return np.isin(nodes[:, 0] * stride + nodes[:, 1], positive[:, 0] * stride + positive[:, 1])
+
+    def refresh_memory(bounds: ESIP, verification_objective: VerificationObjective, splitmans: Splitmans,
+                       sort: bool = False, from_end: bool = False):
+        """ 
+        Function removes the nodes of the memory that are no longer valid splits, see valid_splits(), before the
+        next node is popped by the memory-based strategies. A new set is loaded if no nodes are left to pop.
+        Args:
+            bounds          : Neural network representation.
+
+            Splitmans       : Structure of the current strategy data.
+
+            verification_objective: The verification objective
+
+            sort            : If True, a new set is sorted by layer.
+
+            from_end        : True if the nodes are popped from the end of the memory.
+
+        Returns:
+            False if no node has a positive error effect on the output, else True.
+        """
+        if splitmans.memory.size > 0:
+            splitmans.filter_memory(Strategist.valid_splits(bounds, verification_objective, splitmans.memory),
+                                    from_end=from_end)
+
+        if splitmans.index >= splitmans.memory.shape[0]:
+            splitmans.set_memory(Strategist.load_new_set(
+                bounds, verification_objective, splitmans))
+            splitmans.null_index()
+            if sort:
+                splitmans.sort_by_layer()
+
+        return splitmans.memory.shape[0] > 0
 
     def pop_first(bounds: ESIP, verification_objective: VerificationObjective, splitmans: Splitmans):
         """ 
@@ -60,9 +144,8 @@ class Strategist:
         Returns:
             (layer_num, node_num) of the node with largest error effect via simple memory strategy.
         """
-        if splitmans.memory.size == 0:
-            splitmans.set_memory(Strategist.load_new_set(
-                bounds, verification_objective, splitmans))
+        if not Strategist.refresh_memory(bounds, verification_objective, splitmans):
+            return None
 
         split = splitmans.memory[splitmans.index]
         splitmans.raise_index()
@@ -86,10 +169,8 @@ class Strategist:
         Returns:
             (layer_num, node_num) of the node with largest error effect on the output via sorted memory strategy.
         """
-        if splitmans.memory.size == 0:
-            splitmans.set_memory(Strategist.load_new_set(
-                bounds, verification_objective, splitmans))
-            splitmans.sort_by_layer()
+        if not Strategist.refresh_memory(bounds, verification_objective, splitmans, sort=True):
+            return None
 
         split = splitmans.memory[splitmans.index]
         splitmans.raise_index()
@@ -114,10 +195,8 @@ class Strategist:
         Returns:
             (layer_num, node_num) of the node with largest error effect on the output via reverse-sorted memory strategy.
         """
-        if splitmans.memory.size == 0:
-            splitmans.set_memory(Strategist.load_new_set(
-                bounds, verification_objective, splitmans))
-            splitmans.sort_by_layer()
+        if not Strategist.refresh_memory(bounds, verification_objective, splitmans, sort=True, from_end=True):
+            return None
 
         split = splitmans.memory[-(1+splitmans.index)]
         splitmans.raise_index()
@@ -164,6 +243,60 @@ class Strategist:
             bounds, verification_objective, splitmans)
         return split
 
+    def lookahead(bounds: ESIP, verification_objective: VerificationObjective, splitmans: Splitmans,
+                  num_candidates: int = None):
+        """ 
+        Function implements a strong branching strategy.
+
+        The num_candidates nodes with the largest error effect on the output are split tentatively. The bounds of
+        both halves of all candidates are calculated in one batched ESIP pass from the layer of the earliest
+        candidate, and the candidate with the largest worst-case output margin of its two halves is returned, see
+        VerificationObjective.output_margin(). A half with invalid bounds is infeasible and has an infinite margin.
+        Args:
+            bounds          : Neural network representation.
+
+            Splitmans       : Structure of the current strategy data, not used by this strategy.
+
+            verification_objective: The verification objective
+
+            num_candidates  : The number of candidates, LOOKAHEAD_CANDIDATES if None.
+
+        Returns:
+            (layer_num, node_num) of the candidate with the best worst-case margin.
+        """
+        num_candidates = LOOKAHEAD_CANDIDATES if num_candidates is None else num_candidates
+        refine_output_weights = verification_objective.output_refinement_weights(
+            bounds)
+        candidates = Strategist.largest_error_split_node(
+            bounds, num_candidates, output_weights=refine_output_weights)
+
+        if candidates is None:
+            # Fewer than num_candidates nodes with a positive error effect
+            return Strategist.default(bounds, verification_objective, splitmans)
+        if len(candidates) == 1:
+            return candidates[0]
+
+        # The parents bounds are valid for both halves, so they are used as forced bounds like in
+        # VeriNetWorker._branch(). Only the array of the split layer is copied.
+        forced_input_bounds_batch = []
+        for layer, node in candidates:
+            lower, upper = bounds.bounds_concrete[layer - 1][node]
+            split_x = bounds.mappings[layer].split_point(lower, upper)
+
+            for bound_idx in (1, 0):
+                forced_input_bounds = list(bounds.bounds_concrete)
+                forced_input_bounds[layer - 1] = forced_input_bounds[layer - 1].copy()
+                forced_input_bounds[layer - 1][node, bound_idx] = split_x
+                forced_input_bounds_batch.append(forced_input_bounds)
+
+        states = bounds.calc_bounds_batch(verification_objective.input_bounds_flat, forced_input_bounds_batch,
+                                          from_layer=int(candidates[:, 0].min()))
+        margins = np.array([np.inf if state is None else verification_objective.output_margin(state[0][-1])
+                            for state in states])
+        worst_case_margins = np.minimum(margins[0::2], margins[1::2])
+
+        return candidates[int(np.argmax(worst_case_margins))]
+
     def load_by_alternation(bounds: ESIP, verification_objective: VerificationObjective, splitmans: Splitmans):
         """ 
         Function implements load of a node by alternating heuristic strategy.
@@ -185,7 +318,9 @@ class Strategist:
         split = Strategist.load_by_alternation(
             bounds, verification_objective, splitmans)
         splitmans.alternate_index()
-        if not split.any():
+        # None if there are no unstable nodes, or no node with a positive error of the current sign. The other sign
+        # is tried before giving up, which returns None if there are no unstable nodes.
+        if split is None or not split.any():
             return Strategist.load_by_alternation(bounds, verification_objective, splitmans)
         return split
 
@@ -210,27 +345,20 @@ class Strategist:
         if bounds._error_matrix[-1].shape[1] == 0:
             return None
 
-        output_weights = np.ones(
-            (bounds.layer_sizes[-1], 2)) if output_weights is None else output_weights
-        output_weights[output_weights <= 0] = 0.01
-
+        # Only the negative errors are weighted on odd indices and only the positive errors on even indices
+        output_weights = Strategist._clamped_output_weights(bounds, output_weights)
+        sign_weights = np.zeros_like(output_weights)
         if splitmans.is_odd():
-            err_matrix_alt = bounds._error_matrix[-1].copy()
-            err_matrix_alt[err_matrix_alt > 0] = 0
-            err_matrix_alt = - err_matrix_alt * output_weights[:, 0:1]
+            sign_weights[:, 0] = output_weights[:, 0]
         else:
-            err_matrix_alt = bounds._error_matrix[-1].copy()
-            err_matrix_alt[err_matrix_alt < 0] = 0
-            err_matrix_alt = err_matrix_alt * output_weights[:, 1:2]
+            sign_weights[:, 1] = output_weights[:, 1]
 
-        weighted_error = (err_matrix_alt).sum(axis=0)
-        max_err_idx = weighted_error.argsort()[-splitmans.memory_size:][::-1]
+        weighted_error, max_err_idx = weighted_error_top_k_jit(bounds._error_matrix[-1], sign_weights, 1)
 
-        max_err_idx = np.argmax(weighted_error)
-        if weighted_error[max_err_idx] <= 0:
+        if weighted_error[max_err_idx[0]] <= 0:
             return None
         else:
-            return bounds._error_matrix_to_node_indices[-1][max_err_idx]
+            return bounds._error_matrix_to_node_indices[-1][max_err_idx[0]]
 
     def largest_error_by_layer(bounds, splitmans: Splitmans, output_weights: np.array = None):
         """
@@ -255,28 +383,72 @@ class Strategist:
         indices = splitmans.get_current_layer_indices()
         splitmans.raise_layer()
 
+        weighted_error = Strategist.weighted_error(bounds, output_weights=output_weights).copy()
+        weighted_error[indices] *= 10
+
+        max_err_idx = np.argmax(weighted_error)
+        if weighted_error[max_err_idx] <= 0:
+            return None
+        else:
+            return bounds._error_matrix_to_node_indices[-1][max_err_idx]
+
+    def weighted_error(bounds, output_weights: np.array = None) -> np.array:
+        """
+        Returns the weighted error effect on the output of each column of the final error matrix.
+
+        Args:
+            bounds          : Neural network representation
+
+            output_weights  : A Nx2 array with the weights for the lower bounds in column 1 and the upper bounds
+                              in column 2. All weights should be >= 0.
+        Returns:
+              The weighted errors, the nodes are given by bounds._error_matrix_to_node_indices[-1]. The array is
+              cached by ESIP.weighted_error() and should not be modified.
+        """
+
+        output_weights = Strategist._clamped_output_weights(bounds, output_weights)
+        return bounds.weighted_error(output_weights)
+
+    def _clamped_output_weights(bounds, output_weights: np.array = None) -> np.array:
+        """
+        Returns the output weights used for the weighted errors, ones if output_weights is None. Weights <= 0 are
+        set to 0.01 in place.
+        """
+
         output_weights = np.ones(
             (bounds.layer_sizes[-1], 2)) if output_weights is None else output_weights
         output_weights[output_weights <= 0] = 0.01
 
-        err_matrix_neg = bounds._error_matrix[-1].copy()
-        err_matrix_neg[err_matrix_neg > 0] = 0
+        return output_weights
 
-        err_matrix_pos = bounds._error_matrix[-1].copy()
-        err_matrix_pos[err_matrix_pos < 0] = 0
+    def bound_width(bounds: ESIP) -> float:
+        """
+        Returns the summed width of the concrete output bounds, used to measure the improvement of a split.
+        """
 
-        err_matrix_neg = - err_matrix_neg * output_weights[:, 0:1]
-        err_matrix_pos = err_matrix_pos * output_weights[:, 1:2]
+        output_bounds = bounds.bounds_concrete[-1]
+        return float((output_bounds[:, 1] - output_bounds[:, 0]).sum())
 
-        weighted_error = (err_matrix_neg + err_matrix_pos).sum(axis=0)
-        weighted_error[indices] *= 10
-        max_err_idx = weighted_error.argsort()[-splitmans.memory_size:][::-1]
+    def split_improvement(parent_width: float, bounds: ESIP, closed: bool) -> float:
+        """
+        Returns the improvement of a branch over the branch it was split from, used by the learned strategies.
 
-        max_err_idx = np.argmax(weighted_error)
-        if weighted_error[max_err_idx] <= 0:
-            return None
-        else:
-            return bounds._error_matrix_to_node_indices[-1][max_err_idx]
+        Args:
+            parent_width    : The bound_width() of the parent branch
+
+            bounds          : The bounds of the branch
+
+            closed          : True if the branch was verified safe
+        Returns:
+              1 if the branch was closed, else the relative decrease of the bound_width() in [0, 1].
+        """
+
+        if closed:
+            return 1.
+        if parent_width <= 0:
+            return 0.
+
+        return min(max((parent_width - Strategist.bound_width(bounds)) / parent_width, 0.), 1.)
 
     def largest_error_split_node(bounds, memory, output_weights: np.array = None):
         """
@@ -300,22 +472,48 @@ class Strategist:
         if bounds._error_matrix[-1].shape[1] == 0:
             return None
 
-        output_weights = np.ones(
-            (bounds.layer_sizes[-1], 2)) if output_weights is None else output_weights
-        output_weights[output_weights <= 0] = 0.01
-
-        err_matrix_neg = bounds._error_matrix[-1].copy()
-        err_matrix_neg[err_matrix_neg > 0] = 0
-        err_matrix_pos = bounds._error_matrix[-1].copy()
-        err_matrix_pos[err_matrix_pos < 0] = 0
-
-        err_matrix_neg = - err_matrix_neg * output_weights[:, 0:1]
-        err_matrix_pos = err_matrix_pos * output_weights[:, 1:2]
-
-        weighted_error = (err_matrix_neg + err_matrix_pos).sum(axis=0)
-        max_err_idx = weighted_error.argsort()[-memory:][::-1]
+        weighted_error = Strategist.weighted_error(bounds, output_weights=output_weights)
+        max_err_idx = top_k_jit(weighted_error, memory)
 
         if weighted_error[max_err_idx[-1]] <= 0:
             return None
         else:
             return bounds._error_matrix_to_node_indices[-1][max_err_idx]
+
+
+# The branching strategies selectable by name, see VeriNetWorker._branch()
+STRATEGIES = {
+    "default": Strategist.default,
+    "pop_first": Strategist.pop_first,
+    "pop_first_layer": Strategist.pop_first_layer,
+    "pop_last_layer": Strategist.pop_last_layer,
+    "alternate": Strategist.get_alternate_weights,
+    "best_by_layer": Strategist.get_best_by_layer,
+    "lookahead": Strategist.lookahead,
+}
+
+# The strategies using the memory size of the Splitmans
+MEMORY_STRATEGIES = ("pop_first", "pop_first_layer", "pop_last_layer")
+
+# The strategy selecting one of BANDIT_ARMS for each split, see strategy_bandit.py. It is not in STRATEGIES since it
+# keeps statistics, so each worker creates its own StrategyBandit.
+BANDIT_STRATEGY = "bandit"
+BANDIT_ARMS = ("default", "best_by_layer", "alternate")
+
+# The strategy blending the weighted error with the improvement observed for earlier splits of the same node, see
+# pseudo_costs.py. Like the bandit strategy, it keeps statistics.
+PSEUDO_COST_STRATEGY = "pseudo_cost"
+
+# All strategy names accepted by VeriNet and VeriNetWorker
+STRATEGY_NAMES = (*STRATEGIES, BANDIT_STRATEGY, PSEUDO_COST_STRATEGY)
+
+
+def get_strategy(strategy: str):
+    """
+    Returns the strategy function with the given name, see STRATEGIES.
+    """
+
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy: {strategy}")
+
+    return STRATEGIES[strategy]
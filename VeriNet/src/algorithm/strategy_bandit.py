@@ -0,0 +1,140 @@
+"""
+A branching strategy selecting one of the Strategist strategies for each split with a UCB1 bandit.
+
+The reward of a split is observed on each of the two branches it creates, see Strategist.split_improvement(): 1 if
+the branch is closed (verified safe) right away, else the relative decrease of the summed width of the concrete
+output bounds compared to the branch that was split. The statistics of all workers of a VeriNet object are merged
+through a shared array.
+"""
+
+from typing import Optional
+
+import numpy as np
+
+from src.algorithm.esip import ESIP
+from src.algorithm.splitmans import Splitmans
+from src.algorithm.strategist import BANDIT_ARMS, get_strategy
+from src.algorithm.verification_objectives import VerificationObjective
+
+
+class StrategyBandit:
+
+    """
+    UCB1 bandit over branching strategies, called like the strategies in strategist.STRATEGIES.
+
+    The statistics are updated locally and added to the shared statistics every merge_interval rewards, after which
+    the local view is replaced by the merged statistics of all workers.
+    """
+
+    def __init__(self, arms: tuple = BANDIT_ARMS, exploration: float = 0.5, shared_stats=None,
+                 merge_interval: int = 32):
+
+        """
+        Args:
+            arms            : The names of the strategies to select from, see strategist.STRATEGIES.
+            exploration     : The weight of the UCB1 exploration term
+            shared_stats    : A multiprocessing Array("d", 2 * len(arms)) with the counts followed by the summed
+                              rewards of all workers. If None, the statistics are only kept locally.
+            merge_interval  : The number of rewards between each merge with shared_stats
+        """
+
+        self._arms = tuple(arms)
+        self._strategies = [get_strategy(arm) for arm in self._arms]
+        self._exploration = exploration
+        self._shared_stats = shared_stats
+        self._merge_interval = merge_interval
+
+        self._counts = np.zeros(len(self._arms))
+        self._rewards = np.zeros(len(self._arms))
+        self._pending_counts = np.zeros(len(self._arms))
+        self._pending_rewards = np.zeros(len(self._arms))
+        self._num_pending = 0
+
+        self.last_arm: Optional[int] = None
+
+    @property
+    def arms(self) -> tuple:
+        return self._arms
+
+    @property
+    def stats(self) -> dict:
+
+        """
+        Returns a dictionary mapping each arm to the number of rewards and the mean reward in the local view.
+        """
+
+        return {arm: {"count": int(count), "mean_reward": reward / count if count > 0 else 0.}
+                for arm, count, reward in zip(self._arms, self._counts, self._rewards)}
+
+    def __call__(self, bounds: ESIP, verification_objective: VerificationObjective, splitmans: Splitmans):
+
+        """
+        Selects an arm and returns the split of its strategy. The selected arm is stored in last_arm.
+
+        Args:
+            See Strategist.default()
+        Returns:
+            (layer_num, node_num) of the node to split, None if there are no nodes to split.
+        """
+
+        self.last_arm = None
+        if bounds.error_matrix[-1].shape[1] == 0:
+            return None
+
+        self.last_arm = self.select()
+        return self._strategies[self.last_arm](bounds=bounds, verification_objective=verification_objective,
+                                               splitmans=splitmans)
+
+    def select(self) -> int:
+
+        """
+        Returns the index of the arm with the largest upper confidence bound, trying each arm once first.
+        """
+
+        untried = np.nonzero(self._counts == 0)[0]
+        if untried.size > 0:
+            return int(untried[0])
+
+        means = self._rewards / self._counts
+        return int(np.argmax(means + self._exploration * np.sqrt(np.log(self._counts.sum()) / self._counts)))
+
+    def reward(self, arm: int, reward: float):
+
+        """
+        Rewards the arm for one of the branches created by its split.
+
+        Args:
+            arm     : The arm that split the parent branch
+            reward  : The reward in [0, 1], see Strategist.split_improvement()
+        """
+
+        self._counts[arm] += 1
+        self._rewards[arm] += reward
+        self._pending_counts[arm] += 1
+        self._pending_rewards[arm] += reward
+        self._num_pending += 1
+
+        if self._num_pending >= self._merge_interval:
+            self.merge()
+
+    def merge(self):
+
+        """
+        Adds the rewards since the last merge to the shared statistics and reads back the merged statistics.
+        """
+
+        if self._shared_stats is None or self._num_pending == 0:
+            return
+
+        num_arms = len(self._arms)
+        with self._shared_stats.get_lock():
+            for i in range(num_arms):
+                self._shared_stats[i] += self._pending_counts[i]
+                self._shared_stats[num_arms + i] += self._pending_rewards[i]
+            merged = np.array(self._shared_stats[:])
+
+        self._counts = merged[:num_arms]
+        self._rewards = merged[num_arms:]
+        self._pending_counts[:] = 0
+        self._pending_rewards[:] = 0
+        self._num_pending = 0
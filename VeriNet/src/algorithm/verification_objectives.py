@@ -3,15 +3,14 @@
 This file contains objectives for the verification algorithms in VeriNet.
 
 Each _verification_objective contains callback functions for gradient descent loss, determining if a counter-example is
-valid, and gurobi constraints.
+valid, and LPSolver constraints.
 
 Author: Patrick Henriksen <patrick@henriksen.as>
 """
 
 import torch
 import numpy as np
-import gurobipy as grb
-from typing import Callable
+from typing import Callable, Optional
 
 from src.algorithm.esip import ESIP
 from src.algorithm.lp_solver import LPSolver
@@ -38,7 +37,6 @@ class VerificationObjective:
         """
 
         # Used to temporarily store lp_solver settings for the cleanup function.
-        self.vars = None
         self.constraints = None
 
         input_bounds = input_bounds.astype(np.float32)
@@ -115,6 +113,21 @@ class VerificationObjective:
 
         raise NotImplementedError("output_refinement_weights() not implemented in subclass")
 
+    def output_margin(self, output_bounds: np.array) -> float:
+
+        """
+        Should return a scalar margin of the verification problem for the given concrete output bounds, where a
+        positive margin means that the problem is safe and a larger margin is better. Used by the lookahead branching
+        strategy.
+
+        Args:
+            output_bounds: A Mx2 array with the concrete bounds of the outputs
+        Returns:
+            The margin
+        """
+
+        raise NotImplementedError("output_margin() not implemented in subclass")
+
     def grad_descent_losses(self, lp_output: np.array, bounds: ESIP) -> Callable:
 
         """
@@ -145,6 +158,33 @@ class VerificationObjective:
 
         raise NotImplementedError("is_counter_example() not implemented in subclass")
 
+    def counter_examples(self, y: np.array) -> np.array:
+
+        """
+        Returns a boolean array that is true for the rows of y that are valid counter-examples.
+
+        Args:
+            y: The outputs of the neural network for a batch of inputs
+        """
+
+        return np.array([self.is_counter_example(y[i:i+1]) for i in range(y.shape[0])], dtype=bool)
+
+    # noinspection PyUnusedLocal
+    def attack_losses(self, y: torch.Tensor, bounds: Optional[ESIP] = None) -> torch.Tensor:
+
+        """
+        Should return the loss of each input in a batch for the batched attack in attacks.py, lower values being
+        closer to a counter example.
+
+        Args:
+            y       : The outputs of the neural network for a batch of inputs
+            bounds  : The ESIP object, can be used to target the potential counter examples only. Can be None.
+        Returns:
+            A tensor with one loss per input
+        """
+
+        raise NotImplementedError("attack_losses() not implemented in subclass")
+
     def initial_settings(self, solver: LPSolver, bounds: ESIP, safe_classes: list):
 
         """
@@ -181,6 +221,35 @@ class VerificationObjective:
 
         raise NotImplementedError("configure_next_potential_counter() not implemented in subclass")
 
+    def potential_counter_constraints(self, bounds: ESIP) -> Optional[list]:
+
+        """
+        Can be implemented to let VeriNet solve the LPs of all potential counters in a branch in one call.
+
+        Should return the input constraints configure_next_potential_counter() would add for each of the remaining
+        potential counters, in the same order, as a list of (potential_counter, coeffs, constant, sense, rhs). VeriNet
+        calls select_potential_counter() before using the LP result of each potential counter.
+
+        Args:
+            bounds              : The ESIP object
+        Returns:
+            The list of constraints, or None if not supported.
+        """
+
+        return None
+
+    def select_potential_counter(self, potential_counter):
+
+        """
+        Makes a potential counter from potential_counter_constraints() the current one, like
+        configure_next_potential_counter() but without adding constraints to the LPSolver.
+
+        Args:
+            potential_counter   : The potential counter
+        """
+
+        raise NotImplementedError("select_potential_counter() not implemented in subclass")
+
     def finished_potential_counter(self, solver: LPSolver, status: Status):
 
         """
@@ -198,22 +267,18 @@ class VerificationObjective:
         pass
 
     # noinspection PyArgumentList
-    def cleanup(self, solver: grb.Model):
+    def cleanup(self, solver: LPSolver):
 
         """
         Used to remove all settings set by initial_settings()
 
         Args:
-            solver  : The gurobi solver
+            solver  : The LPSolver
         """
 
-        if self.vars is not None:
-            solver.remove(self.vars)
-            self.vars = None
         if self.constraints is not None:
             for constr in self.constraints:
-                solver.remove(constr)
-                solver.update()
+                solver.remove_constraint(constr)
 
             self.constraints = None
 
@@ -304,6 +369,27 @@ class LocalRobustnessObjective(VerificationObjective):
         output_weights[self.correct_class, 0] = num_potential_counters
         return output_weights
 
+    def output_margin(self, output_bounds: np.array) -> float:
+
+        """
+        Returns the lower bound of the correct class minus the largest upper bound of the other classes, except the
+        safe classes.
+
+        Args:
+            output_bounds: A Mx2 array with the concrete bounds of the outputs
+        Returns:
+            The margin, np.inf if all other classes are safe
+        """
+
+        others = np.ones(output_bounds.shape[0], dtype=bool)
+        others[self.correct_class] = False
+        others[list(self.safe_classes)] = False
+
+        if not others.any():
+            return np.inf
+
+        return output_bounds[self.correct_class, 0] - output_bounds[others, 1].max()
+
     def grad_descent_losses(self, lp_output: torch.Tensor, bounds: ESIP) -> Callable:
 
         """
@@ -330,6 +416,42 @@ class LocalRobustnessObjective(VerificationObjective):
 
         return (y[0, self.correct_class] <= y[0, :]).sum() > 1
 
+    def counter_examples(self, y: np.array) -> np.array:
+
+        """
+        Returns a boolean array that is true for the rows of y where another class is larger than the correct class.
+
+        Args:
+            y: The outputs of the neural network for a batch of inputs
+        """
+
+        return (y[:, self.correct_class:self.correct_class + 1] <= y).sum(axis=1) > 1
+
+    def attack_losses(self, y: torch.Tensor, bounds: Optional[ESIP] = None) -> torch.Tensor:
+
+        """
+        Returns the correct class minus the largest targeted class for each input in the batch.
+
+        Args:
+            y       : The outputs of the neural network for a batch of inputs
+            bounds  : The ESIP object, if given only the potential counter classes are targeted. Else all classes
+                      except the correct and safe classes are targeted.
+        Returns:
+            A tensor with one loss per input
+        """
+
+        if bounds is not None:
+            targets = self.potential_counter(bounds)
+        else:
+            targets = np.ones(y.shape[1], dtype=bool)
+            targets[self.correct_class] = False
+            targets[self.safe_classes] = False
+
+        if not targets.any():
+            targets[np.arange(y.shape[1]) != self.correct_class] = True
+
+        return y[:, self.correct_class] - y[:, torch.from_numpy(targets.nonzero()[0])].max(dim=1)[0]
+
     # noinspection PyArgumentList,PyUnresolvedReferences
     def initial_settings(self, solver: LPSolver, bounds: ESIP, safe_classes: list):
 
@@ -359,8 +481,8 @@ class LocalRobustnessObjective(VerificationObjective):
 
         # Correct class maximum can't be larger than the maximum of target class
         potential_counter_max = bounds.bounds_concrete[-1][potential_counter, 1].max()
-        if potential_counter_max < solver.output_variables[self.correct_class].ub:
-            solver.output_variables[self.correct_class].ub = potential_counter_max
+        if potential_counter_max < solver.output_upper_bound(self.correct_class):
+            solver.set_output_upper_bound(self.correct_class, potential_counter_max)
 
     def configure_next_potential_counter(self, solver: LPSolver, bounds: ESIP) -> bool:
 
@@ -384,25 +506,67 @@ class LocalRobustnessObjective(VerificationObjective):
 
             self.current_potential_counter = self.potential_counters.pop()
 
-            input_variables = solver.input_variables.select()
-            bounds_symbolic = bounds.bounds_symbolic[-1]
+            eq = self._potential_counter_eq(bounds, self.current_potential_counter)
+            self.constraints.append(solver.add_input_constraint(eq[:-1], eq[-1], ">=", 0))
 
-            eq = (bounds_symbolic[self.current_potential_counter, :] -
-                  bounds_symbolic[self.correct_class, :])
+            return True
 
-            error = (bounds.error_matrix[-1][self.current_potential_counter, :] -
-                     bounds.error_matrix[-1][self.correct_class, :])
+        else:
+            return False
 
-            eq[-1] += np.sum(error[error > 0])
-            constr = (grb.LinExpr(eq[:-1], input_variables) + eq[-1] >= 0)
+    def potential_counter_constraints(self, bounds: ESIP) -> list:
 
-            self.constraints.append(solver.grb_solver.addConstr(constr))
+        """
+        Returns the constraints of all remaining potential counters, see VerificationObjective.
 
-            solver.grb_solver.update()
-            return True
+        Args:
+            bounds              : The ESIP object
+        Returns:
+            A list of (potential_counter, coeffs, constant, sense, rhs)
+        """
 
-        else:
-            return False
+        constraints = []
+        for potential_counter in reversed(self.potential_counters):
+            eq = self._potential_counter_eq(bounds, potential_counter)
+            constraints.append((potential_counter, eq[:-1], eq[-1], ">=", 0))
+
+        return constraints
+
+    def select_potential_counter(self, potential_counter: int):
+
+        """
+        Makes a potential counter from potential_counter_constraints() the current one.
+
+        Args:
+            potential_counter   : The potential counter
+        """
+
+        self.potential_counters.remove(potential_counter)
+        self.current_potential_counter = potential_counter
+
+    def _potential_counter_eq(self, bounds: ESIP, potential_counter: int) -> np.array:
+
+        """
+        Returns the symbolic upper bound of the potential counter minus the correct class.
+
+        The constant term is in the last element and includes the positive errors.
+
+        Args:
+            bounds              : The ESIP object
+            potential_counter   : The potential counter class
+        """
+
+        bounds_symbolic = bounds.bounds_symbolic[-1]
+
+        eq = (bounds_symbolic[potential_counter, :] -
+              bounds_symbolic[self.correct_class, :])
+
+        error = (bounds.error_matrix[-1][potential_counter, :] -
+                 bounds.error_matrix[-1][self.correct_class, :])
+
+        eq[-1] += np.sum(error[error > 0])
+
+        return eq
 
     def finished_potential_counter(self, solver: LPSolver, status: Status):
 
@@ -419,21 +583,20 @@ class LocalRobustnessObjective(VerificationObjective):
 
         if self.constraints is not None:
             for constr in self.constraints:
-                solver.grb_solver.remove(constr)
+                solver.remove_constraint(constr)
             self.constraints = None
-        solver.grb_solver.update()
 
         if status == Status.Safe:
             self.safe_classes.append(self.current_potential_counter)
         self.current_potential_counter = None
 
-    def cleanup(self, solver: grb.Model):
+    def cleanup(self, solver: LPSolver):
 
         """
         Used to remove all settings set by initial_settings()
 
         Args:
-            solver  : The gurobi solver
+            solver  : The LPSolver
         """
 
         super().cleanup(solver)
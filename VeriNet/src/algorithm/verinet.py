@@ -5,14 +5,24 @@ Author: Patrick Henriksen <patrick@henriksen.as>
 """
 
 import time
+import threading
+from typing import Optional, Callable
 
 import multiprocessing as mp
 from copy import deepcopy
 import numpy as np
+import torch
 import torch.nn as nn
 
+from src.algorithm.attacks import PGDAttack
 from src.algorithm.verinet_worker import VeriNetWorker
 from src.algorithm.verinet_util import Status, Branch
+from src.algorithm.branch_transport import create_branch_queue
+from src.algorithm.esip_util import KERNEL_MODES, set_kernel_mode
+from src.algorithm.frontier import FRONTIERS
+from src.algorithm.lp_backends import LP_BACKENDS
+from src.algorithm.pseudo_costs import PSEUDO_COST_STATS_SIZE, PseudoCosts
+from src.algorithm.strategist import BANDIT_ARMS, BANDIT_STRATEGY, PSEUDO_COST_STRATEGY, STRATEGY_NAMES
 from src.algorithm.verification_objectives import VerificationObjective
 from src.util.logger import get_logger
 from src.util.config import *
@@ -23,6 +33,25 @@ class VeriNet:
 
     """
     The VeriNet master class, responsible for starting verification, creating worker processes and delegating work
+
+    The worker processes can be kept alive between calls to verify() by calling start() before verifying and
+    close() when finished, or by using the object as a context manager:
+
+        with VeriNet(model) as solver:
+            for objective in objectives:
+                solver.verify(objective)
+
+    If start() isn't called, the workers are started and closed on each call to verify().
+
+    Work is distributed by work donation. Each worker has its own inbox and verifies the branches in its local
+    queue. Idle workers mark themselves in a shared array of idle flags, and busy workers donate their shallowest
+    branch to an idle worker when they see one. The verification job is finished when all workers are idle.
+
+    Idle workers don't steal from the queues of the busy workers, since the queues are private to each process and
+    hold branches with forced bounds, ESIP snapshots and LP bases that only their owner can use. A donation is
+    encoded by the owner, which knows which state is needed by the receiver. The busy workers only read the number
+    of idle workers on the hot path; _work_lock is taken to claim an idle worker and when a worker becomes idle,
+    which happens once per donation.
     """
 
     def __init__(self,
@@ -31,7 +60,24 @@ class VeriNet:
                  gradient_descent_step: float = 1e-1,
                  gradient_descent_min_loss_change: float = 1e-2,
                  max_procs: int = None,
-                 queue_depth: int = 10):
+                 queue_depth: int = 2,
+                 branch_transport: str = "shared_memory",
+                 error_matrix_backend: str = "dense",
+                 snapshot_cache_size: int = 2**26,
+                 batch_siblings: bool = False,
+                 kernel_mode: str = "serial",
+                 lp_backend: str = "gurobi",
+                 lp_warm_start: bool = False,
+                 lp_threads: int = 1,
+                 lp_tightening_k: int = 0,
+                 pgd_restarts: int = 0,
+                 pgd_iters: int = 10,
+                 falsification_budget: float = 0.,
+                 falsification_samples: int = 1024,
+                 strategy: str = "best_by_layer",
+                 portfolio: Optional[list] = None,
+                 pseudo_cost_path: Optional[str] = None,
+                 frontier: str = "dfs"):
 
         """
         Args:
@@ -44,8 +90,57 @@ class VeriNet:
             gradient_descent_min_loss_change: The minimum amount of change in loss from last iteration to keep trying
                                               gradient descent
             max_procs                       : The maximum number of processes, if None it is set to 2*cpu_count()
-            queue_depth                     : If the depth difference between a branch and the deepest branch is more
-                                              than this, the branch will be put into a queue for other processes.
+            queue_depth                     : The minimum number of branches in a workers local queue before it
+                                              donates branches to idle workers.
+            branch_transport                : The transport used for sending branches between processes, either
+                                              "shared_memory" or "manager". See branch_transport.py.
+            error_matrix_backend            : The error matrix backend of ESIP, either "dense" or "factored". See
+                                              error_matrix.py.
+            snapshot_cache_size             : The maximum number of bytes used by the ESIP layer snapshots in each
+                                              worker, see ESIP.save_snapshot(). If 0, no snapshots are stored.
+            batch_siblings                  : If true, the two branches created by a split are calculated in one
+                                              batched ESIP pass, see ESIP.calc_bounds_batch().
+            kernel_mode                     : The ESIP kernels used in the worker processes, "serial", "parallel" or
+                                              "vectorised", see esip_util.set_kernel_mode(). With "parallel", each
+                                              worker uses cpu_count() // max_procs threads.
+            lp_backend                      : The LP backend, "gurobi" or "scipy". See lp_backends.py.
+            lp_warm_start                   : If true, the LPs of each branch are warm started from the bases of the
+                                              parent branch, else they continue from the basis of the previous LP.
+                                              Only used by backends supporting warm start.
+            lp_threads                      : The number of threads each worker uses to solve the LPs of all
+                                              potential counters in a branch concurrently. With 1, the LPs are solved
+                                              one after the other until a counter example is found.
+            lp_tightening_k                 : The number of unstable nodes per branch whose input bounds are tightened
+                                              with LPs before branching, see VeriNetWorker._tighten_bounds(). The
+                                              LPs are solved by each worker for its own branches. If 0, no bounds
+                                              are tightened.
+            pgd_restarts                    : If larger than 0, the workers search for counter examples with the
+                                              batched PGD attack in attacks.py using pgd_restarts random restarts,
+                                              instead of the single start gradient descent.
+            pgd_iters                       : The number of iterations of the batched PGD attack.
+            falsification_budget            : If larger than 0, verify() first tries to find a counter example
+                                              with random sampling and the batched PGD attack for at most this many
+                                              seconds, before ESIP and the LP model are built. The attack uses
+                                              pgd_restarts random restarts, or 16 if pgd_restarts is 0.
+            falsification_samples           : The number of random samples checked by the falsification pre-pass.
+            strategy                        : The branching strategy, see strategist.STRATEGY_NAMES. The memory
+                                              based strategies use the memory parameter of verify(). The
+                                              statistics of the "bandit" strategy are shared by all workers and
+                                              kept for all calls to verify(), see bandit_stats.
+            portfolio                       : A list of strategies raced against each other, see _race(). Each
+                                              strategy gets max_procs // len(portfolio) workers and the first Safe
+                                              or Unsafe result wins. If given, strategy is not used.
+            pseudo_cost_path                : A .npy file the pseudo-costs of the "pseudo_cost" strategy are loaded
+                                              from, if it exists, and saved to by close(). Should be specific to the
+                                              model. If None, the pseudo-costs are only kept for this object. In
+                                              the portfolio mode, the pseudo-costs are shared with the
+                                              "pseudo_cost" racer.
+            frontier                        : The order each worker explores its branches in, see frontier.py.
+                                              "dfs" explores the last created branch first, "best_first" the branch
+                                              whose parent has the smallest output margin and "hybrid" is
+                                              depth-first with periodic best-first restarts. The best-first orders
+                                              can find counter examples much sooner, but switching between subtrees
+                                              recalculates more layers than backtracking.
         """
 
         self._model_nn = model
@@ -55,6 +150,34 @@ class VeriNet:
         self._gradient_descent_min_loss_change = gradient_descent_min_loss_change
         self._max_procs = mp.cpu_count() if max_procs is None else max_procs
         self._queue_depth = queue_depth
+        self._branch_transport = branch_transport
+        self._error_matrix_backend = error_matrix_backend
+        self._snapshot_cache_size = snapshot_cache_size
+        self._batch_siblings = batch_siblings
+        self._kernel_mode = kernel_mode
+        self._lp_backend = lp_backend
+        self._lp_warm_start = lp_warm_start
+        self._lp_threads = lp_threads
+        self._lp_tightening_k = lp_tightening_k
+        self._pgd_restarts = pgd_restarts
+        self._pgd_iters = pgd_iters
+        self._falsification_budget = falsification_budget
+        self._falsification_samples = falsification_samples
+        self._strategy = strategy
+        self._portfolio = portfolio
+        self._frontier = frontier
+
+        if kernel_mode not in KERNEL_MODES:
+            raise ValueError(f"Unknown kernel mode: {kernel_mode}")
+        if lp_backend not in LP_BACKENDS:
+            raise ValueError(f"Unknown LP backend: {lp_backend}")
+        if strategy not in STRATEGY_NAMES:
+            raise ValueError(f"Unknown strategy: {strategy}")
+        for portfolio_strategy in (portfolio if portfolio is not None else []):
+            if portfolio_strategy not in STRATEGY_NAMES:
+                raise ValueError(f"Unknown strategy: {portfolio_strategy}")
+        if frontier not in FRONTIERS:
+            raise ValueError(f"Unknown frontier: {frontier}")
 
         self._gradient_descent_intervals = None
         self._timeout = None
@@ -67,17 +190,47 @@ class VeriNet:
         self._counter_example = None
         self._verification_objective = None
         self._workers = []
-        self._active_tasks = mp.Value("i", 0)
+        self._job_queues = []
         self._active_procs = mp.Value("i", 0)
         self._work_lock = mp.Lock()
-        self._active_tasks_lock = mp.Lock()
-        self._branch_queue = mp.Manager().Queue()
+        self._manager = None
+        self._inboxes = []
+        self._worker_results = None
+
+        # Work donation state, read without locking in the workers hot path and written while holding _work_lock
+        self._idle_flags = mp.RawArray("i", self._max_procs)
+        self._num_idle = mp.RawValue("i", 0)
+        self._idle_times = mp.RawArray("d", self._max_procs)
+        self._snapshot_counts = mp.RawArray("i", 3)
+        self._bandit_stats = mp.Array("d", 2 * len(BANDIT_ARMS)) if strategy == BANDIT_STRATEGY else None
+
+        self._pseudo_cost_path = pseudo_cost_path
+        self._pseudo_cost_stats = None
+        self._pseudo_costs = None
+        if strategy == PSEUDO_COST_STRATEGY or (portfolio is not None and PSEUDO_COST_STRATEGY in portfolio):
+            self._pseudo_cost_stats = mp.Array("d", PSEUDO_COST_STATS_SIZE)
+            self._pseudo_costs = PseudoCosts(shared_stats=self._pseudo_cost_stats)
+            if pseudo_cost_path is not None:
+                self._pseudo_costs.load(pseudo_cost_path)
+        self._job_id = 0
+        self._worker_id = None
 
         self._worker_join_timeout = 120
 
         self._finished_flag = mp.Event()
         self._all_children_done = mp.Event()
 
+        self._one_shot_solver = None
+        self._attack = None
+        self._falsification_stats = None
+        self._racers = None
+        self._cancelled = False
+        self._portfolio_stats = None
+        self._portfolio_wins = None if portfolio is None else {strategy: 0 for strategy in portfolio}
+        self._branch_transport_stats = None
+        self._worker_idle_times = None
+        self._snapshot_stats = None
+
         self.logger = get_logger(LOGS_LEVEL, __name__, "../../logs/", "verinet_log")
 
         self.splitmans = None
@@ -98,6 +251,166 @@ class VeriNet:
     def counter_example(self):
         return self._counter_example
 
+    @property
+    def falsification_stats(self) -> Optional[dict]:
+
+        """
+        Returns a dictionary with "resolved", true if the falsification pre-pass found a counter example, and
+        "seconds", the time spent in the pre-pass, for the last call to verify(). None if the pre-pass is disabled.
+        """
+
+        return self._falsification_stats
+
+    @property
+    def bandit_stats(self) -> Optional[dict]:
+
+        """
+        Returns a dictionary mapping each arm of the "bandit" strategy to the number of rewards and the mean reward
+        merged from all workers, see StrategyBandit. None if another strategy is used.
+        """
+
+        if self._bandit_stats is None:
+            return None
+
+        stats = self._bandit_stats[:]
+        num_arms = len(BANDIT_ARMS)
+
+        return {arm: {"count": int(stats[i]), "mean_reward": stats[num_arms + i] / stats[i] if stats[i] > 0 else 0.}
+                for i, arm in enumerate(BANDIT_ARMS)}
+
+    @property
+    def pseudo_costs(self) -> Optional[PseudoCosts]:
+
+        """
+        Returns the pseudo-costs shared by all workers if the "pseudo_cost" strategy is used or in the portfolio,
+        else None.
+        """
+
+        return self._pseudo_costs
+
+    @property
+    def portfolio_stats(self) -> Optional[dict]:
+
+        """
+        Returns a dictionary with the "winner" strategy (None if no strategy was conclusive) and the "results" of
+        all strategies, mapping each strategy to (status, seconds), for the last call to verify(). None if the
+        portfolio mode isn't used or the last verification was decided before the race.
+        """
+
+        return self._portfolio_stats
+
+    @property
+    def portfolio_wins(self) -> Optional[dict]:
+
+        """
+        Returns a dictionary with the number of races won by each strategy in the portfolio, over all calls to
+        verify(). None if the portfolio mode isn't used.
+        """
+
+        return self._portfolio_wins
+
+    @property
+    def branch_transport_stats(self) -> Optional[dict]:
+
+        """
+        Returns the statistics of the branch transport for the last call to verify(), or None if the last
+        verification was decided by the one-shot approximation. See BranchQueue.stats.
+        """
+
+        return self._branch_transport_stats
+
+    @property
+    def worker_idle_times(self) -> Optional[list]:
+
+        """
+        Returns a list with the number of seconds each worker spent waiting for branches in the last call to verify(),
+        or None if the last verification was decided by the one-shot approximation.
+        """
+
+        return self._worker_idle_times
+
+    @property
+    def snapshot_stats(self) -> Optional[dict]:
+
+        """
+        Returns the ESIP snapshot "hits", "misses", "evictions" and "hit_rate" summed over all workers for the last
+        call to verify(), or None if the last verification was decided by the one-shot approximation.
+        """
+
+        return self._snapshot_stats
+
+    @property
+    def is_running(self) -> bool:
+        return len(self._workers) > 0 or (self._racers is not None and
+                                          any(racer.is_running for racer in self._racers.values()))
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def start(self):
+
+        """
+        Starts the worker processes.
+
+        The workers are kept alive until close() is called, so that process spawning, jit compiling and the
+        initialization of ESIP and the LPSolver is only done once for all calls to verify(). In the portfolio mode,
+        the workers of all strategies are started.
+        """
+
+        if self.is_running:
+            return
+
+        if self._portfolio is not None:
+            for racer in self._get_racers().values():
+                racer.start()
+            return
+
+        self._manager = mp.Manager()
+        self._inboxes = [create_branch_queue(self._branch_transport, self._manager) for _ in range(self._max_procs)]
+        self._worker_results = self._manager.dict()
+        self._job_queues = [mp.Queue() for _ in range(self._max_procs)]
+
+        self._start_workers()
+
+    def close(self):
+
+        """
+        Stops the worker processes started by start() and saves the pseudo-costs, see pseudo_cost_path.
+        """
+
+        if self._pseudo_costs is not None and self._pseudo_cost_path is not None:
+            self._pseudo_costs.save(self._pseudo_cost_path)
+
+        if self._racers is not None:
+            for racer in self._racers.values():
+                racer.close()
+
+        if len(self._workers) == 0:
+            return
+
+        self.logger.debug("Main process closing workers")
+
+        for job_queue in self._job_queues:
+            job_queue.put(None)  # Poison pill for killing the worker processes
+
+        for worker in self._workers:
+            worker.join(self._worker_join_timeout)
+            if worker.exitcode is None:
+                self.logger.warning(f"Main process could not join with worker, terminating instead")
+                worker.terminate()
+
+        self._manager.shutdown()
+
+        self._workers = []
+        self._job_queues = []
+        self._manager = None
+        self._inboxes = []
+        self._worker_results = None
+
     def verify(self,
                verification_objective: VerificationObjective,
                gradient_descent_intervals: int = 5,
@@ -121,8 +434,45 @@ class VeriNet:
         start_time = time.time()
 
         self._reset_params()
+        self._set_job(verification_objective, gradient_descent_intervals, timeout, no_split, verbose, memory)
+
+        # Try to find a counter example before building the bounds and the LP model
+        if self._falsification_budget > 0:
+            self._falsify()
+
+            if self.status != Status.Undecided:
+                return self.status
+
+        # Try a one-shot verification before initializing children avoids overhead of multiprocessing and jit compiling
+
+        self._one_shot_approximation()
+
+        if self.status != Status.Undecided:
+            return self.status
+
+        if self._portfolio is not None:
+            return self._race(start_time, memory)
+
+        return self._verify_with_workers(start_time)
+
+    def cancel(self):
+
+        """
+        Cancels a call to verify() running in another thread, which then returns as if it timed out.
+
+        Used by the portfolio mode to stop the strategies that lost the race.
+        """
+
+        self._cancelled = True
+        self._finished_flag.set()
+
+    def _set_job(self, verification_objective: VerificationObjective, gradient_descent_intervals: int,
+                 timeout: float, no_split: bool, verbose: bool, memory: int):
+
+        """
+        Stores the arguments of verify(), see verify().
+        """
 
-        self._counter_example = mp.Array("f", np.zeros(verification_objective.input_size, dtype=np.float32))
         self._verification_objective = verification_objective
         self._gradient_descent_intervals = gradient_descent_intervals
         self._timeout = timeout
@@ -130,36 +480,463 @@ class VeriNet:
         self._verbose = verbose
         self.splitmans = Splitmans(start_index = 0, memory_size=memory, layer=0)
 
-        # Try a one-shot verification before initializing children avoids overhead of multiprocessing and jit compiling
+    def _verify_with_workers(self, start_time: float) -> Status:
 
-        self._one_shot_approximation()
+        """
+        Verifies the current job with the worker processes.
 
-        if self.status != Status.Undecided:
-            return self._status
+        Args:
+            start_time  : The time verify() was called, used for the timeout
+        Returns:
+            The Status
+        """
 
-        self._reset_mp_params()
-        
-        branch = Branch(0, None, [], self.splitmans)
-        self._put_branch(branch)  # Add initial branch
-        self.logger.debug(f"Main process put first branch {branch} on queue")
+        close_workers = not self.is_running
+        self.start()
 
-        self._start_workers()
+        try:
+            self._reset_mp_params()
+
+            self._start_job(Branch(0, None, [], self.splitmans))
+            if self._cancelled:
+                # Cancelled before the flag was cleared by _reset_mp_params()
+                self._finished_flag.set()
+
+            self.logger.debug("Main process waiting for workers")
+            timeout = not self._finished_flag.wait(timeout=max(self._timeout - (time.time() - start_time), 0))
+            timeout = timeout or self._cancelled
+            self.logger.debug(f"Main process finished waiting, timeout={timeout}")
+
+            self._put_poison_pills()
+
+            self._join_workers()
 
-        self.logger.debug("Main process waiting for workers")
-        timeout = not self._finished_flag.wait(timeout=self._timeout - (time.time() - start_time))
-        self.logger.debug(f"Main process finished waiting, timeout={timeout}")
+            if self.is_running:
+                self._branch_transport_stats = self._merged_transport_stats()
+                self._worker_idle_times = list(self._idle_times)
+                hits, misses, evictions = self._snapshot_counts
+                self._snapshot_stats = {"hits": hits, "misses": misses, "evictions": evictions,
+                                        "hit_rate": hits / (hits + misses) if hits + misses > 0 else 0.}
 
-        self._put_poison_pills()
+            if self._status.value == Status.Unsafe.value and self._worker_results is not None:
+                self._counter_example = self._worker_results.get("counter_example", None)
 
-        self._join_workers()
+            if (not timeout) and (self._status.value is Status.Undecided.value):
+                assert self._num_idle.value == self._max_procs, "Ended before timeout with active workers"
+                self._status.value = Status.Safe.value
 
-        if (not timeout) and (self._status.value is Status.Undecided.value):
-            assert self._active_tasks.value == 0, "Ended before timeout without finishing all active tasks"
-            self._status.value = Status.Safe.value
+        finally:
+            self._cancelled = False
+            if close_workers:
+                self.close()
 
         self.logger.debug(f"Main process finished with status: {self.status}")
         return self.status
 
+    def _get_racers(self) -> dict:
+
+        """
+        Returns a dictionary mapping each strategy of the portfolio to the VeriNet object running it, creating the
+        objects on the first call.
+
+        The racers use the same settings as this object, except for the strategy and the number of workers. The
+        falsification pre-pass and the one-shot approximation are only run by this object.
+        """
+
+        if self._racers is None:
+
+            max_procs = max(self._max_procs // len(self._portfolio), 1)
+            self._racers = {strategy: VeriNet(self._model_nn,
+                                              gradient_descent_max_iters=self._gradient_descent_max_iters,
+                                              gradient_descent_step=self._gradient_descent_step,
+                                              gradient_descent_min_loss_change=self._gradient_descent_min_loss_change,
+                                              max_procs=max_procs,
+                                              queue_depth=self._queue_depth,
+                                              branch_transport=self._branch_transport,
+                                              error_matrix_backend=self._error_matrix_backend,
+                                              snapshot_cache_size=self._snapshot_cache_size,
+                                              batch_siblings=self._batch_siblings,
+                                              kernel_mode=self._kernel_mode,
+                                              lp_backend=self._lp_backend,
+                                              lp_warm_start=self._lp_warm_start,
+                                              lp_threads=self._lp_threads,
+                                              lp_tightening_k=self._lp_tightening_k,
+                                              pgd_restarts=self._pgd_restarts,
+                                              pgd_iters=self._pgd_iters,
+                                              strategy=strategy,
+                                              frontier=self._frontier)
+                            for strategy in self._portfolio}
+
+            # The pseudo_cost racer updates the pseudo-costs of this object, which are saved by close()
+            racer = self._racers.get(PSEUDO_COST_STRATEGY)
+            if racer is not None:
+                racer._pseudo_cost_stats = self._pseudo_cost_stats
+                racer._pseudo_costs = self._pseudo_costs
+
+        return self._racers
+
+    def _verify_racer(self, verification_objective: VerificationObjective, gradient_descent_intervals: int,
+                      timeout: float, no_split: bool, verbose: bool, memory: int) -> Status:
+
+        """
+        Verifies the objective with the worker processes, skipping the falsification pre-pass and the one-shot
+        approximation already done by the portfolio object.
+
+        Args:
+            See verify()
+        Returns:
+            The Status
+        """
+
+        start_time = time.time()
+
+        self._reset_params()
+        self._set_job(verification_objective, gradient_descent_intervals, timeout, no_split, verbose, memory)
+
+        return self._verify_with_workers(start_time)
+
+    def _race(self, start_time: float, memory: int) -> Status:
+
+        """
+        Runs all strategies of the portfolio on the current job concurrently, each in a thread waiting for the
+        workers of one racer.
+
+        The first strategy finishing with Status.Safe or Status.Unsafe wins and the other racers are cancelled. The
+        result of the winner is copied to this object. If no strategy is conclusive, the status is Status.Underflow
+        if any strategy underflowed, else Status.Undecided.
+
+        Args:
+            start_time  : The time verify() was called, used for the timeout
+            memory      : See verify()
+        Returns:
+            The Status
+        """
+
+        racers = self._get_racers()
+        finished = []
+        done = threading.Event()
+        timeout = max(self._timeout - (time.time() - start_time), 0)
+
+        def run_racer(strategy: str, racer: VeriNet):
+
+            status = Status.Undecided
+
+            try:
+                status = racer._verify_racer(deepcopy(self._verification_objective), self._gradient_descent_intervals,
+                                             timeout, self._no_split, self._verbose, memory)
+            finally:
+                finished.append((strategy, status, time.time() - start_time))
+                if status in (Status.Safe, Status.Unsafe) or len(finished) == len(racers):
+                    done.set()
+
+        # The workers are started here since forking from several threads is unsafe
+        close_workers = not self.is_running
+        self.start()
+
+        try:
+            for racer in racers.values():
+                racer._cancelled = False
+
+            threads = [threading.Thread(target=run_racer, args=(strategy, racer)) for strategy, racer in racers.items()]
+            for thread in threads:
+                thread.start()
+
+            done.wait()
+
+            for racer in racers.values():
+                racer.cancel()
+            for thread in threads:
+                thread.join()
+
+        finally:
+            if close_workers:
+                self.close()
+
+        winners = [(strategy, status) for strategy, status, _ in finished if status in (Status.Safe, Status.Unsafe)]
+        winner = winners[0][0] if len(winners) > 0 else None
+
+        if winner is not None:
+            racer = racers[winner]
+            self._status.value = racer.status.value
+            self._counter_example = racer.counter_example
+            self._branches_explored.value = racer.branches_explored
+            self._max_depth.value = racer.max_depth
+            self._branch_transport_stats = racer.branch_transport_stats
+            self._worker_idle_times = racer.worker_idle_times
+            self._snapshot_stats = racer.snapshot_stats
+            self._portfolio_wins[winner] += 1
+        elif any(status == Status.Underflow for _, status, _ in finished):
+            self._status.value = Status.Underflow.value
+
+        self._portfolio_stats = {"winner": winner,
+                                 "results": {strategy: (status, seconds) for strategy, status, seconds in finished}}
+
+        self.logger.info(f"Portfolio race won by {winner} with status {self.status}, results: "
+                         f"{self._portfolio_stats['results']}, wins: {self._portfolio_wins}")
+
+        return self.status
+
+    def verify_epsilon_ladder(self,
+                              create_objective: Callable[[float], VerificationObjective],
+                              epsilons: list,
+                              known_status: dict = None,
+                              gradient_descent_intervals: int = 5,
+                              timeout: float = 3600,
+                              verbose=True,
+                              memory=1) -> dict:
+
+        """
+        Verifies the same input for a list of epsilons, using that the problems are monotonic in epsilon.
+
+        A result which is safe for an epsilon is safe for all smaller epsilons, and a counter example found for an
+        epsilon is a counter example for all larger epsilons. The epsilons are verified in bisection order, always
+        picking the median of the epsilons that are still unresolved, and all results implied by a safe or unsafe
+        result are skipped. Counter examples found so far are also tested on the remaining epsilons before
+        verification.
+
+        Args:
+            create_objective                : A function returning the VerificationObjective for an epsilon
+            epsilons                        : The epsilons
+            known_status                    : A dictionary mapping epsilons to already known statuses, used for
+                                              inference without verifying these epsilons again.
+            gradient_descent_intervals      : See verify()
+            timeout                         : The timeout used for each epsilon
+            verbose                         : See verify()
+            memory                          : See verify()
+        Returns:
+            A dictionary mapping each epsilon to a dictionary with the keys "status", "implied_by" (the epsilon the
+            result was inferred from, or None if it was verified), "counter_example", "branches_explored",
+            "max_depth", "time", "falsification_stats" (see falsification_stats) and "portfolio_stats" (see
+            portfolio_stats).
+        """
+
+        sorted_epsilons = sorted(epsilons)
+        results = {}
+        counter_examples = []
+
+        known_status = {} if known_status is None else known_status
+        for eps in sorted_epsilons:
+            if eps in known_status and known_status[eps] in (Status.Safe, Status.Unsafe):
+                results[eps] = self._ladder_result(known_status[eps], implied_by=None)
+
+        self._infer_ladder_results(results, sorted_epsilons)
+
+        while True:
+
+            unresolved = [eps for eps in sorted_epsilons if eps not in results]
+            if len(unresolved) == 0:
+                break
+
+            eps = unresolved[len(unresolved) // 2]
+            objective = create_objective(eps)
+
+            reused = [(cex_eps, cex) for cex_eps, cex in counter_examples if self._is_counter_example(objective, cex)]
+
+            if len(reused) > 0:
+                results[eps] = self._ladder_result(Status.Unsafe, implied_by=reused[0][0],
+                                                   counter_example=reused[0][1])
+            else:
+                start = time.time()
+                status = self.verify(objective, gradient_descent_intervals=gradient_descent_intervals,
+                                     timeout=timeout, verbose=verbose, memory=memory)
+                results[eps] = self._ladder_result(status, implied_by=None, counter_example=self.counter_example,
+                                                   branches_explored=self.branches_explored,
+                                                   max_depth=self.max_depth, time_spent=time.time() - start,
+                                                   falsification_stats=self.falsification_stats,
+                                                   portfolio_stats=self.portfolio_stats)
+
+                if status == Status.Unsafe and self.counter_example is not None:
+                    counter_examples.append((eps, self.counter_example))
+
+            self._infer_ladder_results(results, sorted_epsilons)
+
+        return results
+
+    def certified_radius(self,
+                         create_objective: Callable[[float], VerificationObjective],
+                         max_epsilon: float,
+                         tolerance: float = 1e-3,
+                         time_budget: float = 3600,
+                         gradient_descent_intervals: int = 5,
+                         memory=1) -> tuple:
+
+        """
+        Finds the largest epsilon the input is robust to by bisection.
+
+        The create_objective function will usually return a LocalRobustnessObjective with an epsilon-ball around
+        the input. The input should be correctly classified, so that epsilon = 0 is safe. Counter examples found by
+        unsafe probes are tested on later probes before running verification, and probes that time out are treated
+        as unsafe for the search without tightening the attack bound.
+
+        Args:
+            create_objective                : A function returning the VerificationObjective for an epsilon
+            max_epsilon                     : The largest epsilon considered
+            tolerance                       : The search stops when the gap between the bounds is smaller than this
+            time_budget                     : The total time in seconds used for the input
+            gradient_descent_intervals      : See verify()
+            memory                          : See verify()
+        Returns:
+            (certified_lower, attack_upper), where the input is verified safe for certified_lower and a counter
+            example was found for attack_upper. attack_upper is np.inf if no counter example was found.
+        """
+
+        start_time = time.time()
+        counter_examples = []
+
+        lower = 0.
+        upper = max_epsilon
+        attack_upper = np.inf
+        eps = max_epsilon
+
+        while True:
+
+            remaining = time_budget - (time.time() - start_time)
+            if remaining <= 0:
+                break
+
+            objective = create_objective(eps)
+
+            if any(self._is_counter_example(objective, cex) for cex in counter_examples):
+                status = Status.Unsafe
+            else:
+                status = self.verify(objective, gradient_descent_intervals=gradient_descent_intervals,
+                                     timeout=remaining, verbose=False, memory=memory)
+
+                if status == Status.Unsafe and self.counter_example is not None:
+                    counter_examples.append(self.counter_example)
+
+            self.logger.debug(f"Certified radius probe with epsilon {eps}: {status}")
+
+            if status == Status.Safe:
+                lower = eps
+            else:
+                upper = eps
+                if status == Status.Unsafe:
+                    attack_upper = eps
+
+            if lower == max_epsilon or upper - lower <= tolerance:
+                break
+
+            eps = (lower + upper) / 2
+
+        return lower, attack_upper
+
+    def certified_radii(self,
+                        create_objectives: list,
+                        max_epsilon: float,
+                        tolerance: float = 1e-3,
+                        time_budget: float = 3600,
+                        gradient_descent_intervals: int = 5,
+                        memory=1) -> list:
+
+        """
+        Runs certified_radius() for several inputs, keeping the worker processes alive for all inputs.
+
+        Args:
+            create_objectives           : A list with one create_objective function for each input, see
+                                          certified_radius()
+            max_epsilon                 : See certified_radius()
+            tolerance                   : See certified_radius()
+            time_budget                 : The time budget for each input
+            gradient_descent_intervals  : See verify()
+            memory                      : See verify()
+        Returns:
+            A list with (certified_lower, attack_upper) for each input
+        """
+
+        close_workers = not self.is_running
+        self.start()
+
+        try:
+            return [self.certified_radius(create_objective, max_epsilon, tolerance=tolerance, time_budget=time_budget,
+                                          gradient_descent_intervals=gradient_descent_intervals, memory=memory)
+                    for create_objective in create_objectives]
+        finally:
+            if close_workers:
+                self.close()
+
+    @staticmethod
+    def _ladder_result(status: Status, implied_by: Optional[float], counter_example: np.array = None,
+                       branches_explored: int = 0, max_depth: int = 0, time_spent: float = 0,
+                       falsification_stats: Optional[dict] = None, portfolio_stats: Optional[dict] = None) -> dict:
+
+        return {"status": status, "implied_by": implied_by, "counter_example": counter_example,
+                "branches_explored": branches_explored, "max_depth": max_depth, "time": time_spent,
+                "falsification_stats": falsification_stats, "portfolio_stats": portfolio_stats}
+
+    def _infer_ladder_results(self, results: dict, sorted_epsilons: list):
+
+        """
+        Adds the results implied by the safe and unsafe results to the results dictionary.
+
+        Args:
+            results         : The results as returned by verify_epsilon_ladder()
+            sorted_epsilons : The epsilons in increasing order
+        """
+
+        for i, eps in enumerate(sorted_epsilons):
+
+            if eps not in results:
+                continue
+
+            status = results[eps]["status"]
+
+            if status == Status.Safe:
+                for smaller_eps in sorted_epsilons[:i]:
+                    if smaller_eps not in results:
+                        results[smaller_eps] = self._ladder_result(Status.Safe, implied_by=eps)
+
+            elif status == Status.Unsafe:
+                for larger_eps in sorted_epsilons[i + 1:]:
+                    if larger_eps not in results:
+                        results[larger_eps] = self._ladder_result(Status.Unsafe, implied_by=eps,
+                                                                  counter_example=results[eps]["counter_example"])
+
+    def _is_counter_example(self, objective: VerificationObjective, x: np.array) -> bool:
+
+        """
+        Returns true if x is within the input bounds of the objective and is a counter example.
+
+        Args:
+            objective   : The VerificationObjective
+            x           : The candidate counter example
+        """
+
+        x = np.array(x, dtype=np.float32).reshape(-1)
+        input_bounds = objective.input_bounds_flat
+
+        if (x < input_bounds[:, 0]).any() or (x > input_bounds[:, 1]).any():
+            return False
+
+        with torch.no_grad():
+            self._model_nn(torch.Tensor(x).reshape(1, *objective.input_shape))
+            logits = self._model_nn.logits
+            if len(logits.shape) == 1:
+                logits = logits.unsqueeze(0)
+
+        return objective.is_counter_example(logits.numpy())
+
+    def _falsify(self):
+
+        """
+        Runs the falsification pre-pass, random sampling followed by the batched PGD attack, see PGDAttack.falsify().
+        """
+
+        self.logger.debug("Starting falsification pre-pass")
+
+        if self._attack is None:
+            self._attack = PGDAttack(self._model_nn, num_restarts=self._pgd_restarts if self._pgd_restarts > 0 else 16,
+                                     max_iters=self._pgd_iters)
+
+        start = time.time()
+        counter_example = self._attack.falsify(self._verification_objective, self._falsification_budget,
+                                               self._falsification_samples)
+        self._falsification_stats = {"resolved": counter_example is not None, "seconds": time.time() - start}
+
+        if counter_example is not None:
+            self._status.value = Status.Unsafe.value
+            self._counter_example = counter_example
+
     def _one_shot_approximation(self):
 
         """
@@ -170,24 +947,52 @@ class VeriNet:
         """
 
         self.logger.debug("Starting one-shot approximation")
-        solver = VeriNetWorker(self._model_nn,
-                               verification_objective=deepcopy(self._verification_objective),
-                               no_split=True,
-                               gradient_descent_intervals=self._gradient_descent_intervals,
-                               gradient_descent_max_iters=self._gradient_descent_max_iters,
-                               gradient_descent_step=self._gradient_descent_step,
-                               gradient_descent_min_loss_change=self._gradient_descent_min_loss_change,
-                               verbose=self._verbose
-                               )
+
+        if self._one_shot_solver is None:
+            self._one_shot_solver = self._create_worker_solver()
+
+        solver = self._one_shot_solver
+        solver.set_verification_objective(deepcopy(self._verification_objective),
+                                          no_split=True,
+                                          gradient_descent_intervals=self._gradient_descent_intervals,
+                                          verbose=self._verbose)
 
         solver.verify(Branch(0, None, []), None, None, None, queue_depth=-1)
 
         if solver.status != Status.Undecided:
-            self._status = solver.status
+            self._status.value = solver.status.value
             self._max_depth.value = solver.max_depth
             self._branches_explored.value = solver.branches_explored
             self._counter_example = solver.counter_example
-        
+
+    def _create_worker_solver(self) -> VeriNetWorker:
+
+        """
+        Creates a VeriNetWorker for the current verification objective.
+        """
+
+        return VeriNetWorker(self._model_nn,
+                             verification_objective=deepcopy(self._verification_objective),
+                             no_split=self._no_split,
+                             gradient_descent_intervals=self._gradient_descent_intervals,
+                             gradient_descent_max_iters=self._gradient_descent_max_iters,
+                             gradient_descent_step=self._gradient_descent_step,
+                             gradient_descent_min_loss_change=self._gradient_descent_min_loss_change,
+                             verbose=self._verbose,
+                             error_matrix_backend=self._error_matrix_backend,
+                             snapshot_cache_size=self._snapshot_cache_size,
+                             batch_siblings=self._batch_siblings,
+                             lp_backend=self._lp_backend,
+                             lp_warm_start=self._lp_warm_start,
+                             lp_threads=self._lp_threads,
+                             lp_tightening_k=self._lp_tightening_k,
+                             pgd_restarts=self._pgd_restarts,
+                             pgd_iters=self._pgd_iters,
+                             strategy=self._strategy,
+                             bandit_stats=self._bandit_stats,
+                             pseudo_cost_stats=self._pseudo_cost_stats,
+                             frontier=self._frontier
+                             )
 
     def _start_workers(self):
 
@@ -198,90 +1003,178 @@ class VeriNet:
         self.logger.debug("Starting workers")
 
         for i in range(self._max_procs):
-            worker = mp.Process(target=self._start_worker)
+            worker = mp.Process(target=self._start_worker, args=(i, self._job_queues[i]))
             worker.start()
             self._workers.append(worker)
-            self._active_procs.value += 1
             self.logger.debug(f"Added worker {i + 1} of {self._max_procs}")
 
+    def _start_job(self, branch: Branch):
+
+        """
+        Sends the current verification objective to all workers.
+
+        The initial branch is given to the first worker, all other workers start as idle.
+
+        Args:
+            branch  : The initial branch
+        """
+
+        self._job_id += 1
+        self._active_procs.value = len(self._workers)
+
+        for i in range(self._max_procs):
+            self._idle_flags[i] = 0 if i == 0 else 1
+        self._num_idle.value = self._max_procs - 1
+
+        self._inboxes[0].put(branch, self._job_id)
+        self.logger.debug(f"Main process put first branch {branch} in inbox of worker 0")
+
+        job = (self._job_id, self._verification_objective, self._no_split, self._gradient_descent_intervals,
+               self._verbose)
+        for job_queue in self._job_queues:
+            job_queue.put(job)
+
     def _put_poison_pills(self):
 
         """
-        Puts poison pills (None) into the queue to signal workers to quit.
+        Puts poison pills (None) into the worker inboxes to signal workers to quit the current job.
         """
 
         self.logger.debug(f"Putting poison pills")
         with self._work_lock:
             self._finished_flag.set()
-        for i in range(self._max_procs):
+        for i, inbox in enumerate(self._inboxes):
             self.logger.debug(f"Added poison pill {i + 1} of {self._max_procs}")
-            self._branch_queue.put(None)  # "Poison pill for killing child processes"
+            inbox.put(None, self._job_id)  # "Poison pill for killing child processes"
 
     def _join_workers(self):
 
         """
-        Joins all workers, if join fails after self._worker_join_timeout, the process is terminated
+        Waits for all workers to finish the current job.
+
+        If the workers haven't finished after self._worker_join_timeout, they are terminated and new workers are
+        started on the next call to verify().
         """
 
-        self._all_children_done.wait()  # Wait to avoid deadlock in self._branches_queue
+        # Wait to avoid deadlock in the worker inboxes
+        if not self._all_children_done.wait(self._worker_join_timeout):
+            self.logger.warning(f"Main process could not join with workers, terminating instead")
+            self._terminate_workers()
+
+    def _terminate_workers(self):
+
+        """
+        Terminates all worker processes.
+        """
 
-        self.logger.debug(f"Main process joining workers")
         for worker in self._workers:
-            worker.join(self._worker_join_timeout)
-            if worker.exitcode is None:
-                self.logger.warning(f"Main process could not join with worker, terminating instead")
-                worker.terminate()
+            worker.terminate()
+            worker.join()
+
+        self._manager.shutdown()
 
-    def _start_worker(self):
+        self._workers = []
+        self._job_queues = []
+        self._manager = None
+        self._inboxes = []
+        self._worker_results = None
+
+    def _start_worker(self, worker_id: int, job_queue: mp.Queue):
 
         """
         Starts a worker process
+
+        The worker keeps its VeriNetWorker, and thereby the ESIP mappings and LPSolver, for all jobs received from
+        the job queue until it receives a poison pill (None).
+
+        Args:
+            worker_id   : The index of this worker
+            job_queue   : The queue with new verification jobs for this worker
         """
 
+        self._worker_id = worker_id
+        solver = None
+
+        num_threads = max(1, mp.cpu_count() // self._max_procs) if self._kernel_mode == "parallel" else None
+        set_kernel_mode(self._kernel_mode, num_threads=num_threads)
+
         while True:
-            solver = VeriNetWorker(self._model_nn,
-                                   verification_objective=deepcopy(self._verification_objective),
-                                   no_split=self._no_split,
-                                   gradient_descent_intervals=self._gradient_descent_intervals,
-                                   gradient_descent_max_iters=self._gradient_descent_max_iters,
-                                   gradient_descent_step=self._gradient_descent_step,
-                                   gradient_descent_min_loss_change=self._gradient_descent_min_loss_change,
-                                   verbose=self._verbose
-                                   )
-
-            branch = self._branch_queue.get()
-            self.logger.debug(f"Worker retrieved branch {branch} from queue")
+
+            job = job_queue.get()
+
+            if job is None:
+                self.logger.debug(f"Worker exited")
+                return
+
+            (self._job_id, self._verification_objective, self._no_split, self._gradient_descent_intervals,
+             self._verbose) = job
+
+            if solver is None:
+                solver = self._create_worker_solver()
+            else:
+                solver.set_verification_objective(deepcopy(self._verification_objective),
+                                                  no_split=self._no_split,
+                                                  gradient_descent_intervals=self._gradient_descent_intervals,
+                                                  verbose=self._verbose)
+
+            self._run_job(solver)
+
+    def _run_job(self, solver: VeriNetWorker):
+
+        """
+        Verifies branches from the workers inbox until a poison pill (None) is received.
+
+        Args:
+            solver  : The VeriNetWorker used for the branches.
+        """
+
+        inbox = self._inboxes[self._worker_id]
+
+        while True:
+
+            wait_start = time.time()
+            job_id, branch = inbox.get()
+            self._idle_times[self._worker_id] += time.time() - wait_start
+
+            if job_id != self._job_id:
+                # Donated after the previous job finished
+                continue
+
+            self.logger.debug(f"Worker retrieved branch {branch} from inbox")
             with self._work_lock:
                 if branch is None:
                     self._active_procs.value -= 1
                     if self._active_procs.value == 0:
                         self._all_children_done.set()
-                    self.logger.debug(f"Worker exited")
+                    self.logger.debug(f"Worker finished job")
                     return
 
             if self._finished_flag.is_set():
-                # We have to empty self._branch_queue to avoid deadlock, can't return yet...
+                # We have to empty the inbox to avoid deadlock, can't return yet...
                 continue
 
             solver.verify(branch, self._finished_flag, needs_branches=self._needs_branches,
                           put_queue=self._put_branch, queue_depth=self._queue_depth)
 
-            self._finished_subtree(solver.max_depth, solver.branches_explored, solver.status, solver.counter_example)
+            self._finished_subtree(solver.max_depth, solver.branches_explored, solver.status, solver.counter_example,
+                                   solver.bounds.snapshot_stats)
 
     def _finished_subtree(self, max_depth: int, branches_explored: int,
-                          status: Status, counter_example: np.array = None):
+                          status: Status, counter_example: np.array = None, snapshot_stats: dict = None):
 
         """
         Called from workers when they finish their current subtree.
 
-        This function updates the relevant statistics, such as max_depth and branches explored. If a worker finds
-        the system to be unsafe or encounters underflow, the found solution flag is set.
+        This function updates the relevant statistics, such as max_depth and branches explored, and marks the
+        worker as idle. If a worker finds the system to be unsafe or encounters underflow, or all workers are idle,
+        the found solution flag is set.
 
         Args:
             max_depth           : The workers maximum branch depth
             branches_explored   : The number of branches the worker explored
             status              : The Status Enum with the final status of the subtree
             counter_example     : The counter example, if found.
+            snapshot_stats      : The ESIP snapshot statistics of the subtree, see ESIP.snapshot_stats.
         """
 
         with self._work_lock:
@@ -289,47 +1182,81 @@ class VeriNet:
             self._max_depth.value = max_depth if max_depth > self._max_depth.value else self._max_depth.value
             self._branches_explored.value += branches_explored
 
+            if snapshot_stats is not None:
+                self._snapshot_counts[0] += snapshot_stats["hits"]
+                self._snapshot_counts[1] += snapshot_stats["misses"]
+                self._snapshot_counts[2] += snapshot_stats["evictions"]
+
             if not self._finished_flag.is_set() and status.value == Status.Unsafe.value:
                 self._status.value = status.value
-                self._counter_example = counter_example
+                self._worker_results["counter_example"] = counter_example
                 self._finished_flag.set()
 
             elif not self._finished_flag.is_set() and status.value == Status.Underflow.value:
                 self._status.value = status.value
                 self._finished_flag.set()
 
-        with self._active_tasks_lock:
-            self._active_tasks.value -= 1
-            if self._active_tasks.value == 0:
+            self._idle_flags[self._worker_id] = 1
+            self._num_idle.value += 1
+            if self._num_idle.value == self._max_procs:
                 self._finished_flag.set()
 
     def _needs_branches(self) -> bool:
 
         """
-        Returns true if the queue needs more branches
+        Returns true if any worker is idle.
 
-        If the current number of active tasks (running procs + queue size) is smaller than 2*max_procs this
-        returns true
+        This is called by the workers for every branch, so the shared value is read without locking.
         """
 
-        return self._active_tasks.value < (1.2 * self._max_procs)
+        return self._num_idle.value > 0
 
-    def _put_branch(self, branch: Branch):
+    def _put_branch(self, branch: Branch) -> bool:
 
         """
-        This method is called by workers to put a branch into the queue.
+        This method is called by workers to donate a branch to an idle worker.
 
         Args:
-            branch  : The new branch
+            branch  : The donated branch
+        Returns:
+            False if no worker was idle, in which case the caller keeps the branch.
         """
 
-        with self._active_tasks_lock:
-            self._active_tasks.value += 1
-
         with self._work_lock:
-            if not self._finished_flag.is_set():
-                self.logger.debug(f"Worker put branch {branch} on queue")
-                self._branch_queue.put(branch)
+
+            if self._finished_flag.is_set():
+                return True
+
+            for i in range(self._max_procs):
+                if self._idle_flags[i]:
+                    self._idle_flags[i] = 0
+                    self._num_idle.value -= 1
+                    self.logger.debug(f"Worker put branch {branch} in inbox of worker {i}")
+                    self._inboxes[i].put(branch, self._job_id)
+                    return True
+
+        return False
+
+    def _merged_transport_stats(self) -> dict:
+
+        """
+        Returns the branch transport statistics summed over all worker inboxes.
+        """
+
+        merged = None
+
+        for inbox in self._inboxes:
+            stats = inbox.stats
+            if merged is None:
+                merged = stats
+            else:
+                for key in ["branches", "bytes", "encode_seconds", "decode_seconds"]:
+                    merged[key] += stats[key]
+
+        transport_time = merged["encode_seconds"] + merged["decode_seconds"]
+        merged["branches_per_second"] = merged["branches"] / transport_time if transport_time > 0 else 0.
+
+        return merged
 
     def _reset_params(self):
 
@@ -339,23 +1266,32 @@ class VeriNet:
         This makes the objective ready for the next verification task
         """
 
-        self._max_depth = mp.Value("i", 0)
-        self._branches_explored = mp.Value("i", 0)
-        self._status = mp.Value("i", Status.Undecided.value)
+        self._max_depth.value = 0
+        self._branches_explored.value = 0
+        self._status.value = Status.Undecided.value
         self._counter_example = None
         self._verification_objective = None
+        self._falsification_stats = None
+        self._portfolio_stats = None
+        self._branch_transport_stats = None
+        self._worker_idle_times = None
+        self._snapshot_stats = None
 
     def _reset_mp_params(self):
 
         """
         Resets all params used for multiprocessing
+
+        The shared values are reset in place, since they are shared with the already running workers.
         """
 
-        self._workers = []
-        self._active_tasks = mp.Value("i", 0)
-        self._active_procs = mp.Value("i", 0)
-        self._work_lock = mp.Lock()
-        self._active_tasks_lock = mp.Lock()
-        self._branch_queue = mp.Manager().Queue()
-        self._finished_flag = mp.Event()
-        self._all_children_done = mp.Event()
+        self._active_procs.value = 0
+        for inbox in self._inboxes:
+            inbox.reset_stats()
+        for i in range(self._max_procs):
+            self._idle_times[i] = 0
+        for i in range(3):
+            self._snapshot_counts[i] = 0
+        self._worker_results.clear()
+        self._finished_flag.clear()
+        self._all_children_done.clear()
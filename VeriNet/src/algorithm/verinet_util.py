@@ -6,7 +6,6 @@ Author: Patrick Henriksen <patrick@henriksen.as>
 """
 
 import numpy as np
-import gurobipy as grb
 
 from enum import Enum
 from src.algorithm.lp_solver import LPSolver
@@ -49,6 +48,26 @@ class Branch:
         self.safe_classes = []
         self.splitmans = splitmans
 
+        # Key of the ESIP snapshot of the parent branch, only valid in the worker that created the branch
+        self.snapshot_key = None
+
+        # LP bases of this branch and of its parent for each potential counter class, used to warm start the LPSolver
+        self.lp_bases = {}
+        self.parent_lp_bases = {}
+
+        # The StrategyBandit arm that created this branch and the bound width of the split branch, used by the
+        # learned strategies
+        self.bandit_arm = None
+        self.parent_width = None
+
+        # The output margin of the branch that was split, used by the best-first frontiers, see frontier.py
+        self.priority = None
+
+        # The (layer, node, lower, upper) input bounds tightened by LPs in this branch and its ancestors, see
+        # VeriNetWorker._tighten_bounds(). Unlike the rest of the forced bounds, these can't be recreated from the
+        # split list, so they are sent along with donated branches.
+        self.tightened_bounds = []
+
     @property
     def depth(self):
         return self._depth
@@ -74,48 +93,92 @@ class Branch:
         self._lp_solver_constraints = constraints
 
     @staticmethod
-    def add_constr_to_solver(bounds: ESIP, lp_solver: LPSolver, split: np.array) -> grb.Constr:
+    def common_depth(split_list: list, other_split_list: list) -> int:
 
         """
-        Creates a grb constraint from the given split.
+        Returns the number of splits at the start of the two split lists that are equal, which is the depth of the
+        deepest common ancestor of the two branches.
+        """
+
+        depth = 0
+        for split, other_split in zip(split_list, other_split_list):
+            if split != other_split:
+                break
+            depth += 1
+
+        return depth
+
+    @staticmethod
+    def split_constr(bounds: ESIP, split: dict) -> tuple:
+
+        """
+        Returns the LPSolver constraint of the given split.
 
         Args:
             bounds      : The NNBounds object
-            lp_solver   : The LPSolver object
             split       : The split in format (layer_num, node_num, split_x, upper_split)
 
         Returns:
-              The gurobi constraint
+              (coeffs, constant, sense, rhs) as used by LPSolver.add_input_constraint()
         """
 
-        input_vars = lp_solver.input_variables.select()
         layer, node, split_x, upper = split["layer"], split["node"], split["split_x"], split["upper"]
         symb_input_bounds = bounds.bounds_symbolic[layer - 1][node]
 
         if upper:
-            constr = lp_solver.grb_solver.addConstr(
-                grb.LinExpr(symb_input_bounds[:-1], input_vars) + bounds.error[layer - 1][node][1]
-                + symb_input_bounds[-1] >= split_x)
+            return symb_input_bounds[:-1], bounds.error[layer - 1][node][1] + symb_input_bounds[-1], ">=", split_x
         else:
-            constr = lp_solver.grb_solver.addConstr(
-                grb.LinExpr(symb_input_bounds[:-1], input_vars) + bounds.error[layer - 1][node][0]
-                + symb_input_bounds[-1] <= split_x)
+            return symb_input_bounds[:-1], bounds.error[layer - 1][node][0] + symb_input_bounds[-1], "<=", split_x
 
-        lp_solver.grb_solver.update()
+    @staticmethod
+    def add_constr_to_solver(bounds: ESIP, lp_solver: LPSolver, split: dict):
+
+        """
+        Adds the constraint of the given split to the LPSolver.
 
-        return constr
+        Args:
+            bounds      : The NNBounds object
+            lp_solver   : The LPSolver object
+            split       : The split in format (layer_num, node_num, split_x, upper_split)
+
+        Returns:
+              The constraint handle
+        """
+
+        return lp_solver.add_input_constraint(*Branch.split_constr(bounds, split))
+
+    @staticmethod
+    def add_constrs_to_solver(bounds: ESIP, lp_solver: LPSolver, splits: list) -> list:
+
+        """
+        Adds the constraints of the given splits to the LPSolver in one call.
+
+        Args:
+            bounds      : The NNBounds object
+            lp_solver   : The LPSolver object
+            splits      : A list with splits in format (layer_num, node_num, split_x, upper_split)
+
+        Returns:
+              A list with the constraint handles
+        """
+
+        if len(splits) == 0:
+            return []
+
+        coeffs, constants, senses, rhs = zip(*[Branch.split_constr(bounds, split) for split in splits])
+
+        return lp_solver.add_input_constraints(np.vstack(coeffs), np.array(constants), list(senses), np.array(rhs))
 
     def remove_all_constrs_from_solver(self, solver: LPSolver):
 
         """
-        Removes the last num constraints in self.lp_solver_constraints to grb_solver
+        Removes all constraints in self.lp_solver_constraints from the LPSolver
         """
 
         if self.lp_solver_constraints is not None:
             for constr in self.lp_solver_constraints:
-                solver.grb_solver.remove(constr)
+                solver.remove_constraint(constr)
         self.lp_solver_constraints = None
-        solver.grb_solver.update()
 
     def add_all_constrains(self, bounds: ESIP, solver: LPSolver, split_list: list):
 
@@ -132,19 +195,17 @@ class Branch:
         """
 
         assert self.lp_solver_constraints is None, "Tried adding new constraints before removing old"
-        self.lp_solver_constraints = []
-
-        for split in split_list:
-            self.lp_solver_constraints.append(Branch.add_constr_to_solver(bounds, solver, split))
+        self.lp_solver_constraints = Branch.add_constrs_to_solver(bounds, solver, split_list)
 
     def update_constrs(self, bounds: ESIP, solver: LPSolver, old_split_list: list, old_constr_list: list):
 
         """
         Updates the constraints from the constraints of the last branch to the constraints of this branch.
 
-        All constraints due to splits that are not in this branch are removed. We also re-add all constraints
-        from splits in layers after the layer of the new split. This is done since the equations in ESIP
-        may have changed. All other constraints are kept as is.
+        All constraints due to splits that are not in this branch are removed and the constraints of the splits
+        of this branch after the common ancestor are added. We also re-add all constraints from splits in layers
+        after the minimum layer of the changed splits. This is done since the equations in ESIP may have changed.
+        All other constraints are kept as is.
 
         Args:
             bounds          : The ESIP object
@@ -156,26 +217,32 @@ class Branch:
         assert self.lp_solver_constraints is None, "Tried adding new constraints before removing old"
         self.lp_solver_constraints = []
 
+        # With the depth-first frontier the old branch is a descendant of the parent of this branch, so all but
+        # the last split are shared. The best-first frontiers may switch to any branch.
+        common_depth = min(Branch.common_depth(self.split_list, old_split_list), self.depth - 1)
         min_layer = bounds.num_layers
 
-        for i in range(self.depth - 1, len(old_split_list)):
+        for i in range(common_depth, len(old_split_list)):
             # On backtrack we have to update all nodes after the minimum layer constraint that was changed
             min_layer = min(min_layer, old_split_list[i]["layer"])
-            solver.grb_solver.remove(old_constr_list[i])
-
-        min_layer = min(min_layer, self.split_list[self.depth - 1]["layer"])
+            solver.remove_constraint(old_constr_list[i])
 
-        # Re-add constraints where the symbolic bounds might change due to the new constraint
-        re_add_idx = [i for i in range(self.depth - 1) if old_split_list[i]["layer"] > min_layer]
+        for split in self.split_list[common_depth:]:
+            min_layer = min(min_layer, split["layer"])
 
-        for i in range(self.depth - 1):
+        # Re-add constraints where the symbolic bounds might change due to the new constraints
+        re_add_idx = [i for i in range(common_depth) if old_split_list[i]["layer"] > min_layer]
 
-            if i in re_add_idx:
+        for i in re_add_idx:
+            solver.remove_constraint(old_constr_list[i])
 
-                solver.grb_solver.remove(old_constr_list[i])
-                old_constr_list[i] = Branch.add_constr_to_solver(bounds, solver, self.split_list[i])
+        # The re-added constraints and the constraints of the new splits are added in one call
+        new_constrs = Branch.add_constrs_to_solver(bounds, solver, [self.split_list[i] for i in re_add_idx] +
+                                                   self.split_list[common_depth:])
 
-            self._lp_solver_constraints.append(old_constr_list[i])
+        for i, constr in zip(re_add_idx, new_constrs):
+            old_constr_list[i] = constr
 
-        self.lp_solver_constraints.append(Branch.add_constr_to_solver(bounds, solver, self.split_list[-1]))
-        solver.grb_solver.update()
+        if common_depth > 0:
+            self._lp_solver_constraints.extend(old_constr_list[:common_depth])
+        self.lp_solver_constraints.extend(new_constrs[len(re_add_idx):])
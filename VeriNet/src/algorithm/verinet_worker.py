@@ -13,13 +13,16 @@ import numpy as np
 import copy as copy
 
 from typing import Callable, Optional
-from collections import deque
 
+from src.algorithm.attacks import PGDAttack
+from src.algorithm.frontier import get_frontier
 from src.algorithm.lp_solver import LPSolver
 from src.algorithm.esip import ESIP, BoundsException
 from src.algorithm.verification_objectives import VerificationObjective
 from src.algorithm.verinet_util import Status, Branch
-from src.algorithm.strategist import Strategist
+from src.algorithm.strategist import Strategist, BANDIT_STRATEGY, PSEUDO_COST_STRATEGY, get_strategy
+from src.algorithm.pseudo_costs import PseudoCosts
+from src.algorithm.strategy_bandit import StrategyBandit
 from src.algorithm.splitmans import Splitmans
 
 
@@ -33,7 +36,21 @@ class VeriNetWorker:
                  gradient_descent_max_iters: int = 5,
                  gradient_descent_step: float = 1e-1,
                  gradient_descent_min_loss_change: float = 1e-2,
-                 verbose=True
+                 verbose=True,
+                 error_matrix_backend: str = "dense",
+                 snapshot_cache_size: int = 2**26,
+                 batch_siblings: bool = False,
+                 lp_backend: str = "gurobi",
+                 lp_warm_start: bool = False,
+                 lp_threads: int = 1,
+                 lp_tightening_k: int = 0,
+                 pgd_restarts: int = 0,
+                 pgd_iters: int = 10,
+                 pgd_pre_filter: bool = False,
+                 strategy: str = "best_by_layer",
+                 bandit_stats=None,
+                 pseudo_cost_stats=None,
+                 frontier: str = "dfs"
                  ):
 
         """
@@ -51,6 +68,37 @@ class VeriNetWorker:
                                               from a _lp_solver counter example
             gradient_descent_min_loss_change: The minimum amount of change in loss from last iteration to keep trying
                                               gradient descent
+            error_matrix_backend            : The error matrix backend of ESIP, "dense" or "factored".
+            snapshot_cache_size             : The maximum number of bytes used by the ESIP layer snapshots, which
+                                              avoid recalculating the layers below the split when backtracking.
+            batch_siblings                  : If true, the bounds of both branches created by a split are calculated
+                                              in one batched ESIP pass and stored as snapshots. Requires
+                                              snapshot_cache_size > 0.
+            lp_backend                      : The LP backend used by the LPSolver, "gurobi" or "scipy".
+            lp_warm_start                   : If true, the LP of each potential counter class is warm started from
+                                              the parents basis for the same class, also when backtracking. If
+                                              false, each LP continues from the basis of the previous LP.
+            lp_threads                      : If larger than 1, the LPs of all potential counters in a branch are
+                                              solved concurrently in up to lp_threads threads. Else they are solved
+                                              one after the other until a counter example is found.
+            lp_tightening_k                 : If larger than 0, the input bounds of the lp_tightening_k nodes with the
+                                              largest error effect on the output are tightened with the LPSolver
+                                              before branching, see _tighten_bounds().
+            pgd_restarts                    : If larger than 0, the single start gradient descent is replaced by the
+                                              batched PGD attack in attacks.py, starting from the LP solution, the
+                                              previous counter examples and pgd_restarts random points, and
+                                              targeting all potential counters of the branch at once.
+            pgd_iters                       : The number of iterations of the batched PGD attack.
+            pgd_pre_filter                  : If true and pgd_restarts > 0, the batched PGD attack is run before the
+                                              bounds of the first branch are calculated.
+            strategy                        : The branching strategy used to select the node to split, see
+                                              strategist.STRATEGY_NAMES.
+            bandit_stats                    : The statistics shared by the StrategyBandits of all workers if
+                                              strategy is "bandit", see StrategyBandit.
+            pseudo_cost_stats               : The statistics shared by the PseudoCosts of all workers if strategy is
+                                              "pseudo_cost", see PseudoCosts.
+            frontier                        : The order the open branches are explored in, "dfs", "best_first" or
+                                              "hybrid", see frontier.py.
         """
 
         self._model = model
@@ -61,6 +109,27 @@ class VeriNetWorker:
         self._gradient_descent_step = gradient_descent_step
         self._gradient_descent_min_loss_change = gradient_descent_min_loss_change
         self._verbose = verbose
+        self._error_matrix_backend = error_matrix_backend
+        self._snapshot_cache_size = snapshot_cache_size
+        self._batch_siblings = batch_siblings
+        self._lp_backend = lp_backend
+        self._lp_warm_start = lp_warm_start
+        self._lp_threads = lp_threads
+        self._lp_tightening_k = lp_tightening_k
+        self._lp_tightening_tolerance = 1e-5
+        self._pgd_pre_filter = pgd_pre_filter
+        self._attack = PGDAttack(model, num_restarts=pgd_restarts, max_iters=pgd_iters) if pgd_restarts > 0 else None
+        self._bandit = None
+        self._pseudo_costs = None
+        if strategy == BANDIT_STRATEGY:
+            self._bandit = StrategyBandit(shared_stats=bandit_stats)
+            self._strategy = self._bandit
+        elif strategy == PSEUDO_COST_STRATEGY:
+            self._pseudo_costs = PseudoCosts(shared_stats=pseudo_cost_stats)
+            self._strategy = self._pseudo_costs
+        else:
+            self._strategy = get_strategy(strategy)
+        self._next_snapshot_key = 0
 
         self._status = Status.Undecided
         self._counter_example: torch.Tensor = None
@@ -68,7 +137,10 @@ class VeriNetWorker:
         self._lp_solver: LPSolver = None
         self._bounds: ESIP = None
 
-        self._branches = deque([])
+        self._frontier = frontier
+        self._branches = get_frontier(frontier)
+        self._current_branch: Optional[Branch] = None
+        self._lp_input_bounds_set = False
 
         self._set_parameters_requires_grad(model=model, requires_grad=False)
 
@@ -87,6 +159,42 @@ class VeriNetWorker:
     def bounds(self) -> ESIP:
         return self._bounds
 
+    @property
+    def lp_solver(self) -> Optional[LPSolver]:
+        return self._lp_solver
+
+    @property
+    def bandit(self) -> Optional[StrategyBandit]:
+        return self._bandit
+
+    def set_verification_objective(self,
+                                   verification_objective: VerificationObjective,
+                                   no_split: bool = False,
+                                   gradient_descent_intervals: int = 5,
+                                   verbose: bool = True):
+
+        """
+        Prepares the worker for a new verification objective.
+
+        The model, the ESIP mappings and the LPSolver are kept, so a worker can be reused for many objectives
+        without paying the initialization cost again.
+
+        Args:
+            verification_objective          : The VerificationObjective
+            no_split                        : If true no splitting is done
+            gradient_descent_intervals      : Gradient descent performed to find counter example each number of
+                                              intervals. Should be >0 0.
+            verbose                         : If true information is printed at each branch
+        """
+
+        self._verification_objective = verification_objective
+        self._no_split = no_split
+        self._gradient_descent_intervals = gradient_descent_intervals
+        self._verbose = verbose
+
+        self._status = Status.Undecided
+        self._counter_example = None
+
     def _init_bounds(self):
 
         """
@@ -94,7 +202,9 @@ class VeriNetWorker:
         """
 
         try:
-            self._bounds = ESIP(self._model, self._verification_objective.input_shape)
+            self._bounds = ESIP(self._model, self._verification_objective.input_shape,
+                               error_matrix_backend=self._error_matrix_backend,
+                               snapshot_cache_size=self._snapshot_cache_size)
         except BoundsException as e:
             raise VeriNetException("Error initializing ESIP in VeriNet") from e
 
@@ -109,10 +219,12 @@ class VeriNetWorker:
 
         if self._lp_solver is None:
             self._lp_solver = LPSolver(self._verification_objective.input_size,
-                                       self._verification_objective.output_size)
-            self._lp_solver.set_variable_bounds(self._bounds, set_input=True)
-        else:
-            self._lp_solver.set_variable_bounds(self._bounds, set_input=False)
+                                       self._verification_objective.output_size,
+                                       backend=self._lp_backend,
+                                       warm_start=self._lp_warm_start)
+
+        self._lp_solver.set_variable_bounds(self._bounds, set_input=not self._lp_input_bounds_set)
+        self._lp_input_bounds_set = True
 
     def verify(self, start_branch: Branch, finished_flag: Optional[multiprocessing.Event],
                needs_branches: Optional[Callable], put_queue: Optional[Callable], queue_depth: int) -> Optional[Status]:
@@ -123,12 +235,11 @@ class VeriNetWorker:
         Args:
             start_branch     : The first branch
             finished_flag    : If set, the worker will abort. If None this parameter is disregarded.
-            needs_branches   : A callable that should return true if the queue needs more branches. If None
-                               branches will never be added to queue
-            put_queue        : A function to put new branches into the working queue. If None
-                               branches will never be added to queue
-            queue_depth      : If the depth difference between a branch and the deepest branch is more than this,
-                               the branch will be put into a queue for other processes.
+            needs_branches   : A callable that should return true if other workers need branches. If None
+                               branches will never be given away
+            put_queue        : A function giving a branch to another worker, returning False if the branch wasn't
+                               taken. If None branches will never be given away
+            queue_depth      : The minimum number of branches in the local queue before branches are given away
 
         Returns:
             A Status object
@@ -137,9 +248,19 @@ class VeriNetWorker:
         assert self._gradient_descent_intervals >= 0, "Gradient descent intervals should be >= 0"
         self.init_main_loop()
 
+        if self._attack is not None and self._pgd_pre_filter and start_branch.depth == 0:
+            # Cheap search for counter examples before any bounds are calculated
+            self._counter_example = self._attack.run(self._verification_objective)
+            if self._counter_example is not None:
+                self._status = Status.Unsafe
+                self._cleanup()
+                return self._status
+
         current_branch = None
         if start_branch.forced_input_bounds is None:
-            start_branch.forced_input_bounds = self._bounds.forced_input_bounds
+            # Branches received through the shared memory transport only contain the split list and tightened bounds
+            start_branch.forced_input_bounds = self._bounds.forced_bounds_from_split_list(
+                start_branch.split_list, start_branch.tightened_bounds)
 
         self._branches.append(start_branch)
 
@@ -149,12 +270,16 @@ class VeriNetWorker:
                 self._cleanup()
                 return None
 
+            # Donate the shallowest branch if another worker is idle
             if (needs_branches is not None and
                     put_queue is not None and
                     len(self._branches) >= queue_depth and
-                    (self._branches[-1].depth - self._branches[0].depth) >= queue_depth and
                     needs_branches()):
-                put_queue(self._branches.popleft())
+                branch = self._branches.popleft()
+                if put_queue(branch):
+                    self._bounds.discard_snapshot(branch.snapshot_key)
+                else:
+                    self._branches.appendleft(branch)
 
             if len(self._branches) == 0:
                 self._status = Status.Safe
@@ -168,6 +293,7 @@ class VeriNetWorker:
                 self._status = Status.Underflow
                 break
             current_branch = new_branch
+            self._current_branch = current_branch
 
             self.branches_explored += 1
             if current_branch is not None and current_branch.depth > self.max_depth:
@@ -178,6 +304,9 @@ class VeriNetWorker:
                                (current_branch.depth % self._gradient_descent_intervals) == 0)
             self._status = self._verify_once(do_grad_descent, current_branch)
 
+            if current_branch.parent_width is not None and self._status != Status.Unsafe:
+                self._record_split_improvement(current_branch)
+
             if self._verbose:
                 print(f" Depth: {current_branch.depth}, _status: {self._status}")
 
@@ -192,6 +321,14 @@ class VeriNetWorker:
             if self._no_split:
                 break
 
+            if self._status == Status.Undecided and self._lp_tightening_k > 0:
+                self._status = self._tighten_and_verify(do_grad_descent, current_branch)
+
+                if self._status == Status.Unsafe or self._status == Status.Underflow:
+                    break
+                if self._status == Status.Safe:
+                    continue
+
             did_branch = False
             if self._status == Status.Undecided:
                 did_branch = self._branch(current_branch)
@@ -226,23 +363,25 @@ class VeriNetWorker:
 
         else:
             counter = 0
-            while self._verification_objective.configure_next_potential_counter(self._lp_solver, self._bounds):
-                result = self._lp_solver.solve()
+            for result, lp_counter_example, lp_output in self._potential_counter_lp_results(current_branch):
 
                 if not result:
                     self._verification_objective.finished_potential_counter(self._lp_solver, Status.Safe)
                     continue
 
                 counter += 1
-                # Get possible counter examples from LPSolver
-                lp_counter_example, lp_output = self._lp_solver.get_assigned_values()
                 lp_output = np.atleast_2d(lp_output)
 
-                # Do gradient descent
-                loss = self._verification_objective.grad_descent_losses(lp_output, self._bounds)
+                if self._attack is not None:
+                    # The batched attack targets all potential counters, so it is only run for the first one
+                    self._counter_example = self._attack_counter_example(lp_counter_example,
+                                                                         do_grad_descent and counter == 1)
+                else:
+                    # Do gradient descent
+                    loss = self._verification_objective.grad_descent_losses(lp_output, self._bounds)
 
-                self._counter_example = self._grad_descent_counter_example(lp_counter_example, loss,
-                                                                           do_grad_descent)
+                    self._counter_example = self._grad_descent_counter_example(lp_counter_example, loss,
+                                                                               do_grad_descent)
                 if self._counter_example is not None:
                     self._verification_objective.finished_potential_counter(self._lp_solver, Status.Undecided)
                     return Status.Unsafe
@@ -255,6 +394,142 @@ class VeriNetWorker:
                 current_branch.safe_classes = self._verification_objective.safe_classes
                 return Status.Undecided
 
+    def _tighten_and_verify(self, do_grad_descent: bool, current_branch: Branch) -> Status:
+
+        """
+        Tightens the bounds with _tighten_bounds() and runs the verification step again if they changed.
+
+        Args:
+            do_grad_descent : If true gradient descent is done to find a counter example
+            current_branch  : The current branch
+        Returns:
+            A Status object, Underflow if ESIP failed with the tightened bounds
+        """
+
+        tightened = self._tighten_bounds(current_branch)
+
+        if tightened is None:
+            return Status.Safe
+        if not tightened:
+            return Status.Undecided
+        if not self._bounds.calc_bounds(self._verification_objective.input_bounds_flat, from_layer=tightened):
+            return Status.Underflow
+
+        self._lp_solver.set_variable_bounds(self._bounds, set_input=False)
+        self._verification_objective.initial_settings(self._lp_solver, self._bounds, current_branch.safe_classes)
+
+        return self._verify_once(do_grad_descent, current_branch)
+
+    def _tighten_bounds(self, current_branch: Branch) -> Optional[int]:
+
+        """
+        Tightens the input bounds of the most influential unstable nodes using the LPSolver.
+
+        The lp_tightening_k nodes ranked highest by Strategist.largest_error_split_node() are selected and the
+        symbolic bounds of their input are minimised and maximised subject to the split constraints of the current
+        branch. Better bounds are written to the forced input bounds, so they are used by ESIP and inherited by
+        branches created from this branch. The tightened bounds are also added to current_branch.tightened_bounds,
+        so they are kept when a branch is donated to another worker. Since all workers tighten the bounds of their
+        own branches, the LPs run in parallel across the workers.
+
+        Args:
+            current_branch  : The current branch
+        Returns:
+            The first layer with tightened bounds, 0 if no bounds were tightened and None if the LP was infeasible,
+            i.e. the branch is safe.
+        """
+
+        output_weights = self._verification_objective.output_refinement_weights(self._bounds)
+        nodes = Strategist.largest_error_split_node(self._bounds, self._lp_tightening_k, output_weights=output_weights)
+        if nodes is None:
+            return 0
+
+        forced_input_bounds = self._bounds.forced_input_bounds
+        min_layer = 0
+
+        for layer, node in nodes:
+
+            symbolic = self._bounds.bounds_symbolic[layer - 1][node]
+            error = self._bounds.error[layer - 1][node]
+
+            lower = self._lp_solver.minimize_input(symbolic[:-1], symbolic[-1] + error[0])
+            upper = self._lp_solver.maximize_input(symbolic[:-1], symbolic[-1] + error[1])
+
+            if lower is None or upper is None:
+                return None
+
+            # Relax by the LP tolerance to keep the bounds sound
+            lower -= self._lp_tightening_tolerance * (1 + abs(lower))
+            upper += self._lp_tightening_tolerance * (1 + abs(upper))
+
+            concrete = self._bounds.bounds_concrete[layer - 1][node]
+            if lower <= concrete[0] and upper >= concrete[1]:
+                continue
+
+            if forced_input_bounds[layer - 1] is None:
+                forced_input_bounds[layer - 1] = np.zeros((self._bounds.layer_sizes[layer - 1], 2), dtype=np.float64)
+                forced_input_bounds[layer - 1][:, 0] = -np.inf
+                forced_input_bounds[layer - 1][:, 1] = np.inf
+
+            forced = forced_input_bounds[layer - 1][node]
+            forced[0] = max(forced[0], lower)
+            forced[1] = min(forced[1], upper)
+            current_branch.tightened_bounds.append((layer, node, float(forced[0]), float(forced[1])))
+
+            min_layer = layer if min_layer == 0 else min(min_layer, layer)
+
+        return min_layer
+
+    def _potential_counter_lp_results(self, current_branch: Branch):
+
+        """
+        Runs the LPSolver for the potential counters of the verification objective.
+
+        With lp_threads > 1, and if the objective supports it, the LPs of all potential counters are solved
+        concurrently before the first result is returned. Otherwise each LP is solved when the result is requested,
+        so no LPs are solved after a counter example was found.
+
+        Args:
+            current_branch  : The current branch
+        Returns:
+            A generator of (feasible, lp_counter_example, lp_output). The objective is configured for the
+            corresponding potential counter when a result is returned.
+        """
+
+        objective = self._verification_objective
+
+        constraints = objective.potential_counter_constraints(self._bounds) if self._lp_threads > 1 else None
+
+        if constraints is not None:
+
+            if len(constraints) == 0:
+                return
+
+            potential_counters, coeffs, constants, senses, rhs = zip(*constraints)
+            results = self._lp_solver.solve_each_input_constraint(np.vstack(coeffs), np.array(constants),
+                                                                  list(senses), np.array(rhs),
+                                                                  num_threads=self._lp_threads)
+
+            for potential_counter, result in zip(potential_counters, results):
+                objective.select_potential_counter(potential_counter)
+                yield result
+
+            return
+
+        while objective.configure_next_potential_counter(self._lp_solver, self._bounds):
+
+            if self._lp_warm_start:
+                # The parents LP for the same potential counter only differs by the new split constraint
+                potential_counter = getattr(objective, "current_potential_counter", None)
+                self._lp_solver.set_basis(current_branch.parent_lp_bases.get(potential_counter))
+                result = self._lp_solver.solve()
+                current_branch.lp_bases[potential_counter] = self._lp_solver.basis
+            else:
+                result = self._lp_solver.solve()
+
+            # Get possible counter examples from LPSolver
+            yield (result, *self._lp_solver.get_assigned_values()) if result else (result, None, None)
+
     def init_main_loop(self):
 
         """
@@ -263,7 +538,14 @@ class VeriNetWorker:
 
         self.max_depth = 0
         self.branches_explored = 0
-        self._init_bounds()
+        self._status = Status.Undecided
+        self._counter_example = None
+        self._lp_input_bounds_set = False
+
+        if self._bounds is None or self._bounds.input_shape != self._verification_objective.input_shape:
+            self._init_bounds()
+
+        self._bounds.reset_snapshot_stats()
 
     # noinspection PyArgumentList,PyUnresolvedReferences
     def _grad_descent_counter_example(self, lp_counter_example: np.array, loss_func: Callable,
@@ -319,6 +601,24 @@ class VeriNetWorker:
 
         return None
 
+    def _attack_counter_example(self, lp_counter_example: np.array, do_attack: bool = True) -> np.array:
+
+        """
+        Runs the batched PGD attack from the LP counter example candidate and the random start points.
+
+        Args:
+            lp_counter_example   : The counter example candidate from the LPSolver
+            do_attack            : If false, only the LP counter example candidate is checked
+
+        Returns:
+            The counter example if found, else None.
+        """
+
+        if not do_attack:
+            return self._grad_descent_counter_example(lp_counter_example, None, do_grad_descent=False)
+
+        return self._attack.run(self._verification_objective, self._bounds, starts=[lp_counter_example])
+
     def _get_logits(self, x: torch.Tensor) -> torch.Tensor:
 
         """
@@ -350,58 +650,21 @@ class VeriNetWorker:
         Returns:
             True if branching succeeded else false
         """
-        # Default strategy
-	
-        # refine_output_weights = self._verification_objective.output_refinement_weights(self._bounds)
-        # split = self.bounds.largest_error_split_node(output_weights=refine_output_weights)
-        
-        ###############################################################
-
-        # Memory based strategies -- add "memory" parameter to run_benchmark, while using these methods
-        
-        # Simple memory strategy
-        
-        # split = Strategist.pop_first(bounds=self.bounds,
-        #                              verification_objective=self._verification_objective, 
-        #                              splitmans=current_branch.splitmans)
-
 
-        # Sorted memory strategy
-         
-        # split = Strategist.pop_first_layer(bounds=self.bounds, 
-        #                              verification_objective=self._verification_objective, 
-        #                              splitmans=current_branch.splitmans)
-        
-        
-        # Reverse-sorted memory strategy  
-	
-        # split = Strategist.pop_last_layer(bounds=self.bounds, 
-        #                             verification_objective=self._verification_objective, 
-        #                             splitmans=current_branch.splitmans)
-
-
-        ################################################################
-
-        # Alternating heuristic strategy
-
-        # split = Strategist.get_alternate_weights(bounds=self.bounds, 
-        #                              verification_objective=self._verification_objective, 
-        #                              splitmans=current_branch.splitmans)
-
-
-        # Semi-hierarchical strategy
-
-        split = Strategist.get_best_by_layer(bounds=self.bounds, 
-                                     verification_objective=self._verification_objective, 
-                                     splitmans=current_branch.splitmans)
-                                     
-        # End of strategy section
-        
+        split = self._strategy(bounds=self.bounds,
+                               verification_objective=self._verification_objective,
+                               splitmans=current_branch.splitmans)
 
         if split is None:
             return False
         layer, node = split
 
+        bandit_arm = self._bandit.last_arm if self._bandit is not None else None
+        learned = self._bandit is not None or self._pseudo_costs is not None
+        parent_width = Strategist.bound_width(self._bounds) if learned else None
+        priority = (self._verification_objective.output_margin(self._bounds.bounds_concrete[-1])
+                    if self._branches.needs_priority else None)
+
         lower = self._bounds.bounds_concrete[layer - 1][node][0]
         upper = self._bounds.bounds_concrete[layer - 1][node][1]
         split_x = self._bounds.mappings[layer].split_point(lower, upper)
@@ -409,6 +672,12 @@ class VeriNetWorker:
         self._bounds.merge_current_bounds_into_forced()
         forced_input_bounds = self._bounds.forced_input_bounds
 
+        # The lower branch is explored after the subtree of the upper branch, store the layers it shares with the
+        # current branch so they don't have to be recalculated when backtracking.
+        snapshot_key = self._next_snapshot_key
+        self._next_snapshot_key += 1
+        self._bounds.save_snapshot(snapshot_key, layer)
+
         # Add the lower split branch
         split_forced = [arr.copy() for arr in forced_input_bounds]
         old_forced = split_forced[layer - 1][node, 1]
@@ -417,8 +686,13 @@ class VeriNetWorker:
         new_split = {"layer": layer, "node": node, "split_x": split_x, "upper": False}
         split_list = current_branch.split_list.copy()
         split_list.append(new_split)
-        new_branch = Branch(current_branch.depth + 1, split_forced, split_list, current_branch.splitmans)
+        lower_branch = new_branch = Branch(current_branch.depth + 1, split_forced, split_list, current_branch.splitmans)
         new_branch.safe_classes = current_branch.safe_classes.copy()
+        new_branch.snapshot_key = snapshot_key
+        new_branch.parent_lp_bases = current_branch.lp_bases
+        new_branch.bandit_arm, new_branch.parent_width = bandit_arm, parent_width
+        new_branch.priority = priority
+        new_branch.tightened_bounds = current_branch.tightened_bounds.copy()
         self._branches.append(new_branch)
 
         # Add the upper split branch
@@ -432,10 +706,61 @@ class VeriNetWorker:
         splitmans = copy.copy(current_branch.splitmans)
         new_branch = Branch(current_branch.depth + 1, split_forced, split_list, splitmans)
         new_branch.safe_classes = current_branch.safe_classes.copy()
+        new_branch.parent_lp_bases = current_branch.lp_bases
+        new_branch.bandit_arm, new_branch.parent_width = bandit_arm, parent_width
+        new_branch.priority = priority
+        new_branch.tightened_bounds = current_branch.tightened_bounds.copy()
         self._branches.append(new_branch)
 
+        if self._batch_siblings and self._snapshot_cache_size > 0:
+            self._calc_sibling_bounds(layer, [lower_branch, new_branch])
+
         return True
 
+    def _record_split_improvement(self, current_branch: Branch):
+
+        """
+        Rewards the bandit arm and records the pseudo-cost of the split that created the current branch.
+
+        Args:
+            current_branch  : The current branch, after the verification step
+        """
+
+        improvement = Strategist.split_improvement(current_branch.parent_width, self._bounds,
+                                                   closed=self._status == Status.Safe)
+
+        if self._bandit is not None and current_branch.bandit_arm is not None:
+            self._bandit.reward(current_branch.bandit_arm, improvement)
+
+        if self._pseudo_costs is not None:
+            split = current_branch.split_list[-1]
+            self._pseudo_costs.record(split["layer"], split["node"], improvement)
+
+    def _calc_sibling_bounds(self, layer: int, siblings: list):
+
+        """
+        Calculates the bounds of the two branches just created by _branch() in one batched ESIP pass.
+
+        The resulting states are stored as snapshots, so _switch_branch() can restore them instead of calling
+        calc_bounds(). Branches with invalid bounds are left to _switch_branch().
+
+        Args:
+            layer       : The layer of the split.
+            siblings    : The lower and upper branch created by the split.
+        """
+
+        states = self._bounds.calc_bounds_batch(self._verification_objective.input_bounds_flat,
+                                                [branch.forced_input_bounds for branch in siblings],
+                                                from_layer=layer)
+
+        for branch, state in zip(siblings, states):
+            if state is None:
+                continue
+            if branch.snapshot_key is None:
+                branch.snapshot_key = self._next_snapshot_key
+                self._next_snapshot_key += 1
+            self._bounds.save_snapshot(branch.snapshot_key, self._bounds.num_layers, state)
+
     def _switch_branch(self, current_branch: Branch, new_branch: Branch):
 
         """
@@ -454,16 +779,36 @@ class VeriNetWorker:
         # Set forced bounds of ESIP
         self._bounds.forced_input_bounds = new_branch.forced_input_bounds
 
+        restored_layers = None
+        common_depth = 0
+        if current_branch is not None:
+            common_depth = Branch.common_depth(current_branch.split_list, new_branch.split_list)
+            if new_branch.snapshot_key is not None:
+                restored_layers = self._bounds.restore_snapshot(new_branch.snapshot_key)
+
+        # All layers were calculated in a batch with the sibling branch
+        if restored_layers == self._bounds.num_layers:
+            success = True
+
         # New split, recalculate affected layers
-        if current_branch is not None and new_branch.depth == current_branch.depth + 1:
+        elif (current_branch is not None and new_branch.depth == current_branch.depth + 1 and
+              common_depth == current_branch.depth):
 
             success = self._bounds.calc_bounds(self._verification_objective.input_bounds_flat,
                                                from_layer=new_branch.split_list[-1]["layer"])
 
-        # Backtracking, recalculate from first differing layer, but do not recalculate input bounds to first layer
-        elif current_branch is not None and 0 < new_branch.depth <= current_branch.depth:
+        # Backtracking, the layers below the split were restored from the parents snapshot
+        elif current_branch is not None and new_branch.depth > 0 and restored_layers:
 
-            min_layer = min([split["layer"] for split in current_branch.split_list[new_branch.depth - 1:]])
+            success = self._bounds.calc_bounds(self._verification_objective.input_bounds_flat,
+                                               from_layer=new_branch.split_list[-1]["layer"])
+
+        # Backtracking, or switching to another subtree with a best-first frontier. Recalculate from the first
+        # differing layer, but do not recalculate input bounds to first layer
+        elif current_branch is not None and new_branch.depth > 0:
+
+            min_layer = min([split["layer"] for split in
+                             current_branch.split_list[common_depth:] + new_branch.split_list[common_depth:]])
             success = self._bounds.calc_bounds(self._verification_objective.input_bounds_flat, from_layer=min_layer)
 
         # First call, calculate all bounds
@@ -476,7 +821,7 @@ class VeriNetWorker:
 
         self._configure_lp_solver()
 
-        self._verification_objective.cleanup(self._lp_solver.grb_solver)
+        self._verification_objective.cleanup(self._lp_solver)
         self._verification_objective.initial_settings(self._lp_solver, self._bounds, new_branch.safe_classes)
 
         # Add branching constraints to LPSolver
@@ -492,16 +837,23 @@ class VeriNetWorker:
     def _cleanup(self):
 
         """
-        Resets all stats specific to the last VerificationObjective
+        Resets all stats specific to the last branch tree.
+
+        The LPSolver is kept for later calls, so all constraints added for the current branch and the
+        VerificationObjective are removed from it. The remaining rewards of the StrategyBandit are merged.
         """
 
         if self._lp_solver is not None:
-            self._verification_objective.cleanup(self._lp_solver.grb_solver)
-            self._lp_solver = None
+            self._verification_objective.cleanup(self._lp_solver)
+            if self._current_branch is not None:
+                self._current_branch.remove_all_constrs_from_solver(self._lp_solver)
 
-        self._verification_objective = None
+        self._current_branch = None
         self._bounds.reset_datastruct()
-        self._branches = deque([])
+
+        if self._bandit is not None:
+            self._bandit.merge()
+        self._branches = get_frontier(self._frontier)
 
     @staticmethod
     def _set_parameters_requires_grad(model: nn, requires_grad: bool = False):
@@ -8,20 +8,27 @@ Author: Patrick Henriksen <patrick@henriksen.as>
 import os
 import time
 import random
+import argparse
+import threading
+import multiprocessing as mp
 
 import numpy as np
 import torch
 from tqdm import tqdm
 from shutil import copyfile, rmtree
-import gurobipy as grb
 from torch.utils.data import DataLoader
 import torchvision.datasets as dset
 import torchvision.transforms as transform
 
 from src.algorithm.verinet import VeriNet
-from src.algorithm.verinet_util import Status
+from src.algorithm.verinet_worker import VeriNetWorker
+from src.algorithm.verinet_util import Status, Branch
+from src.algorithm.lp_backends import create_lp_backend
+from src.algorithm.splitmans import Splitmans
+from src.algorithm.strategist import STRATEGY_NAMES, MEMORY_STRATEGIES, PSEUDO_COST_STRATEGY
 from src.algorithm.verification_objectives import LocalRobustnessObjective
 from src.data_loader.nnet import NNET
+from src.scripts.benchmark_util import create_input_bounds
 from src.util.logger import get_logger
 from src.util.config import *
 
@@ -114,6 +121,139 @@ def pick_random_cifar10_images(path: str="../../data/cifar10_torch/", num_img: i
             f.write(f"{targets[num]},")
 
 
+def parse_benchmark_args(memory: int=1) -> argparse.Namespace:
+
+    """
+    Parses the command line arguments shared by the benchmark scripts.
+
+    Args:
+        memory  : The default memory size used by the Splitmans of the branching strategies
+    Returns:
+        The namespace with strategy, memory and max_procs
+    """
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--strategy", choices=list(STRATEGY_NAMES), default="best_by_layer",
+                        help="The branching strategy, see strategist.STRATEGY_NAMES")
+    parser.add_argument("--memory", type=int, default=memory,
+                        help="The memory size used by the memory based strategies")
+    parser.add_argument("--max-procs", type=int, default=None,
+                        help="The maximum number of processes used by VeriNet, cpu_count() if not given")
+
+    return parser.parse_args()
+
+
+def strategy_result_path(result_dir: str, filename: str, strategy: str, memory: int=1) -> str:
+
+    """
+    Returns the path of a result file in the subdirectory of result_dir for the strategy, creating it if needed.
+
+    The subdirectory is named after the strategy, followed by the memory size for the memory based strategies, so
+    runs of different strategies don't overwrite each other's results.
+
+    Args:
+        result_dir  : The directory with the results of all strategies
+        filename    : The name of the result file
+        strategy    : The branching strategy
+        memory      : The memory size used by the Splitmans of the branching strategies
+    Returns:
+        The path of the result file
+    """
+
+    strategy_dir = f"{strategy}_memory_{memory}" if strategy in MEMORY_STRATEGIES else strategy
+    strategy_dir = os.path.join(result_dir, strategy_dir)
+    os.makedirs(strategy_dir, exist_ok=True)
+
+    return os.path.join(strategy_dir, filename)
+
+
+_first_pass_model = None
+_first_pass_lp_backend = None
+_first_pass_strategy = None
+_first_pass_solver = None
+
+
+def _init_first_pass_worker(model, lp_backend: str, strategy: str):
+
+    """
+    Initializer for the processes in the first pass pool.
+    """
+
+    global _first_pass_model, _first_pass_lp_backend, _first_pass_strategy
+    _first_pass_model = model
+    _first_pass_lp_backend = lp_backend
+    _first_pass_strategy = strategy
+
+
+def _first_pass(job: tuple) -> tuple:
+
+    """
+    Verifies one (epsilon, image) instance in a single process with a short timeout.
+
+    The VeriNetWorker is kept for all jobs in the process, so ESIP and the LPSolver are only initialized once.
+
+    Args:
+        job     : The tuple (key, target, input_bounds, timeout, memory)
+    Returns:
+        The tuple (key, status value, branches explored, max depth, time spent)
+    """
+
+    global _first_pass_solver
+
+    key, target, input_bounds, timeout, memory = job
+
+    start = time.time()
+    objective = LocalRobustnessObjective(int(target), input_bounds, output_size=10)
+
+    if _first_pass_solver is None:
+        _first_pass_solver = VeriNetWorker(_first_pass_model, objective, gradient_descent_intervals=5, verbose=False,
+                                           lp_backend=_first_pass_lp_backend, strategy=_first_pass_strategy)
+    else:
+        _first_pass_solver.set_verification_objective(objective, gradient_descent_intervals=5, verbose=False)
+
+    timeout_flag = threading.Event()
+    timer = threading.Timer(timeout, timeout_flag.set)
+    timer.start()
+
+    try:
+        status = _first_pass_solver.verify(Branch(0, None, [], Splitmans(start_index=0, memory_size=memory, layer=0)),
+                                           timeout_flag, None, None, queue_depth=-1)
+    finally:
+        timer.cancel()
+
+    status = Status.Undecided if status is None else status
+
+    return (key, status.value, _first_pass_solver.branches_explored, _first_pass_solver.max_depth,
+            time.time() - start)
+
+
+def _run_first_pass(model, jobs: list, max_procs: int, lp_backend: str = "gurobi",
+                    strategy: str = "best_by_layer") -> dict:
+
+    """
+    Runs the first pass of the image-parallel mode, spreading the (epsilon, image) instances over a process pool.
+
+    Args:
+        model       : The torch model
+        jobs        : A list of jobs as described in _first_pass()
+        max_procs   : The number of processes, if None cpu_count() is used
+        lp_backend  : The LP backend, see lp_backends.py
+        strategy    : The branching strategy, see strategist.py
+    Returns:
+        A dictionary mapping the job keys to (status, branches explored, max depth, time spent)
+    """
+
+    results = {}
+    max_procs = mp.cpu_count() if max_procs is None else max_procs
+
+    with mp.Pool(max_procs, initializer=_init_first_pass_worker, initargs=(model, lp_backend, strategy)) as pool:
+        for key, status, branches_explored, max_depth, time_spent in tqdm(pool.imap_unordered(_first_pass, jobs),
+                                                                          total=len(jobs)):
+            results[key] = (Status(status), branches_explored, max_depth, time_spent)
+
+    return results
+
+
 # noinspection PyArgumentList,PyShadowingNames
 def run_benchmark(images: np.array,
                   epsilons: list,
@@ -123,26 +263,57 @@ def run_benchmark(images: np.array,
                   result_path: str,
                   targets: np.array=None,
                   max_procs: int=None,
-                  memory: int=1
+                  memory: int=1,
+                  image_parallel: bool=False,
+                  first_pass_timeout: float=1,
+                  epsilon_ladder: bool=False,
+                  lp_backend: str="gurobi",
+                  falsification_budget: float=0,
+                  strategy: str="best_by_layer",
+                  portfolio: list=None,
+                  pseudo_cost_path: str=None
                   ):
 
     """
     Runs benchmarking for networks
 
+    In the image-parallel mode all (epsilon, image) instances are first verified with first_pass_timeout in a pool
+    of single-process workers. Only the instances that are still undecided are verified afterwards using the
+    branch-level parallelism of VeriNet, with the remaining timeout.
+
+    With the epsilon ladder, all epsilons for an image are verified by VeriNet.verify_epsilon_ladder(), which skips
+    the instances implied by the results for other epsilons. Skipped instances are reported as
+    "Status.Safe (skipped: implied by epsilon e)", with 0 branches and the time spent in the first pass, if any.
+
     Args:
-        images      : The images used for benchmarking, should be NxM where N is the number of images and M is the
-                      number of pixels for FC networks and NxChannelsxHeightxWidth for convolutional networks.
-        epsilons    : A list with the epsilons (maximum pixel change)
-        model_path  : The path where the nnet model is stored
-        conv        : Has to be true if the given model is a convolutional network
-        timeout     : The maximum time in settings before timeout for each image
-        result_path : The path where the results are stored
-        targets     : The correct classes for the input, if None the predictions are used as correct classes
-        max_procs   : The maximum number of processes used.
+        images              : The images used for benchmarking, should be NxM where N is the number of images and M
+                              is the number of pixels for FC networks and NxChannelsxHeightxWidth for convolutional
+                              networks.
+        epsilons            : A list with the epsilons (maximum pixel change)
+        model_path          : The path where the nnet model is stored
+        conv                : Has to be true if the given model is a convolutional network
+        timeout             : The maximum time in settings before timeout for each image
+        result_path         : The path where the results are stored
+        targets             : The correct classes for the input, if None the predictions are used as correct classes
+        max_procs           : The maximum number of processes used.
+        memory              : The memory size used by the Splitmans of the branching strategies
+        image_parallel      : If true, the image-parallel first pass is used
+        first_pass_timeout  : The timeout in seconds for each instance in the image-parallel first pass
+        epsilon_ladder      : If true, results are reused across the epsilons as described above
+        lp_backend          : The LP backend, "gurobi" or "scipy". See lp_backends.py.
+        falsification_budget: The time budget in seconds of the falsification pre-pass of VeriNet.verify(). If 0,
+                              the pre-pass is disabled.
+        strategy            : The branching strategy, see strategist.STRATEGY_NAMES. The memory based strategies use
+                              the given memory.
+        portfolio           : A list of strategies raced against each other by VeriNet, see VeriNet._race(). If
+                              given, strategy is only used in the image-parallel first pass.
+        pseudo_cost_path    : The file the pseudo-costs of the "pseudo_cost" strategy are loaded from and saved to.
+                              If None, a file named after the model in the directory of result_path is used, so
+                              later runs with the same model start with the learned pseudo-costs.
     """
 
     # Get the "Academic license" print from gurobi at the beginning
-    grb.Model()
+    create_lp_backend(lp_backend, 0)
 
     nnet = NNET(model_path)
     model = nnet.from_nnet_to_verinet_nn()
@@ -151,98 +322,197 @@ def run_benchmark(images: np.array,
     img_shape = images.shape[1:]
     batch_size = images.shape[0]
 
-    if targets is None:
-        targets = model(torch.Tensor(nnet.normalize_input(images.reshape(batch_size, -1)).
+    predictions = model(torch.Tensor(nnet.normalize_input(images.reshape(batch_size, -1)).
                                      reshape((batch_size, *img_shape)))).argmax(dim=1).numpy()
 
+    if targets is None:
+        targets = predictions
+
     if os.path.isfile(result_path):
         copyfile(result_path, result_path + ".bak")
 
+    uses_pseudo_costs = strategy == PSEUDO_COST_STRATEGY or (portfolio is not None and PSEUDO_COST_STRATEGY in portfolio)
+    if uses_pseudo_costs and pseudo_cost_path is None:
+        model_name = os.path.splitext(os.path.basename(model_path))[0]
+        pseudo_cost_path = os.path.join(os.path.dirname(result_path), f"{model_name}_pseudo_costs.npy")
+
     with open(result_path, 'w', buffering=1) as f:
 
         benchmark_logger.info(f"Starting benchmarking with timeout: {timeout},  model path: {model_path}")
         f.write(f"Benchmarking with:"
                 f"Timeout {timeout} seconds \n" +
-                f"Model path: {model_path} \n\n")
-
-        solver = VeriNet(model,
-                         gradient_descent_max_iters=5,
-                         gradient_descent_step=1e-1,
-                         gradient_descent_min_loss_change=1e-2,
-                         max_procs=max_procs)
-
-        for eps in epsilons:
-
-            safe = []
-            unsafe = []
-            undecided = []
-            underflow = []
-
-            benchmark_logger.info(f"Starting benchmarking with epsilon: {eps}")
-            f.write(f"Benchmarking with epsilon = {eps}: \n\n")
-            solver_time = 0
-
-            for i in tqdm(range(len(images))):
-                # if i <= 86:
-                #     continue
-                data_i = images[i]
-                # Test that the data point is classified correctly
-                data_i_flat = data_i.reshape(-1)
-                data_i_norm = nnet.normalize_input(data_i_flat).reshape(data_i.shape)
-                pred_i = model(torch.Tensor(data_i_norm)).argmax(dim=1).numpy()[0]
-                if pred_i != targets[i]:
-                    f.write(f"Final result of input {i}: Skipped,correct_label: {targets[i]}, predicted: {pred_i}\n")
-                    continue
-
-                # Create input bounds
-                if conv:
-                    input_bounds = np.zeros((*data_i.shape, 2), dtype=np.float32)
-                    input_bounds[:, :, :, 0] = data_i - eps
-                    input_bounds[:, :, :, 1] = data_i + eps
-
-                    input_bounds[:, :, :, 0] = nnet.normalize_input(input_bounds[:, :, :, 0].reshape(-1)).\
-                        reshape(*data_i.shape)
-                    input_bounds[:, :, :, 1] = nnet.normalize_input(input_bounds[:, :, :, 1].reshape(-1)). \
-                        reshape(*data_i.shape)
-                else:
-                    input_bounds = np.zeros((data_i.shape[0], 2), dtype=np.float32)
-                    input_bounds[:, 0] = data_i - eps
-                    input_bounds[:, 1] = data_i + eps
-
-                    input_bounds = nnet.normalize_input(input_bounds)
-
-                # Run verification
-                start = time.time()
-                objective = LocalRobustnessObjective(int(targets[i]), input_bounds, output_size=10)
-                status = solver.verify(objective,
-                                       timeout=timeout,
-                                       no_split=False,
-                                       gradient_descent_intervals=5,
-                                       verbose=False,
-                                       memory=memory)
-
-                f.write(f"Final result of input {i}: {status}, branches explored: {solver.branches_explored}, "
-                        f"max depth: {solver.max_depth}, time spent: {time.time()-start:.2f} seconds\n")
-                solver_time += time.time() - start
-
-                if status == Status.Safe:
-                    safe.append(i)
-                elif status == Status.Unsafe:
-                    unsafe.append(i)
-                elif status == Status.Undecided:
-                    undecided.append(i)
-                elif status == Status.Underflow:
-                    benchmark_logger.warning(f"Underflow for image {i}")
-                    underflow.append(i)
-
-            f.write("\n")
-            f.write(f"Time spent in solver: {solver_time}\n")
-            f.write(f"Total number of images verified as safe: {len(safe)}\n")
-            f.write(f"Safe images: {safe}\n")
-            f.write(f"Total number of images verified as unsafe: {len(unsafe)}\n")
-            f.write(f"Unsafe images: {unsafe}\n")
-            f.write(f"Total number of images timed-out: {len(undecided)}\n")
-            f.write(f"Timed-out images: {undecided}\n")
-            f.write(f"Total number of images with underflow: {len(underflow)}\n")
-            f.write(f"Underflow images: {underflow}\n")
-            f.write("\n")
+                f"Model path: {model_path} \n" +
+                f"Strategy: {strategy}, memory: {memory} \n" +
+                f"Portfolio: {portfolio} \n\n")
+
+        first_pass_results = {}
+
+        if image_parallel:
+
+            jobs = [((eps, i), targets[i], create_input_bounds(images[i], eps, nnet, conv),
+                     min(first_pass_timeout, timeout), memory)
+                    for eps in epsilons for i in range(len(images)) if predictions[i] == targets[i]]
+
+            benchmark_logger.info(f"Starting image-parallel first pass with {len(jobs)} instances")
+            start = time.time()
+            first_pass_results = _run_first_pass(model, jobs, max_procs, lp_backend, strategy)
+            num_decided = len([res for res in first_pass_results.values() if res[0] != Status.Undecided])
+
+            f.write(f"Image-parallel first pass decided {num_decided} of {len(jobs)} instances in "
+                    f"{time.time() - start:.2f} seconds \n\n")
+
+        # The workers are kept alive for all images and epsilons
+        with VeriNet(model,
+                     gradient_descent_max_iters=5,
+                     gradient_descent_step=1e-1,
+                     gradient_descent_min_loss_change=1e-2,
+                     max_procs=max_procs,
+                     lp_backend=lp_backend,
+                     falsification_budget=falsification_budget,
+                     strategy=strategy,
+                     portfolio=portfolio,
+                     pseudo_cost_path=pseudo_cost_path) as solver:
+
+            if solver.pseudo_costs is not None:
+                f.write(f"Pseudo-costs: {pseudo_cost_path}, {solver.pseudo_costs.num_observations} observations "
+                        f"loaded \n\n")
+
+            ladder_results = {}
+
+            if epsilon_ladder:
+
+                benchmark_logger.info(f"Starting epsilon ladder")
+                ladder_timeout = max(timeout - min(first_pass_timeout, timeout), 0) if image_parallel else timeout
+
+                for i in tqdm(range(len(images))):
+
+                    if predictions[i] != targets[i]:
+                        continue
+
+                    known_status = {eps: first_pass_results[(eps, i)][0] for eps in epsilons
+                                    if (eps, i) in first_pass_results}
+
+                    results = solver.verify_epsilon_ladder(
+                        lambda eps: LocalRobustnessObjective(int(targets[i]),
+                                                             create_input_bounds(images[i], eps, nnet, conv),
+                                                             output_size=10),
+                        epsilons,
+                        known_status=known_status,
+                        gradient_descent_intervals=5,
+                        timeout=ladder_timeout,
+                        verbose=False,
+                        memory=memory)
+
+                    for eps, result in results.items():
+                        ladder_results[(eps, i)] = result
+
+            for eps in epsilons:
+
+                safe = []
+                unsafe = []
+                undecided = []
+                underflow = []
+                skipped = []
+                falsified = []
+
+                benchmark_logger.info(f"Starting benchmarking with epsilon: {eps}")
+                f.write(f"Benchmarking with epsilon = {eps}: \n\n")
+                solver_time = 0
+                falsification_time = 0
+                portfolio_wins = {}
+
+                for i in tqdm(range(len(images))):
+                    # if i <= 86:
+                    #     continue
+                    data_i = images[i]
+                    # Test that the data point is classified correctly
+                    pred_i = predictions[i]
+                    if pred_i != targets[i]:
+                        f.write(f"Final result of input {i}: Skipped,correct_label: {targets[i]}, predicted: {pred_i}\n")
+                        continue
+
+                    input_bounds = create_input_bounds(data_i, eps, nnet, conv)
+
+                    # Use the result of the first pass if it decided the instance
+                    status, branches_explored, max_depth, time_spent = \
+                        first_pass_results.get((eps, i), (Status.Undecided, 0, 0, 0))
+                    implied_by = None
+                    falsification_stats = None
+                    portfolio_stats = None
+
+                    if status == Status.Undecided and epsilon_ladder:
+
+                        result = ladder_results[(eps, i)]
+                        status, implied_by = result["status"], result["implied_by"]
+                        falsification_stats = result["falsification_stats"]
+                        portfolio_stats = result["portfolio_stats"]
+                        branches_explored += result["branches_explored"]
+                        max_depth = max(max_depth, result["max_depth"])
+                        time_spent += result["time"]
+
+                    elif status == Status.Undecided:
+
+                        # Run verification
+                        start = time.time()
+                        objective = LocalRobustnessObjective(int(targets[i]), input_bounds, output_size=10)
+                        status = solver.verify(objective,
+                                               timeout=max(timeout - time_spent, 0),
+                                               no_split=False,
+                                               gradient_descent_intervals=5,
+                                               verbose=False,
+                                               memory=memory)
+
+                        branches_explored += solver.branches_explored
+                        max_depth = max(max_depth, solver.max_depth)
+                        time_spent += time.time() - start
+                        falsification_stats = solver.falsification_stats
+                        portfolio_stats = solver.portfolio_stats
+
+                    if falsification_stats is not None:
+                        falsification_time += falsification_stats["seconds"]
+                        if falsification_stats["resolved"]:
+                            falsified.append(i)
+
+                    if portfolio_stats is not None and portfolio_stats["winner"] is not None:
+                        portfolio_wins[portfolio_stats["winner"]] = portfolio_wins.get(portfolio_stats["winner"], 0) + 1
+
+                    if implied_by is not None:
+                        skipped.append(i)
+                        status_msg = f"{status} (skipped: implied by epsilon {implied_by})"
+                    else:
+                        status_msg = f"{status}"
+
+                    f.write(f"Final result of input {i}: {status_msg}, branches explored: {branches_explored}, "
+                            f"max depth: {max_depth}, time spent: {time_spent:.2f} seconds\n")
+                    solver_time += time_spent
+
+                    if status == Status.Safe:
+                        safe.append(i)
+                    elif status == Status.Unsafe:
+                        unsafe.append(i)
+                    elif status == Status.Undecided:
+                        undecided.append(i)
+                    elif status == Status.Underflow:
+                        benchmark_logger.warning(f"Underflow for image {i}")
+                        underflow.append(i)
+
+                f.write("\n")
+                f.write(f"Time spent in solver: {solver_time}\n")
+                f.write(f"Total number of images verified as safe: {len(safe)}\n")
+                f.write(f"Safe images: {safe}\n")
+                f.write(f"Total number of images verified as unsafe: {len(unsafe)}\n")
+                f.write(f"Unsafe images: {unsafe}\n")
+                f.write(f"Total number of images timed-out: {len(undecided)}\n")
+                f.write(f"Timed-out images: {undecided}\n")
+                f.write(f"Total number of images with underflow: {len(underflow)}\n")
+                f.write(f"Underflow images: {underflow}\n")
+                if epsilon_ladder:
+                    f.write(f"Total number of images skipped by the epsilon ladder: {len(skipped)}\n")
+                    f.write(f"Skipped images: {skipped}\n")
+                if falsification_budget > 0:
+                    f.write(f"Total number of images resolved by the falsification pre-pass: {len(falsified)}\n")
+                    f.write(f"Falsified images: {falsified}\n")
+                    f.write(f"Time spent in the falsification pre-pass: {falsification_time:.2f} seconds\n")
+                if portfolio is not None:
+                    f.write(f"Portfolio races won by each strategy: {portfolio_wins}\n")
+                f.write("\n")
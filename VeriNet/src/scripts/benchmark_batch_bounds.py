@@ -0,0 +1,133 @@
+"""
+Small script comparing separate and batched ESIP calculations of sibling branches.
+
+For each network the bounds of an MNIST image are calculated, the first unstable node of each non-linear layer is
+split and the two siblings are calculated with two calls to ESIP.calc_bounds() and with one call to
+ESIP.calc_bounds_batch(). The mean time of both and the largest difference in the output bounds are printed.
+"""
+
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from src.algorithm.esip import ESIP
+from src.data_loader.input_data_loader import load_mnist_human_readable
+from src.data_loader.nnet import NNET
+from src.neural_networks.verinet_nn import VeriNetNN
+from src.scripts.benchmark_util import create_input_bounds
+
+
+def sibling_forced_bounds(bounds: ESIP, layer: int) -> list:
+
+    """
+    Returns the forced input bounds of the two siblings created by splitting the first unstable node in the layer
+    at zero, or None if the layer has no unstable nodes.
+    """
+
+    concrete = bounds.bounds_concrete[layer - 1]
+    unstable = np.argwhere((concrete[:, 0] < 0) & (concrete[:, 1] > 0))[:, 0]
+    if unstable.shape[0] == 0:
+        return None
+
+    bounds.merge_current_bounds_into_forced()
+    forced_batch = [[None if arr is None else arr.copy() for arr in bounds.forced_input_bounds] for _ in range(2)]
+    forced_batch[0][layer - 1][unstable[0], 1] = 0
+    forced_batch[1][layer - 1][unstable[0], 0] = 0
+
+    return forced_batch
+
+
+def run_siblings(model: VeriNetNN, input_bounds: np.array, repeats: int) -> list:
+
+    """
+    Times the separate and batched calculations for a split in each non-linear layer.
+
+    Returns:
+        A list with (layer, separate time, batched time, max difference) for each split
+    """
+
+    bounds = ESIP(model, input_shape=input_bounds.shape[0])
+    bounds.calc_bounds(input_bounds)
+    results = []
+
+    for layer in range(1, bounds.num_layers):
+
+        if bounds.mappings[layer].is_linear:
+            continue
+
+        forced_batch = sibling_forced_bounds(bounds, layer)
+        if forced_batch is None:
+            continue
+        parent_forced = bounds.forced_input_bounds
+
+        start = time.time()
+        for _ in range(repeats):
+            separate = []
+            for forced_input_bounds in forced_batch:
+                bounds.save_snapshot("parent", bounds.num_layers)
+                bounds.forced_input_bounds = forced_input_bounds
+                bounds.calc_bounds(input_bounds, from_layer=layer)
+                separate.append(bounds.bounds_concrete[-1])
+                bounds.restore_snapshot("parent")
+        separate_time = (time.time() - start) / repeats
+
+        start = time.time()
+        for _ in range(repeats):
+            states = bounds.calc_bounds_batch(input_bounds, forced_batch, from_layer=layer)
+        batched_time = (time.time() - start) / repeats
+
+        max_diff = max(np.abs(output - state[0][-1]).max() for output, state in zip(separate, states)
+                       if state is not None)
+        results.append((layer, separate_time, batched_time, max_diff))
+
+        bounds.forced_input_bounds = parent_forced
+
+    return results
+
+
+def random_fc_model(num_hidden: int, hidden_size: int) -> VeriNetNN:
+
+    """
+    Creates a randomly initialised fully-connected ReLU network with 784 inputs and 10 outputs.
+    """
+
+    layers = [nn.Linear(784, hidden_size), nn.ReLU()]
+    for _ in range(num_hidden - 1):
+        layers += [nn.Linear(hidden_size, hidden_size), nn.ReLU()]
+    layers.append(nn.Linear(hidden_size, 10))
+
+    model = VeriNetNN(layers)
+    model.eval()
+
+    return model
+
+
+if __name__ == "__main__":
+
+    eps = 5
+    repeats = 20
+    img_dir: str = f"../../data/mnist_neurify/test_images_100/"
+
+    nnet = NNET("../../data/models_nnet/neurify/mnist24.nnet")
+    image = load_mnist_human_readable(img_dir, [0]).reshape(-1)
+
+    input_bounds = create_input_bounds(image, eps, nnet)
+
+    torch.manual_seed(0)
+    models = {}
+    for name in ["mnist24", "mnist50"]:
+        models[name] = NNET(f"../../data/models_nnet/neurify/{name}.nnet").from_nnet_to_verinet_nn()
+        models[name].eval()
+    models["random_fc_6x256"] = random_fc_model(6, 256)
+
+    for name, model in models.items():
+
+        run_siblings(model, input_bounds, 1)  # Warm up the jit compiled functions
+
+        print(f"{name}:")
+        for layer, separate_time, batched_time, max_diff in run_siblings(model, input_bounds, repeats):
+            print(f"    Split in layer {layer}: separate {1000 * separate_time:.2f} ms, "
+                  f"batched {1000 * batched_time:.2f} ms, speedup {separate_time / batched_time:.2f}, "
+                  f"max difference {max_diff:.2e}")
@@ -0,0 +1,70 @@
+"""
+Small script comparing the branch transports between the worker processes on the MNIST 24 network.
+
+The same images are verified with the "manager" and "shared_memory" transports and the total verification time,
+the number of transported branches, the bytes per branch and the branch throughput of the transport are printed.
+"""
+
+import numpy as np
+import torch
+
+from src.algorithm.verinet import VeriNet
+from src.data_loader.input_data_loader import load_mnist_human_readable
+from src.data_loader.nnet import NNET
+from src.scripts.benchmark_util import verify_images
+
+
+def run_transport(transport: str, model, nnet: NNET, images: np.array, targets: np.array, eps: float,
+                  timeout: int, max_procs: int) -> dict:
+
+    """
+    Verifies all images with the given transport and returns the accumulated transport statistics.
+    """
+
+    total = {"time": 0., "branches": 0, "bytes": 0, "encode_seconds": 0., "decode_seconds": 0.}
+
+    with VeriNet(model, max_procs=max_procs, branch_transport=transport) as solver:
+
+        for _, _, seconds in verify_images(solver, nnet, images, targets, eps, timeout, no_split=False,
+                                           gradient_descent_intervals=5):
+            total["time"] += seconds
+
+            stats = solver.branch_transport_stats
+            if stats is not None:
+                for key in ["branches", "bytes", "encode_seconds", "decode_seconds"]:
+                    total[key] += stats[key]
+
+    return total
+
+
+def print_results(transport: str, total: dict):
+
+    transport_time = total["encode_seconds"] + total["decode_seconds"]
+
+    print(f"{transport}:")
+    print(f"    Total verification time: {total['time']:.2f} seconds")
+    print(f"    Branches transported: {total['branches']}")
+    if total["branches"] > 0:
+        print(f"    Bytes per branch: {total['bytes'] / total['branches']:.0f}")
+        print(f"    Transport time per branch: {1e6 * transport_time / total['branches']:.1f} us")
+    if transport_time > 0:
+        print(f"    Branch throughput: {total['branches'] / transport_time:.0f} branches/second")
+
+
+if __name__ == "__main__":
+
+    eps = 5
+    timeout = 120
+    max_procs = None
+    num_images = 20
+    img_dir: str = f"../../data/mnist_neurify/test_images_100/"
+
+    nnet = NNET("../../data/models_nnet/neurify/mnist24.nnet")
+    model = nnet.from_nnet_to_verinet_nn()
+    model.eval()
+
+    images = load_mnist_human_readable(img_dir, list(range(num_images))).reshape(num_images, -1)
+    targets = model(torch.Tensor(nnet.normalize_input(images))).argmax(dim=1).numpy()
+
+    for transport in ["manager", "shared_memory"]:
+        print_results(transport, run_transport(transport, model, nnet, images, targets, eps, timeout, max_procs))
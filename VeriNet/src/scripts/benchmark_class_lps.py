@@ -0,0 +1,94 @@
+"""
+Small script comparing sequential and concurrent solving of the potential counter class LPs, see the lp_threads
+parameter of VeriNetWorker.
+
+The images with the most potential counter classes at the root branch are selected and verified in a single process
+with the LPs of a branch solved one after the other (lp_threads=1) and concurrently with 2 and 4 threads. For each
+configuration the number of LPs, the LP time per branch, the total time and the number of results differing from
+the sequential configuration are printed.
+"""
+
+import multiprocessing as mp
+
+import numpy as np
+import torch
+
+from src.algorithm.esip import ESIP
+from src.algorithm.verification_objectives import LocalRobustnessObjective
+from src.data_loader.input_data_loader import load_mnist_human_readable
+from src.data_loader.nnet import NNET
+from src.scripts.benchmark_util import create_input_bounds, verify_images_in_worker
+
+
+def select_images(model, nnet: NNET, images: np.array, targets: np.array, eps: float, num_selected: int) -> list:
+
+    """
+    Returns the indices of the images with the most potential counter classes after the first ESIP pass.
+    """
+
+    bounds = ESIP(model, input_shape=images.shape[1])
+    num_counters = []
+
+    for i in range(images.shape[0]):
+        objective = LocalRobustnessObjective(int(targets[i]), create_input_bounds(images[i], eps, nnet),
+                                             output_size=10)
+        bounds.calc_bounds(objective.input_bounds_flat)
+        num_counters.append(objective.potential_counter(bounds).sum())
+
+    return list(np.argsort(num_counters)[::-1][:num_selected])
+
+
+def run_config(lp_threads: int, model, nnet: NNET, images: np.array, targets: np.array, eps: float,
+               timeout: float) -> tuple:
+
+    """
+    Verifies all images with the given number of LP threads.
+
+    Returns:
+        (dictionary with the totals, list with the status of each image)
+    """
+
+    total = {"time": 0., "branches": 0, "solves": 0, "solve_seconds": 0.}
+    statuses = []
+
+    for _, status, seconds, solver in verify_images_in_worker(model, nnet, images, targets, eps, timeout,
+                                                              lp_threads=lp_threads):
+        total["time"] += seconds
+        total["branches"] += solver.branches_explored
+        total["solves"] += solver.lp_solver.stats["solves"]
+        total["solve_seconds"] += solver.lp_solver.stats["solve_seconds"]
+        statuses.append(status)
+
+    return total, statuses
+
+
+if __name__ == "__main__":
+
+    eps = 5
+    timeout = 60
+    num_images = 50
+    num_selected = 10
+    img_dir: str = f"../../data/mnist_neurify/test_images_100/"
+
+    images = load_mnist_human_readable(img_dir, list(range(num_images))).reshape(num_images, -1)
+    print(f"CPUs: {mp.cpu_count()}")
+
+    for name in ["mnist24", "mnist50"]:
+
+        nnet = NNET(f"../../data/models_nnet/neurify/{name}.nnet")
+        model = nnet.from_nnet_to_verinet_nn()
+        model.eval()
+        targets = model(torch.Tensor(nnet.normalize_input(images))).argmax(dim=1).numpy()
+
+        selected = select_images(model, nnet, images, targets, eps, num_selected)
+        print(f"{name}, images {selected}:")
+        results = {}
+
+        for lp_threads in [1, 2, 4]:
+            total, results[lp_threads] = run_config(lp_threads, model, nnet, images[selected], targets[selected],
+                                                    eps, timeout)
+            differing = sum(a != b for a, b in zip(results[lp_threads], results[1]))
+
+            print(f"    lp_threads={lp_threads}: LPs: {total['solves']}, branches: {total['branches']}, "
+                  f"{1000 * total['solve_seconds'] / max(total['branches'], 1):.2f} ms LP time per branch, "
+                  f"total time: {total['time']:.2f} seconds, differing results: {differing}")
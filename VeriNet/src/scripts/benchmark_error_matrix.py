@@ -0,0 +1,99 @@
+"""
+Small script comparing the dense and factored error matrix backends of ESIP.
+
+For each network the bounds are calculated for a number of MNIST images with both backends, and the total size of
+the error matrices and the mean time of ESIP.calc_bounds() are printed. Besides the MNIST 24 and 50 networks, two
+deeper randomly initialised fully-connected networks are used, since the error matrices grow with the depth.
+"""
+
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from src.algorithm.esip import ESIP
+from src.data_loader.input_data_loader import load_mnist_human_readable
+from src.data_loader.nnet import NNET
+from src.neural_networks.verinet_nn import VeriNetNN
+from src.scripts.benchmark_util import create_input_bounds
+
+
+def random_fc_model(num_hidden: int, hidden_size: int) -> VeriNetNN:
+
+    """
+    Creates a randomly initialised fully-connected ReLU network with 784 inputs and 10 outputs.
+    """
+
+    layers = [nn.Linear(784, hidden_size), nn.ReLU()]
+    for _ in range(num_hidden - 1):
+        layers += [nn.Linear(hidden_size, hidden_size), nn.ReLU()]
+    layers.append(nn.Linear(hidden_size, 10))
+
+    model = VeriNetNN(layers)
+    model.eval()
+
+    return model
+
+
+def run_backend(backend: str, model: VeriNetNN, input_bounds: list, repeats: int) -> tuple:
+
+    """
+    Calculates the bounds for all input bounds with the given backend.
+
+    Returns:
+        (mean calc_bounds time in seconds, mean size of the error matrices in bytes, list with the output bounds)
+    """
+
+    bounds = ESIP(model, input_shape=784, error_matrix_backend=backend)
+    total_time = 0
+    total_bytes = 0
+    output_bounds = []
+
+    bounds.calc_bounds(input_bounds[0])  # Warm up the jit compiled functions
+
+    for bounds_i in input_bounds:
+
+        start = time.time()
+        for _ in range(repeats):
+            bounds.calc_bounds(bounds_i)
+        total_time += (time.time() - start) / repeats
+
+        total_bytes += sum(matrix.nbytes for matrix in bounds.error_matrix if matrix is not None)
+        output_bounds.append(bounds.bounds_concrete[-1].copy())
+
+    return total_time / len(input_bounds), total_bytes / len(input_bounds), output_bounds
+
+
+if __name__ == "__main__":
+
+    eps = 5
+    repeats = 5
+    num_images = 10
+    img_dir: str = f"../../data/mnist_neurify/test_images_100/"
+
+    nnet = NNET("../../data/models_nnet/neurify/mnist24.nnet")
+    images = load_mnist_human_readable(img_dir, list(range(num_images))).reshape(num_images, -1)
+
+    input_bounds = [create_input_bounds(images[i], eps, nnet) for i in range(num_images)]
+
+    torch.manual_seed(0)
+    models = {}
+    for name in ["mnist24", "mnist50"]:
+        models[name] = NNET(f"../../data/models_nnet/neurify/{name}.nnet").from_nnet_to_verinet_nn()
+        models[name].eval()
+    models["random_fc_6x256"] = random_fc_model(6, 256)
+    models["random_fc_20x40"] = random_fc_model(20, 40)
+
+    for name, model in models.items():
+
+        dense_time, dense_bytes, dense_bounds = run_backend("dense", model, input_bounds, repeats)
+        factored_time, factored_bytes, factored_bounds = run_backend("factored", model, input_bounds, repeats)
+
+        max_diff = max(np.abs(dense - factored).max() for dense, factored in zip(dense_bounds, factored_bounds))
+
+        print(f"{name}:")
+        print(f"    Dense:    {1000 * dense_time:.2f} ms, error matrices: {dense_bytes / 1024:.1f} KiB")
+        print(f"    Factored: {1000 * factored_time:.2f} ms, error matrices: {factored_bytes / 1024:.1f} KiB")
+        print(f"    Speedup: {dense_time / factored_time:.2f}, memory ratio: {factored_bytes / dense_bytes:.2f}, "
+              f"max output bound difference: {max_diff:.2e}")
@@ -0,0 +1,79 @@
+"""
+Small script comparing the time to find a counter example with the depth-first, best-first and hybrid frontiers.
+
+All images are verified with each frontier in one worker process. For the images found Unsafe after branching by at
+least one frontier, the status, number of branches and time of each frontier are printed, followed by the number
+of counter examples found by each frontier and the mean time and branches to the counter example over the images
+found Unsafe by all frontiers. The Safe images are summarised by the total number of branches and the number of
+time-outs.
+"""
+
+import numpy as np
+import torch
+
+from src.algorithm.frontier import FRONTIERS
+from src.algorithm.verinet import VeriNet
+from src.algorithm.verinet_util import Status
+from src.data_loader.input_data_loader import load_mnist_human_readable
+from src.data_loader.nnet import NNET
+from src.scripts.benchmark_util import verify_images
+
+
+def run_frontier(frontier: str, model, nnet: NNET, images: np.array, targets: np.array, eps: float,
+                 timeout: float) -> list:
+
+    """
+    Verifies all images with the given frontier in one worker process.
+
+    Returns:
+        A list with (status, branches, seconds) for each image
+    """
+
+    results = []
+
+    with VeriNet(model, max_procs=1, frontier=frontier) as solver:
+        for _, status, seconds in verify_images(solver, nnet, images, targets, eps, timeout):
+            results.append((status, solver.branches_explored, seconds))
+
+    return results
+
+
+if __name__ == "__main__":
+
+    timeout = 60
+    num_images = 30
+    img_dir: str = f"../../data/mnist_neurify/test_images_100/"
+
+    images = load_mnist_human_readable(img_dir, list(range(num_images))).reshape(num_images, -1)
+
+    for name, eps in [("mnist24", 14), ("mnist50", 7), ("mnist50", 10)]:
+
+        nnet = NNET(f"../../data/models_nnet/neurify/{name}.nnet")
+        model = nnet.from_nnet_to_verinet_nn()
+        model.eval()
+        targets = model(torch.Tensor(nnet.normalize_input(images))).argmax(dim=1).numpy()
+
+        results = {frontier: run_frontier(frontier, model, nnet, images, targets, eps, timeout)
+                   for frontier in FRONTIERS}
+
+        print(f"{name}, eps={eps}:")
+
+        unsafe = [i for i in range(num_images) if any(results[frontier][i][0] == Status.Unsafe and
+                                                      results[frontier][i][1] > 1 for frontier in FRONTIERS)]
+        for i in unsafe:
+            print(f"    image {i:>2}: " + ", ".join(f"{frontier} {status.name} {branches} branches {seconds:.2f} s"
+                                                   for frontier, (status, branches, seconds) in
+                                                   ((frontier, results[frontier][i]) for frontier in FRONTIERS)))
+
+        unsafe_by_all = [i for i in unsafe if all(results[frontier][i][0] == Status.Unsafe for frontier in FRONTIERS)]
+        for frontier in FRONTIERS:
+
+            num_unsafe = sum(results[frontier][i][0] == Status.Unsafe for i in unsafe)
+            mean_time = np.mean([results[frontier][i][2] for i in unsafe_by_all]) if unsafe_by_all else 0.
+            mean_branches = np.mean([results[frontier][i][1] for i in unsafe_by_all]) if unsafe_by_all else 0.
+            safe_branches = sum(branches for status, branches, _ in results[frontier] if status == Status.Safe)
+            timeouts = sum(status == Status.Undecided for status, _, _ in results[frontier])
+
+            print(f"    {frontier:>10}: counter examples: {num_unsafe}/{len(unsafe)}, mean time to counter example: "
+                  f"{mean_time:.2f} seconds, mean branches: {mean_branches:.1f}, branches of Safe images: "
+                  f"{safe_branches}, time-outs: {timeouts}")
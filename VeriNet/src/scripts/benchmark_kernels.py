@@ -0,0 +1,77 @@
+"""
+Micro-benchmark of the serial, parallel and vectorised ESIP kernels, see esip_util.set_kernel_mode().
+
+The concretisation is timed for the input sizes of MNIST (784) and CIFAR (3072) and the error summation for a range
+of error matrix widths, both for increasing layer sizes. For each size the fastest mode is printed, which shows
+where the parallel and vectorised kernels start to pay off on this machine.
+"""
+
+import time
+
+import numba
+import numpy as np
+
+from src.algorithm import esip_util
+
+
+def time_kernel(func, args: tuple, repeats: int) -> float:
+
+    """
+    Returns the mean time of func(*args) in seconds, after one call to compile the kernel.
+    """
+
+    func(*args)
+
+    start = time.time()
+    for _ in range(repeats):
+        func(*args)
+
+    return (time.time() - start) / repeats
+
+
+def benchmark(name: str, funcs: dict, shapes: list, create_args, repeats: int):
+
+    """
+    Times the kernels in funcs for all shapes and prints the results.
+    """
+
+    print(f"{name}:")
+
+    for shape in shapes:
+        args = create_args(shape)
+        times = {mode: time_kernel(func, args, repeats) for mode, func in funcs.items()}
+        fastest = min(times, key=times.get)
+
+        print(f"    {str(shape):>14}: " + ", ".join(f"{mode} {1e3 * t:.3f} ms" for mode, t in times.items()) +
+              f", fastest: {fastest}")
+
+
+if __name__ == "__main__":
+
+    repeats = 20
+    layer_sizes = [16, 64, 256, 1024, 4096]
+    np.random.seed(0)
+
+    print(f"Numba threads: {numba.get_num_threads()}")
+
+    def concretise_args(shape):
+        input_bounds = np.sort(np.random.randn(shape[1], 2), axis=1)
+        return input_bounds, np.random.randn(shape[0], shape[1] + 1).astype(np.float32)
+
+    def error_args(shape):
+        return np.random.randn(*shape).astype(np.float32),
+
+    concretise_funcs = {"serial": esip_util.concretise_symbolic_bounds_jit,
+                        "parallel": esip_util.concretise_symbolic_bounds_parallel_jit,
+                        "vectorised": esip_util.concretise_symbolic_bounds_vectorised}
+    error_funcs = {"serial": esip_util.sum_error_jit,
+                   "parallel": esip_util.sum_error_parallel_jit,
+                   "vectorised": esip_util.sum_error_vectorised}
+
+    for input_size in [784, 3072]:
+        benchmark(f"Concretisation, {input_size} inputs", concretise_funcs,
+                  [(size, input_size) for size in layer_sizes], concretise_args, repeats)
+
+    for num_errors in [100, 1000, 4000]:
+        benchmark(f"Error summation, {num_errors} error columns", error_funcs,
+                  [(size, num_errors) for size in layer_sizes], error_args, repeats)
@@ -0,0 +1,44 @@
+"""
+Small script showing the branch count vs time trade-off of the lookahead strategy, see Strategist.lookahead().
+
+The same images are verified in a single process with the default and best_by_layer strategies and with the
+lookahead strategy for several numbers of candidates. For each configuration the total number of branches, the
+total time and the number of time-outs are printed.
+"""
+
+import torch
+
+from src.algorithm import strategist
+from src.data_loader.input_data_loader import load_mnist_human_readable
+from src.data_loader.nnet import NNET
+from src.scripts.benchmark_strategy_bandit import run_config
+
+
+if __name__ == "__main__":
+
+    timeout = 60
+    num_images = 20
+    img_dir: str = f"../../data/mnist_neurify/test_images_100/"
+
+    images = load_mnist_human_readable(img_dir, list(range(num_images))).reshape(num_images, -1)
+
+    for name, eps in [("mnist24", 5), ("mnist24", 10), ("mnist50", 5)]:
+
+        nnet = NNET(f"../../data/models_nnet/neurify/{name}.nnet")
+        model = nnet.from_nnet_to_verinet_nn()
+        model.eval()
+        targets = model(torch.Tensor(nnet.normalize_input(images))).argmax(dim=1).numpy()
+
+        print(f"{name}, eps={eps}:")
+
+        for strategy, num_candidates in [("default", None), ("best_by_layer", None), ("lookahead", 2),
+                                         ("lookahead", 4), ("lookahead", 8)]:
+
+            if num_candidates is not None:
+                strategist.LOOKAHEAD_CANDIDATES = num_candidates
+
+            total, _ = run_config(strategy, model, nnet, images, targets, eps, timeout)
+            config = strategy if num_candidates is None else f"{strategy} (k={num_candidates})"
+
+            print(f"    {config:>17}: branches: {total['branches']}, total time: {total['time']:.2f} seconds, "
+                  f"time-outs: {total['timeouts']}")
@@ -0,0 +1,74 @@
+"""
+Small script comparing the per-branch LP latency of the LP backends on the MNIST networks.
+
+The same images are verified in a single process with the "gurobi" backend, with and without warm starting from the
+parent branch's basis, and the "scipy" backend. For each network and configuration the mean time per LP solve, the
+simplex iterations and LP time per branch, the total verification time and the number of branches are printed,
+together with the number of results that differ from the first configuration.
+"""
+
+import numpy as np
+import torch
+
+from src.algorithm.lp_backends import grb
+from src.data_loader.input_data_loader import load_mnist_human_readable
+from src.data_loader.nnet import NNET
+from src.scripts.benchmark_util import verify_images_in_worker
+
+
+def run_backend(backend: str, warm_start: bool, model, nnet: NNET, images: np.array, targets: np.array, eps: float,
+                timeout: float) -> tuple:
+
+    """
+    Verifies all images with the given LP backend.
+
+    Returns:
+        (dictionary with the totals, list with the status of each image)
+    """
+
+    total = {"time": 0., "branches": 0, "solves": 0, "iterations": 0, "solve_seconds": 0.}
+    statuses = []
+
+    for _, status, seconds, solver in verify_images_in_worker(model, nnet, images, targets, eps, timeout,
+                                                              lp_backend=backend, lp_warm_start=warm_start):
+        total["time"] += seconds
+        total["branches"] += solver.branches_explored
+        for key in ["solves", "iterations", "solve_seconds"]:
+            total[key] += solver.lp_solver.stats[key]
+        statuses.append(status)
+
+    return total, statuses
+
+
+if __name__ == "__main__":
+
+    eps = 5
+    timeout = 60
+    num_images = 20
+    img_dir: str = f"../../data/mnist_neurify/test_images_100/"
+    configs = {"gurobi": ("gurobi", False), "gurobi, warm start": ("gurobi", True), "scipy": ("scipy", False)}
+    if grb is None:
+        del configs["gurobi"], configs["gurobi, warm start"]
+
+    images = load_mnist_human_readable(img_dir, list(range(num_images))).reshape(num_images, -1)
+
+    for name in ["mnist24", "mnist50"]:
+
+        nnet = NNET(f"../../data/models_nnet/neurify/{name}.nnet")
+        model = nnet.from_nnet_to_verinet_nn()
+        model.eval()
+        targets = model(torch.Tensor(nnet.normalize_input(images))).argmax(dim=1).numpy()
+
+        print(f"{name}:")
+        results = {}
+
+        for config, (backend, warm_start) in configs.items():
+            total, results[config] = run_backend(backend, warm_start, model, nnet, images, targets, eps, timeout)
+            latency = 1000 * total["solve_seconds"] / max(total["solves"], 1)
+            branch_latency = 1000 * total["solve_seconds"] / max(total["branches"], 1)
+            branch_iterations = total["iterations"] / max(total["branches"], 1)
+            differing = sum(a != b for a, b in zip(results[config], results[list(configs)[0]]))
+
+            print(f"    {config}: {latency:.2f} ms per LP, {branch_latency:.2f} ms and {branch_iterations:.1f} "
+                  f"iterations per branch, solves: {total['solves']}, branches: {total['branches']}, "
+                  f"total time: {total['time']:.2f} seconds, differing results: {differing}")
@@ -0,0 +1,129 @@
+"""
+Micro-benchmark of the LPSolver work done when switching branches.
+
+For a branch of the given depth, the LP is set up the same way as in VeriNetWorker._switch_branch() and
+_verify_once(): the output bounds are set, the objective adjusts the correct class bound, the constraints of all
+splits are added, one potential counter constraint is added and the LP is solved. Afterwards all constraints are
+removed again. The mean time of the whole switch and the part spent outside the LP solve is printed.
+
+The 1024 network (mnist512.nnet, 2x512 ReLU) isn't included in the repository; if it is missing a randomly
+initialised network with the same architecture is used instead.
+"""
+
+import os
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from src.algorithm.esip import ESIP
+from src.algorithm.lp_solver import LPSolver
+from src.algorithm.verification_objectives import LocalRobustnessObjective
+from src.algorithm.verinet_util import Status, Branch
+from src.data_loader.input_data_loader import load_mnist_human_readable
+from src.data_loader.nnet import NNET
+from src.neural_networks.verinet_nn import VeriNetNN
+from src.scripts.benchmark_util import create_input_bounds
+
+
+def split_list_of_depth(bounds: ESIP, depth: int) -> list:
+
+    """
+    Returns a split list with the unstable nodes of all non-linear layers, split at zero, up to the given depth.
+    """
+
+    split_list = []
+    for layer in range(1, bounds.num_layers):
+        if bounds.mappings[layer].is_linear:
+            continue
+
+        concrete = bounds.bounds_concrete[layer - 1]
+        for node in np.argwhere((concrete[:, 0] < 0) & (concrete[:, 1] > 0))[:, 0]:
+            split_list.append({"layer": layer, "node": node, "split_x": 0, "upper": len(split_list) % 2 == 0})
+
+    return split_list[:depth]
+
+
+def time_branch_switch(bounds: ESIP, solver: LPSolver, objective: LocalRobustnessObjective, depth: int,
+                       repeats: int) -> tuple:
+
+    """
+    Returns the mean time of a branch switch and of the LP solve in it, in seconds.
+    """
+
+    split_list = split_list_of_depth(bounds, depth)
+    solver.reset_stats()
+
+    start = time.time()
+    for _ in range(repeats):
+        solver.set_variable_bounds(bounds, set_input=False)
+        objective.cleanup(solver)
+        objective.initial_settings(solver, bounds, [])
+
+        branch = Branch(len(split_list), None, split_list)
+        branch.add_all_constrains(bounds, solver, split_list)
+
+        objective.configure_next_potential_counter(solver, bounds)
+        solver.solve()
+        objective.finished_potential_counter(solver, Status.Undecided)
+
+        branch.remove_all_constrs_from_solver(solver)
+
+    total_time = (time.time() - start) / repeats
+
+    return total_time, solver.stats["solve_seconds"] / repeats
+
+
+def random_fc_model(num_hidden: int, hidden_size: int) -> VeriNetNN:
+
+    """
+    Creates a randomly initialised fully-connected ReLU network with 784 inputs and 10 outputs.
+    """
+
+    layers = [nn.Linear(784, hidden_size), nn.ReLU()]
+    for _ in range(num_hidden - 1):
+        layers += [nn.Linear(hidden_size, hidden_size), nn.ReLU()]
+    layers.append(nn.Linear(hidden_size, 10))
+
+    model = VeriNetNN(layers)
+    model.eval()
+
+    return model
+
+
+if __name__ == "__main__":
+
+    eps = 5
+    repeats = 50
+    depths = [1, 5, 10, 20]
+    img_dir: str = f"../../data/mnist_neurify/test_images_100/"
+    model_path = "../../data/models_nnet/neurify/mnist512.nnet"
+
+    nnet = NNET("../../data/models_nnet/neurify/mnist24.nnet")
+    image = load_mnist_human_readable(img_dir, [0]).reshape(-1)
+
+    input_bounds = create_input_bounds(image, eps, nnet)
+
+    torch.manual_seed(0)
+    if os.path.isfile(model_path):
+        name, model = "mnist1024", NNET(model_path).from_nnet_to_verinet_nn()
+        model.eval()
+    else:
+        name, model = "random_fc_2x512", random_fc_model(2, 512)
+
+    bounds = ESIP(model, input_shape=784)
+    bounds.calc_bounds(input_bounds)
+    target = int(bounds.bounds_concrete[-1][:, 1].argmax())
+
+    objective = LocalRobustnessObjective(target, input_bounds, output_size=10)
+    solver = LPSolver(784, 10)
+    solver.set_variable_bounds(bounds, set_input=True)
+
+    print(f"{name}:")
+    for depth in depths:
+        time_branch_switch(bounds, solver, objective, depth, 1)
+        total_time, solve_time = time_branch_switch(bounds, solver, objective, depth, repeats)
+
+        print(f"    Depth {depth:>2}: {1000 * total_time:.2f} ms per switch, "
+              f"{1000 * (total_time - solve_time):.2f} ms outside the solve")
@@ -0,0 +1,105 @@
+"""
+Small script showing the branch count vs time trade-off of the LP bound tightening, see the lp_tightening_k
+parameter of VeriNetWorker.
+
+The same images are verified in a single process for several values of lp_tightening_k. For each value the total
+number of branches, the number of LPs, the total time and the number of results differing from lp_tightening_k=0
+are printed.
+
+The images are then verified with two worker processes and both branch transports. The manager transport pickles
+the full forced bounds of donated branches, while the shared memory transport only sends the split list and the
+tightened bounds, so equal branch counts show that no tightening is lost when branches move between workers.
+"""
+
+import numpy as np
+import torch
+
+from src.algorithm.verinet import VeriNet
+from src.algorithm.verinet_util import Status
+from src.data_loader.input_data_loader import load_mnist_human_readable
+from src.data_loader.nnet import NNET
+from src.scripts.benchmark_util import verify_images, verify_images_in_worker
+
+
+def run_config(lp_tightening_k: int, model, nnet: NNET, images: np.array, targets: np.array, eps: float,
+               timeout: float) -> tuple:
+
+    """
+    Verifies all images with the given number of tightened nodes per branch.
+
+    Returns:
+        (dictionary with the totals, list with the status of each image)
+    """
+
+    total = {"time": 0., "branches": 0, "solves": 0, "timeouts": 0}
+    statuses = []
+
+    for _, status, seconds, solver in verify_images_in_worker(model, nnet, images, targets, eps, timeout,
+                                                              lp_tightening_k=lp_tightening_k):
+        total["time"] += seconds
+        total["branches"] += solver.branches_explored
+        total["solves"] += solver.lp_solver.stats["solves"]
+        total["timeouts"] += status == Status.Undecided
+        statuses.append(status)
+
+    return total, statuses
+
+
+def run_pool_config(lp_tightening_k: int, branch_transport: str, max_procs: int, model, nnet: NNET, images: np.array,
+                    targets: np.array, eps: float, timeout: float) -> dict:
+
+    """
+    Verifies all images with the worker processes of VeriNet.
+
+    Returns:
+        A dictionary with the total time, branches and time-outs
+    """
+
+    total = {"time": 0., "branches": 0, "timeouts": 0}
+
+    with VeriNet(model, max_procs=max_procs, lp_tightening_k=lp_tightening_k,
+                 branch_transport=branch_transport) as solver:
+
+        for _, status, seconds in verify_images(solver, nnet, images, targets, eps, timeout):
+            total["time"] += seconds
+            total["branches"] += solver.branches_explored
+            total["timeouts"] += status == Status.Undecided
+
+    return total
+
+
+if __name__ == "__main__":
+
+    eps = 5
+    timeout = 30
+    num_images = 10
+    img_dir: str = f"../../data/mnist_neurify/test_images_100/"
+
+    images = load_mnist_human_readable(img_dir, list(range(num_images))).reshape(num_images, -1)
+
+    for name in ["mnist24", "mnist50"]:
+
+        nnet = NNET(f"../../data/models_nnet/neurify/{name}.nnet")
+        model = nnet.from_nnet_to_verinet_nn()
+        model.eval()
+        targets = model(torch.Tensor(nnet.normalize_input(images))).argmax(dim=1).numpy()
+
+        print(f"{name}:")
+        results = {}
+
+        for lp_tightening_k in [0, 1, 3, 5, 10]:
+            total, results[lp_tightening_k] = run_config(lp_tightening_k, model, nnet, images, targets, eps, timeout)
+            differing = sum(a != b for a, b in zip(results[lp_tightening_k], results[0]))
+
+            print(f"    lp_tightening_k={lp_tightening_k:>2}: branches: {total['branches']}, LPs: {total['solves']}, "
+                  f"total time: {total['time']:.2f} seconds, time-outs: {total['timeouts']}, "
+                  f"differing results: {differing}")
+
+        for lp_tightening_k in [0, 5]:
+            for branch_transport in ["manager", "shared_memory"]:
+                total = run_pool_config(lp_tightening_k, branch_transport, 2, model, nnet, images, targets, eps,
+                                        timeout)
+
+                print(f"    2 processes, {branch_transport:>13} transport, lp_tightening_k={lp_tightening_k:>2}: "
+                      f"branches: {total['branches']}, total time: {total['time']:.2f} seconds, "
+                      f"time-outs: {total['timeouts']}")
@@ -0,0 +1,72 @@
+"""
+Small script comparing the single start gradient descent with the batched PGD attack in attacks.py, see the
+pgd_restarts and pgd_pre_filter parameters of VeriNetWorker.
+
+The same images are verified in a single process with gradient descent from the LP solution only, with the batched
+attack inside the branches and with the batched attack also used as pre-filter. For each configuration the number of
+unsafe results, the branches and time used for the unsafe results, the total time and the number of results
+differing from the first configuration are printed.
+"""
+
+import numpy as np
+import torch
+
+from src.algorithm.verinet_util import Status
+from src.data_loader.input_data_loader import load_mnist_human_readable
+from src.data_loader.nnet import NNET
+from src.scripts.benchmark_util import verify_images_in_worker
+
+
+def run_config(pgd_restarts: int, pgd_pre_filter: bool, model, nnet: NNET, images: np.array, targets: np.array,
+               eps: float, timeout: float) -> tuple:
+
+    """
+    Verifies all images with the given attack configuration.
+
+    Returns:
+        (dictionary with the totals, list with the status of each image)
+    """
+
+    total = {"time": 0., "unsafe": 0, "unsafe_branches": 0, "unsafe_time": 0.}
+    statuses = []
+
+    for _, status, seconds, solver in verify_images_in_worker(model, nnet, images, targets, eps, timeout,
+                                                              pgd_restarts=pgd_restarts,
+                                                              pgd_pre_filter=pgd_pre_filter):
+        total["time"] += seconds
+        if status == Status.Unsafe:
+            total["unsafe"] += 1
+            total["unsafe_branches"] += solver.branches_explored
+            total["unsafe_time"] += seconds
+        statuses.append(status)
+
+    return total, statuses
+
+
+if __name__ == "__main__":
+
+    timeout = 30
+    num_images = 20
+    img_dir: str = f"../../data/mnist_neurify/test_images_100/"
+    configs = {"gradient descent": (0, False), "batched PGD": (16, False), "batched PGD, pre-filter": (16, True)}
+
+    images = load_mnist_human_readable(img_dir, list(range(num_images))).reshape(num_images, -1)
+
+    nnet = NNET(f"../../data/models_nnet/neurify/mnist24.nnet")
+    model = nnet.from_nnet_to_verinet_nn()
+    model.eval()
+    targets = model(torch.Tensor(nnet.normalize_input(images))).argmax(dim=1).numpy()
+
+    for eps in [5, 10]:
+
+        print(f"mnist24, eps={eps}:")
+        results = {}
+
+        for config, (pgd_restarts, pgd_pre_filter) in configs.items():
+            total, results[config] = run_config(pgd_restarts, pgd_pre_filter, model, nnet, images, targets, eps,
+                                                timeout)
+            differing = sum(a != b for a, b in zip(results[config], results[list(configs)[0]]))
+
+            print(f"    {config}: unsafe: {total['unsafe']}, branches for unsafe: {total['unsafe_branches']}, "
+                  f"time for unsafe: {total['unsafe_time']:.2f} seconds, total time: {total['time']:.2f} seconds, "
+                  f"differing results: {differing}")
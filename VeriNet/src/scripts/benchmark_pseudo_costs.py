@@ -0,0 +1,70 @@
+"""
+Small script comparing the "pseudo_cost" branching strategy with the default and best_by_layer strategies.
+
+The pseudo_cost strategy is run twice on the same images: first cold, with no stored pseudo-costs, and then warm,
+with the pseudo-costs saved by the first run to a file specific to the model and epsilon. For each configuration the
+total number of branches, the total time and the number of time-outs are printed.
+"""
+
+import os
+import tempfile
+
+import numpy as np
+import torch
+
+from src.algorithm.verinet import VeriNet
+from src.algorithm.verinet_util import Status
+from src.data_loader.input_data_loader import load_mnist_human_readable
+from src.data_loader.nnet import NNET
+from src.scripts.benchmark_util import verify_images
+
+
+def run_config(strategy: str, pseudo_cost_path: str, model, nnet: NNET, images: np.array, targets: np.array,
+               eps: float, timeout: float) -> dict:
+
+    """
+    Verifies all images with the given strategy in one worker process.
+
+    Returns:
+        A dictionary with the totals
+    """
+
+    total = {"time": 0., "branches": 0, "timeouts": 0}
+
+    with VeriNet(model, max_procs=1, strategy=strategy, pseudo_cost_path=pseudo_cost_path) as solver:
+
+        for _, status, seconds in verify_images(solver, nnet, images, targets, eps, timeout):
+            total["time"] += seconds
+            total["branches"] += solver.branches_explored
+            total["timeouts"] += status == Status.Undecided
+
+    return total
+
+
+if __name__ == "__main__":
+
+    timeout = 60
+    num_images = 20
+    img_dir: str = f"../../data/mnist_neurify/test_images_100/"
+
+    images = load_mnist_human_readable(img_dir, list(range(num_images))).reshape(num_images, -1)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+
+        for name, eps in [("mnist24", 5), ("mnist24", 10), ("mnist50", 5)]:
+
+            nnet = NNET(f"../../data/models_nnet/neurify/{name}.nnet")
+            model = nnet.from_nnet_to_verinet_nn()
+            model.eval()
+            targets = model(torch.Tensor(nnet.normalize_input(images))).argmax(dim=1).numpy()
+
+            pseudo_cost_path = os.path.join(tmp_dir, f"{name}_eps_{eps}_pseudo_costs.npy")
+            print(f"{name}, eps={eps}:")
+
+            for config, strategy in [("default", "default"), ("best_by_layer", "best_by_layer"),
+                                     ("pseudo_cost (cold)", "pseudo_cost"), ("pseudo_cost (warm)", "pseudo_cost")]:
+
+                total = run_config(strategy, pseudo_cost_path, model, nnet, images, targets, eps, timeout)
+
+                print(f"    {config:>18}: branches: {total['branches']}, total time: {total['time']:.2f} seconds, "
+                      f"time-outs: {total['timeouts']}")
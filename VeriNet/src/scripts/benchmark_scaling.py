@@ -0,0 +1,70 @@
+"""
+Small script measuring how the work donation scheduler scales with the number of worker processes on the MNIST 24
+network.
+
+The same images are verified with 1, 2, 4, 8 and 16 workers. For each number of workers the total time, the speedup
+relative to one worker and the idle time of each worker (time spent waiting for branches) is printed.
+"""
+
+import numpy as np
+import torch
+
+from src.algorithm.verinet import VeriNet
+from src.data_loader.input_data_loader import load_mnist_human_readable
+from src.data_loader.nnet import NNET
+from src.scripts.benchmark_util import verify_images
+
+
+def run_scaling(model, nnet: NNET, images: np.array, targets: np.array, eps: float, timeout: int,
+                max_procs: int) -> tuple:
+
+    """
+    Verifies all images with the given number of workers.
+
+    Returns:
+        (total time, total branches explored, array with the total idle time of each worker)
+    """
+
+    total_time = 0
+    total_branches = 0
+    idle_times = np.zeros(max_procs)
+
+    with VeriNet(model, max_procs=max_procs) as solver:
+
+        for _, _, seconds in verify_images(solver, nnet, images, targets, eps, timeout, no_split=False,
+                                           gradient_descent_intervals=5):
+            total_time += seconds
+            total_branches += solver.branches_explored
+
+            if solver.worker_idle_times is not None:
+                idle_times += np.array(solver.worker_idle_times)
+
+    return total_time, total_branches, idle_times
+
+
+if __name__ == "__main__":
+
+    eps = 5
+    timeout = 600
+    num_images = 20
+    procs = [1, 2, 4, 8, 16]
+    img_dir: str = f"../../data/mnist_neurify/test_images_100/"
+
+    nnet = NNET("../../data/models_nnet/neurify/mnist24.nnet")
+    model = nnet.from_nnet_to_verinet_nn()
+    model.eval()
+
+    images = load_mnist_human_readable(img_dir, list(range(num_images))).reshape(num_images, -1)
+    targets = model(torch.Tensor(nnet.normalize_input(images))).argmax(dim=1).numpy()
+
+    base_time = None
+
+    for max_procs in procs:
+
+        total_time, total_branches, idle_times = run_scaling(model, nnet, images, targets, eps, timeout, max_procs)
+        base_time = total_time if base_time is None else base_time
+
+        print(f"Workers: {max_procs}, time: {total_time:.2f} seconds, speedup: {base_time / total_time:.2f}, "
+              f"branches explored: {total_branches}")
+        print(f"    Idle time per worker: " + ", ".join(f"{idle:.2f}" for idle in idle_times) + " seconds")
+        print(f"    Mean idle fraction: {idle_times.mean() / total_time:.2f}")
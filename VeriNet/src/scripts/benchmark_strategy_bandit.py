@@ -0,0 +1,64 @@
+"""
+Small script comparing the "bandit" branching strategy with the strategies it selects from, see strategy_bandit.py.
+
+The same images are verified in a single process with each strategy. The worker, and thereby the statistics of the
+bandit, is kept for all images. For each strategy the total number of branches, the total time and the number of
+time-outs are printed, followed by the final statistics of the bandit.
+"""
+
+import numpy as np
+import torch
+
+from src.algorithm.strategist import BANDIT_ARMS, BANDIT_STRATEGY
+from src.algorithm.verinet_util import Status
+from src.data_loader.input_data_loader import load_mnist_human_readable
+from src.data_loader.nnet import NNET
+from src.scripts.benchmark_util import verify_images_in_worker
+
+
+def run_config(strategy: str, model, nnet: NNET, images: np.array, targets: np.array, eps: float,
+               timeout: float) -> tuple:
+
+    """
+    Verifies all images with the given strategy.
+
+    Returns:
+        (dictionary with the totals, the VeriNetWorker)
+    """
+
+    total = {"time": 0., "branches": 0, "timeouts": 0}
+    solver = None
+
+    for _, status, seconds, solver in verify_images_in_worker(model, nnet, images, targets, eps, timeout,
+                                                              strategy=strategy):
+        total["time"] += seconds
+        total["branches"] += solver.branches_explored
+        total["timeouts"] += status == Status.Undecided
+
+    return total, solver
+
+
+if __name__ == "__main__":
+
+    timeout = 60
+    num_images = 20
+    img_dir: str = f"../../data/mnist_neurify/test_images_100/"
+
+    images = load_mnist_human_readable(img_dir, list(range(num_images))).reshape(num_images, -1)
+
+    for name, eps in [("mnist24", 5), ("mnist24", 10), ("mnist50", 5)]:
+
+        nnet = NNET(f"../../data/models_nnet/neurify/{name}.nnet")
+        model = nnet.from_nnet_to_verinet_nn()
+        model.eval()
+        targets = model(torch.Tensor(nnet.normalize_input(images))).argmax(dim=1).numpy()
+
+        print(f"{name}, eps={eps}:")
+
+        for strategy in [*BANDIT_ARMS, BANDIT_STRATEGY]:
+            total, solver = run_config(strategy, model, nnet, images, targets, eps, timeout)
+
+            print(f"    {strategy:>13}: branches: {total['branches']}, total time: {total['time']:.2f} seconds, "
+                  f"time-outs: {total['timeouts']}")
+
+        print(f"    bandit statistics: {solver.bandit.stats}")
@@ -0,0 +1,128 @@
+"""
+Util functions shared by the benchmark scripts
+"""
+
+import threading
+import time
+
+import numpy as np
+
+from src.algorithm.splitmans import Splitmans
+from src.algorithm.verinet import VeriNet
+from src.algorithm.verinet_util import Status, Branch
+from src.algorithm.verinet_worker import VeriNetWorker
+from src.algorithm.verification_objectives import LocalRobustnessObjective
+from src.data_loader.nnet import NNET
+
+
+def create_input_bounds(data_i: np.array, eps: float, nnet: NNET, conv: bool = False) -> np.array:
+
+    """
+    Creates the normalized input bounds for an epsilon-ball around the image.
+
+    Args:
+        data_i  : The image
+        eps     : The epsilon (maximum pixel change)
+        nnet    : The NNET object used for normalization
+        conv    : Has to be true if the image is used with a convolutional network
+    Returns:
+        The input bounds
+    """
+
+    if conv:
+        input_bounds = np.zeros((*data_i.shape, 2), dtype=np.float32)
+        input_bounds[:, :, :, 0] = data_i - eps
+        input_bounds[:, :, :, 1] = data_i + eps
+
+        input_bounds[:, :, :, 0] = nnet.normalize_input(input_bounds[:, :, :, 0].reshape(-1)).\
+            reshape(*data_i.shape)
+        input_bounds[:, :, :, 1] = nnet.normalize_input(input_bounds[:, :, :, 1].reshape(-1)). \
+            reshape(*data_i.shape)
+    else:
+        input_bounds = np.zeros((data_i.shape[0], 2), dtype=np.float32)
+        input_bounds[:, 0] = data_i - eps
+        input_bounds[:, 1] = data_i + eps
+
+        input_bounds = nnet.normalize_input(input_bounds)
+
+    return input_bounds
+
+
+def verify_images(solver: VeriNet, nnet: NNET, images: np.array, targets: np.array, eps: float, timeout: float,
+                  **verify_kwargs):
+
+    """
+    Verifies the local robustness of each image with the given solver.
+
+    Use the solver as a context manager to keep the worker processes alive for all images.
+
+    Args:
+        solver          : The VeriNet solver
+        nnet            : The NNET object used for normalization
+        images          : The flattened images
+        targets         : The target class of each image
+        eps             : The epsilon (maximum pixel change)
+        timeout         : The timeout of each image in seconds
+        verify_kwargs   : Further arguments to VeriNet.verify()
+    Yields:
+        (image index, status, seconds) after each image, the statistics of the verification, such as
+        solver.branches_explored, can be read before the next image is verified.
+    """
+
+    for i in range(images.shape[0]):
+
+        objective = LocalRobustnessObjective(int(targets[i]), create_input_bounds(images[i], eps, nnet),
+                                             output_size=10)
+
+        start = time.time()
+        status = solver.verify(objective, timeout=timeout, verbose=False, **verify_kwargs)
+
+        yield i, status, time.time() - start
+
+
+def verify_images_in_worker(model, nnet: NNET, images: np.array, targets: np.array, eps: float, timeout: float,
+                            **worker_kwargs):
+
+    """
+    Verifies the local robustness of each image with one VeriNetWorker in this process, kept for all images.
+
+    The LP solver statistics of the worker are reset before each image.
+
+    Args:
+        model           : The VeriNetNN model
+        nnet            : The NNET object used for normalization
+        images          : The flattened images
+        targets         : The target class of each image
+        eps             : The epsilon (maximum pixel change)
+        timeout         : The timeout of each image in seconds
+        worker_kwargs   : Further arguments to VeriNetWorker()
+    Yields:
+        (image index, status, seconds, worker) after each image, where status is Status.Undecided on time-outs.
+    """
+
+    worker = None
+
+    for i in range(images.shape[0]):
+
+        objective = LocalRobustnessObjective(int(targets[i]), create_input_bounds(images[i], eps, nnet),
+                                             output_size=10)
+
+        if worker is None:
+            worker = VeriNetWorker(model, objective, gradient_descent_intervals=5, verbose=False, **worker_kwargs)
+        else:
+            worker.set_verification_objective(objective, gradient_descent_intervals=5, verbose=False)
+        if worker.lp_solver is not None:
+            worker.lp_solver.reset_stats()
+
+        timeout_flag = threading.Event()
+        timer = threading.Timer(timeout, timeout_flag.set)
+        timer.start()
+
+        start = time.time()
+        try:
+            status = worker.verify(Branch(0, None, [], Splitmans(start_index=0, memory_size=1, layer=0)),
+                                   timeout_flag, None, None, queue_depth=-1)
+        finally:
+            timer.cancel()
+
+        yield i, Status.Undecided if status is None else status, time.time() - start, worker
@@ -0,0 +1,89 @@
+"""
+Micro-benchmark of the fused weighted error kernel, esip_util.weighted_error_top_k_jit(), used by the branching
+strategies.
+
+The kernel is compared with the previous numpy implementation, which copied the error matrix twice, clamped the
+signs, multiplied with the output weights, summed and sorted all columns to take the top k. The error matrices are
+the final error matrices of the first branch of the mnist networks for increasing epsilons, where the number of
+columns is the number of unstable nodes, and random matrices with as many columns as larger networks produce.
+"""
+
+import timeit
+
+import numpy as np
+
+from src.algorithm.esip import ESIP
+from src.algorithm.esip_util import weighted_error_top_k_jit
+from src.data_loader.input_data_loader import load_mnist_human_readable
+from src.data_loader.nnet import NNET
+from src.scripts.benchmark_util import create_input_bounds
+
+
+def weighted_error_top_k_numpy(error_matrix: np.array, output_weights: np.array, k: int) -> tuple:
+
+    """
+    The previous implementation of the weighted errors, see weighted_error_top_k_jit().
+    """
+
+    err_matrix_neg = error_matrix.copy()
+    err_matrix_neg[err_matrix_neg > 0] = 0
+    err_matrix_pos = error_matrix.copy()
+    err_matrix_pos[err_matrix_pos < 0] = 0
+
+    err_matrix_neg = - err_matrix_neg * output_weights[:, 0:1]
+    err_matrix_pos = err_matrix_pos * output_weights[:, 1:2]
+
+    weighted_error = (err_matrix_neg + err_matrix_pos).sum(axis=0)
+
+    return weighted_error, weighted_error.argsort()[-k:][::-1]
+
+
+def network_error_matrices(eps_list: list) -> list:
+
+    """
+    Returns (name, error matrix) for the final error matrix of the first branch of each network and epsilon.
+    """
+
+    image = load_mnist_human_readable("../../data/mnist_neurify/test_images_100/", [0]).reshape(1, -1)[0]
+    error_matrices = []
+
+    for name in ["mnist24", "mnist50"]:
+
+        nnet = NNET(f"../../data/models_nnet/neurify/{name}.nnet")
+        model = nnet.from_nnet_to_verinet_nn()
+        model.eval()
+
+        for eps in eps_list:
+            bounds = ESIP(model, input_shape=image.shape[0])
+            bounds.calc_bounds(create_input_bounds(image, eps, nnet))
+            error_matrices.append((f"{name}, eps={eps}", bounds.error_matrix[-1]))
+
+    return error_matrices
+
+
+if __name__ == "__main__":
+
+    number = 2000
+
+    error_matrices = network_error_matrices([5, 15, 30])
+    random_state = np.random.RandomState(0)
+    for num_cols in [1000, 10000]:
+        error_matrices.append(("random", random_state.randn(10, num_cols).astype(np.float32)))
+
+    output_weights = np.random.RandomState(1).rand(10, 2)
+
+    for name, error_matrix in error_matrices:
+        for k in [1, 10]:
+
+            # Compile and check the results
+            weighted_error, top_k = weighted_error_top_k_jit(error_matrix, output_weights, k)
+            expected, _ = weighted_error_top_k_numpy(error_matrix, output_weights, k)
+            assert np.allclose(weighted_error, expected, rtol=1e-4, atol=1e-6)
+
+            time_numpy = timeit.timeit(lambda: weighted_error_top_k_numpy(error_matrix, output_weights, k),
+                                       number=number) / number
+            time_kernel = timeit.timeit(lambda: weighted_error_top_k_jit(error_matrix, output_weights, k),
+                                        number=number) / number
+
+            print(f"{name:>16}, shape {str(error_matrix.shape):>11}, k={k:>2}: numpy {time_numpy * 1e6:8.1f} us, "
+                  f"kernel {time_kernel * 1e6:8.1f} us, speed-up {time_numpy / time_kernel:5.1f}x")
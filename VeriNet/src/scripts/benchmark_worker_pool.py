@@ -0,0 +1,75 @@
+"""
+Small script for measuring the per-image overhead of starting the worker processes on the MNIST 48 network.
+
+The same images are verified twice, first with new worker processes started for each call to verify() and then
+with a persistent worker pool kept alive by VeriNet.start()/ close().
+"""
+
+import numpy as np
+import torch
+
+from src.algorithm.verinet import VeriNet
+from src.data_loader.input_data_loader import load_mnist_human_readable
+from src.data_loader.nnet import NNET
+from src.scripts.benchmark_util import verify_images
+
+
+def run_images(solver: VeriNet, nnet: NNET, images: np.array, targets: np.array, eps: float, timeout: int) -> list:
+
+    """
+    Verifies all images and returns a list with (time, branches explored) for each image.
+    """
+
+    results = []
+
+    for _, _, seconds in verify_images(solver, nnet, images, targets, eps, timeout, no_split=False,
+                                       gradient_descent_intervals=5):
+        results.append((seconds, solver.branches_explored))
+
+    return results
+
+
+def print_results(name: str, results: list):
+
+    """
+    Prints the mean time per image, separating images solved by the one-shot approximation from images that
+    needed the workers.
+    """
+
+    times = np.array([result[0] for result in results])
+    branched = np.array([result[1] > 1 for result in results])
+
+    print(f"{name}:")
+    print(f"    Total time: {times.sum():.2f} seconds")
+    print(f"    Mean time per image: {times.mean():.3f} seconds")
+    if branched.sum() > 0:
+        print(f"    Mean time per image using workers ({branched.sum()} images): {times[branched].mean():.3f} seconds")
+
+
+if __name__ == "__main__":
+
+    eps = 5
+    timeout = 120
+    max_procs = None
+    num_images = 20
+    img_dir: str = f"../../data/mnist_neurify/test_images_100/"
+
+    nnet = NNET("../../data/models_nnet/neurify/mnist24.nnet")
+    model = nnet.from_nnet_to_verinet_nn()
+    model.eval()
+
+    images = load_mnist_human_readable(img_dir, list(range(num_images))).reshape(num_images, -1)
+    targets = model(torch.Tensor(nnet.normalize_input(images))).argmax(dim=1).numpy()
+
+    solver = VeriNet(model, max_procs=max_procs)
+    transient_results = run_images(solver, nnet, images, targets, eps, timeout)
+
+    with VeriNet(model, max_procs=max_procs) as solver:
+        persistent_results = run_images(solver, nnet, images, targets, eps, timeout)
+
+    print_results("Workers started for each image", transient_results)
+    print_results("Persistent workers", persistent_results)
+
+    overhead = (np.array([result[0] for result in transient_results]) -
+                np.array([result[0] for result in persistent_results]))
+    print(f"Mean per-image overhead removed: {overhead.mean():.3f} seconds")
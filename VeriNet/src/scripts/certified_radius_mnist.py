@@ -0,0 +1,57 @@
+"""
+Small script computing the certified radius of MNIST images for the MNIST 24 network.
+
+The largest epsilon each image is verified robust to is found by bisection with VeriNet.certified_radii(), which
+keeps the worker processes alive for all images.
+"""
+
+import time
+
+import numpy as np
+import torch
+
+from src.algorithm.verinet import VeriNet
+from src.algorithm.verification_objectives import LocalRobustnessObjective
+from src.data_loader.input_data_loader import load_mnist_human_readable
+from src.data_loader.nnet import NNET
+from src.scripts.benchmark_util import create_input_bounds
+
+
+def create_objective_function(nnet: NNET, image: np.array, target: int):
+
+    """
+    Returns a function creating the LocalRobustnessObjective of the image for an epsilon.
+    """
+
+    def create_objective(eps: float) -> LocalRobustnessObjective:
+        return LocalRobustnessObjective(target, create_input_bounds(image, eps, nnet), output_size=10)
+
+    return create_objective
+
+
+if __name__ == "__main__":
+
+    max_epsilon = 15
+    tolerance = 0.1
+    time_budget = 120
+    max_procs = None
+    num_images = 20
+    img_dir: str = f"../../data/mnist_neurify/test_images_100/"
+
+    nnet = NNET("../../data/models_nnet/neurify/mnist24.nnet")
+    model = nnet.from_nnet_to_verinet_nn()
+    model.eval()
+
+    images = load_mnist_human_readable(img_dir, list(range(num_images))).reshape(num_images, -1)
+    targets = model(torch.Tensor(nnet.normalize_input(images))).argmax(dim=1).numpy()
+
+    create_objectives = [create_objective_function(nnet, images[i], int(targets[i])) for i in range(num_images)]
+
+    start = time.time()
+    solver = VeriNet(model, max_procs=max_procs)
+    radii = solver.certified_radii(create_objectives, max_epsilon, tolerance=tolerance, time_budget=time_budget)
+
+    for i, (certified_lower, attack_upper) in enumerate(radii):
+        print(f"Image {i}: certified radius: {certified_lower:.3f}, attack upper bound: {attack_upper:.3f}")
+
+    print(f"Total time: {time.time() - start:.2f} seconds")
@@ -0,0 +1,102 @@
+"""
+Unit-tests for the batched PGD attack
+"""
+
+import time
+import unittest
+import warnings
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from src.algorithm.attacks import PGDAttack
+from src.algorithm.verification_objectives import LocalRobustnessObjective
+from src.neural_networks.verinet_nn import VeriNetNN
+
+
+class TestPGDAttack(unittest.TestCase):
+
+    def setUp(self):
+
+        warnings.filterwarnings("ignore", message="numpy.ufunc size changed")
+
+        # Class 1 is larger than class 0 iff x[0] - x[1] > 0.5
+        linear = nn.Linear(2, 2)
+        with torch.no_grad():
+            linear.weight[:] = torch.Tensor([[0, 0], [1, -1]])
+            linear.bias[:] = torch.Tensor([0, -0.5])
+
+        self.model = VeriNetNN([linear])
+        self.model.eval()
+
+    def test_counter_example(self):
+
+        """
+        Tests that a counter example is found in a corner of the input bounds and used as start point later.
+        """
+
+        input_bounds = np.array([[0, 1], [0, 1]], dtype=np.float32)
+        objective = LocalRobustnessObjective(0, input_bounds, output_size=2)
+        attack = PGDAttack(self.model, num_restarts=1, max_iters=10, step_size=0.2)
+
+        counter_example = attack.run(objective)
+
+        self.assertIsNotNone(counter_example)
+        self.assertEqual(counter_example.shape, (1, 2))
+        self.assertTrue(((counter_example >= 0) & (counter_example <= 1)).all())
+        self.assertGreater(counter_example[0, 0] - counter_example[0, 1], 0.5)
+
+        # The remembered counter example is found without any gradient steps
+        attack = PGDAttack(self.model, num_restarts=0, max_iters=0)
+        attack.remember(counter_example)
+        self.assertIsNotNone(attack.run(objective))
+
+    def test_safe(self):
+
+        """
+        Tests that no counter example is returned and that all restarts are run in one batch per iteration.
+        """
+
+        input_bounds = np.array([[0, 0.4], [0, 1]], dtype=np.float32)
+        objective = LocalRobustnessObjective(0, input_bounds, output_size=2)
+        attack = PGDAttack(self.model, num_restarts=8, max_iters=5)
+
+        self.assertIsNone(attack.run(objective, starts=[np.array([0.4, 0.])]))
+        self.assertEqual(attack.forward_passes, 6)
+
+    def test_falsify(self):
+
+        """
+        Tests that random sampling finds a counter example and that falsify() keeps to the time budget.
+        """
+
+        objective = LocalRobustnessObjective(0, np.array([[0, 1], [0, 1]], dtype=np.float32), output_size=2)
+        attack = PGDAttack(self.model, num_restarts=0, max_iters=0)
+        counter_example = attack.sample(objective, 64)
+
+        self.assertIsNotNone(counter_example)
+        self.assertGreater(counter_example[0, 0] - counter_example[0, 1], 0.5)
+
+        objective = LocalRobustnessObjective(0, np.array([[0, 0.4], [0, 1]], dtype=np.float32), output_size=2)
+        attack = PGDAttack(self.model, num_restarts=4, max_iters=5)
+
+        start = time.time()
+        self.assertIsNone(attack.falsify(objective, time_budget=0.2, num_samples=64))
+        self.assertLess(time.time() - start, 1)
+        self.assertGreater(attack.forward_passes, 1)
+
+    def test_batched_objective(self):
+
+        """
+        Tests that the batched counter example check agrees with is_counter_example().
+        """
+
+        objective = LocalRobustnessObjective(1, np.zeros((3, 2), dtype=np.float32), output_size=3)
+        y = np.random.RandomState(0).randn(20, 3)
+
+        expected = [objective.is_counter_example(y[i:i+1]) for i in range(20)]
+        self.assertEqual(list(objective.counter_examples(y)), expected)
+
+        losses = objective.attack_losses(torch.Tensor(y))
+        self.assertTrue(np.allclose(losses.numpy(), y[:, 1] - y[:, [0, 2]].max(axis=1), atol=1e-6))
@@ -0,0 +1,94 @@
+"""
+Unit-tests for the branch transports
+"""
+
+import unittest
+import warnings
+
+import numpy as np
+
+from src.neural_networks.simple_nn import SimpleNN
+from src.algorithm.esip import ESIP
+from src.algorithm.splitmans import Splitmans
+from src.algorithm.verinet_util import Branch
+from src.algorithm.branch_transport import encode_branch, decode_branch
+
+
+class TestBranchTransport(unittest.TestCase):
+
+    def setUp(self):
+
+        warnings.filterwarnings("ignore", message="numpy.ufunc size changed")
+
+        self.split_list = [{"layer": 2, "node": 1, "split_x": 0.0, "upper": True},
+                           {"layer": 4, "node": 0, "split_x": -0.5, "upper": False}]
+
+    def test_encode_decode(self):
+
+        """
+        Tests that the split list, depth, priority, tightened bounds, safe classes and strategy state survive encoding.
+        """
+
+        splitmans = Splitmans(start_index=3, memory_size=5, memory=np.array([[1, 2], [3, 4]]), layer=1)
+        branch = Branch(2, None, self.split_list, splitmans)
+        branch.safe_classes = [0, 7]
+        branch.priority = -0.25
+        branch.tightened_bounds = [(2, 0, -1.5, 0.25), (4, 1, 0.5, 2.)]
+
+        decoded = decode_branch(encode_branch(branch))
+
+        self.assertEqual(decoded.depth, 2)
+        self.assertEqual(decoded.priority, -0.25)
+        self.assertEqual(decoded.tightened_bounds, [(2, 0, -1.5, 0.25), (4, 1, 0.5, 2.)])
+        self.assertEqual(decoded.split_list, self.split_list)
+        self.assertEqual(decoded.safe_classes, [0, 7])
+        self.assertIsNone(decoded.forced_input_bounds)
+        self.assertEqual(decoded.splitmans.index, 3)
+        self.assertEqual(decoded.splitmans.memory_size, 5)
+        self.assertEqual(decoded.splitmans.layer, 1)
+        self.assertTrue((decoded.splitmans.memory == np.array([[1, 2], [3, 4]])).all())
+
+    def test_encode_decode_empty(self):
+
+        """
+        Tests encoding of the root branch without strategy state.
+        """
+
+        decoded = decode_branch(encode_branch(Branch(0, None, [], None)))
+
+        self.assertEqual(decoded.depth, 0)
+        self.assertEqual(decoded.split_list, [])
+        self.assertEqual(decoded.safe_classes, [])
+        self.assertIsNone(decoded.priority)
+        self.assertEqual(decoded.tightened_bounds, [])
+        self.assertIsNone(decoded.splitmans)
+
+    def test_forced_bounds_from_split_list(self):
+
+        """
+        Tests that the forced bounds are only restricted for the split nodes.
+        """
+
+        bounds = ESIP(SimpleNN(activation="Relu"), input_shape=2)
+        forced_input_bounds = bounds.forced_bounds_from_split_list(self.split_list)
+
+        self.assertIsNone(forced_input_bounds[0])
+        self.assertEqual(forced_input_bounds[1][1, 0], 0)
+        self.assertEqual(forced_input_bounds[1][1, 1], np.inf)
+        self.assertTrue((forced_input_bounds[1][0] == np.array([-np.inf, np.inf])).all())
+        self.assertEqual(forced_input_bounds[3][0, 0], -np.inf)
+        self.assertEqual(forced_input_bounds[3][0, 1], -0.5)
+
+    def test_forced_bounds_from_tightened_bounds(self):
+
+        """
+        Tests that the tightened bounds are intersected with the split bounds.
+        """
+
+        bounds = ESIP(SimpleNN(activation="Relu"), input_shape=2)
+        tightened_bounds = [(2, 1, -1., 0.5), (2, 0, -2., 3.), (2, 0, -1., 4.)]
+        forced_input_bounds = bounds.forced_bounds_from_split_list(self.split_list, tightened_bounds)
+
+        self.assertTrue((forced_input_bounds[1][1] == np.array([0, 0.5])).all())
+        self.assertTrue((forced_input_bounds[1][0] == np.array([-1., 3.])).all())
+        self.assertEqual(forced_input_bounds[3][0, 1], -0.5)
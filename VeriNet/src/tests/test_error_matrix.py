@@ -0,0 +1,100 @@
+
+"""
+Unit-tests for the factored error matrix backend of ESIP
+"""
+
+import unittest
+import warnings
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from src.neural_networks.simple_nn import SimpleNN, SimpleNNConv2
+from src.neural_networks.verinet_nn import VeriNetNN
+from src.algorithm.esip import ESIP
+from src.algorithm.error_matrix import FactoredErrorMatrix, sum_error
+from src.algorithm.esip_util import sum_error_jit
+
+
+class TestErrorMatrix(unittest.TestCase):
+
+    def setUp(self):
+
+        warnings.filterwarnings("ignore", message="numpy.ufunc size changed")
+
+        torch.manual_seed(0)
+        self.model_fc = VeriNetNN([nn.Linear(4, 20), nn.ReLU(), nn.Linear(20, 20), nn.ReLU(),
+                                   nn.Linear(20, 20), nn.ReLU(), nn.Linear(20, 3)])
+        self.model_conv = VeriNetNN([nn.Conv2d(1, 2, 3, 2, 1), nn.ReLU(), nn.Conv2d(2, 2, 3, 1, 0), nn.ReLU(),
+                                     nn.Conv2d(2, 1, 1, 1, 0)])
+
+    def _assert_backends_equal(self, model, input_shape, input_constraints: np.array):
+
+        """
+        Calculates the bounds with the dense and the factored backend and checks that the results are equal.
+        """
+
+        dense = ESIP(model, input_shape=input_shape)
+        factored = ESIP(model, input_shape=input_shape, error_matrix_backend="factored")
+
+        self.assertTrue(dense.calc_bounds(input_constraints))
+        self.assertTrue(factored.calc_bounds(input_constraints))
+
+        for layer_num in range(dense.num_layers):
+            self.assertTrue(np.allclose(dense.bounds_concrete[layer_num], factored.bounds_concrete[layer_num],
+                                        atol=1e-5))
+            if dense.error[layer_num] is not None:
+                self.assertTrue(np.allclose(dense.error[layer_num], factored.error[layer_num], atol=1e-5))
+            self.assertTrue((dense._error_matrix_to_node_indices[layer_num] ==
+                             factored._error_matrix_to_node_indices[layer_num]).all())
+
+            factored_matrix = factored.error_matrix[layer_num]
+            if isinstance(factored_matrix, FactoredErrorMatrix):
+                factored_matrix = factored_matrix.toarray()
+            self.assertTrue(np.allclose(dense.error_matrix[layer_num], factored_matrix, atol=1e-5))
+
+        self.assertIsInstance(factored.error_matrix[-1], np.ndarray)
+
+    def test_backends_equal_fc(self):
+
+        """
+        Tests that the factored backend gives the same bounds as the dense backend for fully-connected networks.
+        """
+
+        input_constraints = np.array([[-1, 1], [-2, 2]], dtype=np.float32)
+        self._assert_backends_equal(SimpleNN(activation="Relu"), 2, input_constraints)
+
+        input_constraints = np.zeros((4, 2), dtype=np.float32)
+        input_constraints[:, 0], input_constraints[:, 1] = -0.5, 0.5
+        self._assert_backends_equal(self.model_fc, 4, input_constraints)
+
+    def test_backends_equal_conv(self):
+
+        """
+        Tests that the factored backend gives the same bounds as the dense backend for convolutional networks.
+        """
+
+        input_constraints = np.zeros((25, 2), dtype=np.float32)
+        input_constraints[:, 1] = 1
+        self._assert_backends_equal(SimpleNNConv2(), (1, 5, 5), input_constraints)
+        self._assert_backends_equal(self.model_conv, (1, 5, 5), input_constraints)
+
+    def test_sum_error(self):
+
+        """
+        Tests that the errors of the factored matrix are the same as for the dense matrix.
+        """
+
+        error_matrix = np.array([[1, -2], [3, 0], [-1, 1]], dtype=np.float32)
+        a_low = np.array([0.5, 0, 1])
+        err_idx = np.array([1, 2])
+        max_err = np.array([2, 0.5])
+
+        factored = FactoredErrorMatrix.from_relaxation(error_matrix, a_low, err_idx, max_err)
+        dense = factored.toarray()
+
+        self.assertEqual(factored.shape, (3, 4))
+        self.assertTrue((dense[:, :2] == a_low[:, np.newaxis] * error_matrix).all())
+        self.assertTrue((dense[:, 2:] == np.array([[0, 0], [2, 0], [0, 0.5]])).all())
+        self.assertTrue(np.allclose(sum_error(factored), sum_error_jit(dense)))
@@ -7,11 +7,14 @@ Author: Patrick Henriksen <patrick@henriksen.as>
 
 import torch
 import numpy as np
+import types
 import unittest
 import warnings
+from unittest import mock
 
 from src.neural_networks.simple_nn import SimpleNN, SimpleNNConv2, SimpleNNBatchNorm2D
 from src.algorithm.esip import ESIP
+from src.algorithm import esip_util
 from src.algorithm.mappings.piecewise_linear import Relu
 from src.algorithm.mappings.s_shaped import Sigmoid, Tanh
 from src.algorithm.mappings.layers import FC, Conv2d, BatchNorm2d
@@ -240,6 +243,154 @@ class TestNNBounds(unittest.TestCase):
                 self.assertLessEqual(bound_symb[-1][:, 0], res)
                 self.assertGreaterEqual(bound_symb[-1][:, 1], res)
 
+    def test_snapshots(self):
+
+        """
+        Tests that restoring a snapshot gives the stored layers and that the least recently used snapshot is evicted.
+        """
+
+        self.bounds_relu.calc_bounds(np.array([[-1, 1], [-2, 2]], dtype=np.float32))
+        stored = [arr.copy() for arr in self.bounds_relu.bounds_concrete[:3]]
+        self.bounds_relu.save_snapshot("parent", 3)
+
+        self.bounds_relu.calc_bounds(np.array([[0, 1], [0, 1]], dtype=np.float32))
+        self.assertEqual(self.bounds_relu.restore_snapshot("parent"), 3)
+        for layer_num in range(3):
+            self.assertTrue((self.bounds_relu.bounds_concrete[layer_num] == stored[layer_num]).all())
+        self.assertIsNone(self.bounds_relu.restore_snapshot("parent"))
+
+        bounds = ESIP(self.model_relu, input_shape=2, snapshot_cache_size=200)
+        bounds.calc_bounds(np.array([[-1, 1], [-2, 2]], dtype=np.float32))
+        bounds.save_snapshot("first", 2)
+        bounds.save_snapshot("second", 2)
+
+        self.assertIsNone(bounds.restore_snapshot("first"))
+        self.assertEqual(bounds.restore_snapshot("second"), 2)
+        self.assertEqual(bounds.snapshot_stats, {"hits": 1, "misses": 1, "evictions": 1})
+
+    def test_calc_bounds_batch(self):
+
+        """
+        Tests that the batched bounds of two sibling branches are equal to the bounds calculated separately.
+        """
+
+        input_constraints = np.array([[-1, 1], [-2, 2]], dtype=np.float32)
+        self.bounds_relu.calc_bounds(input_constraints)
+        self.bounds_relu.merge_current_bounds_into_forced()
+        parent_forced = self.bounds_relu.forced_input_bounds
+
+        forced_batch = [[arr.copy() for arr in parent_forced], [arr.copy() for arr in parent_forced]]
+        forced_batch[0][1][0, 1] = 0
+        forced_batch[1][1][0, 0] = 0
+
+        states = self.bounds_relu.calc_bounds_batch(input_constraints, forced_batch, from_layer=2)
+        self.assertIs(self.bounds_relu.forced_input_bounds, parent_forced)
+
+        for forced_input_bounds, state in zip(forced_batch, states):
+            bounds = ESIP(self.model_relu, input_shape=2)
+            bounds.calc_bounds(input_constraints)
+            bounds.forced_input_bounds = forced_input_bounds
+            bounds.calc_bounds(input_constraints, from_layer=2)
+
+            for layer_num in range(bounds.num_layers):
+                self.assertTrue(np.allclose(bounds.bounds_concrete[layer_num], state[0][layer_num]))
+                self.assertTrue(np.allclose(bounds.bounds_symbolic[layer_num], state[1][layer_num]))
+
+    def test_kernel_modes(self):
+
+        """
+        Tests that the parallel and vectorised kernels give the same results as the serial kernels.
+        """
+
+        np.random.seed(0)
+        input_bounds = np.sort(np.random.randn(30, 2), axis=1)
+        symbolic_bounds = np.random.randn(20, 31).astype(np.float32)
+        error_matrix = np.random.randn(20, 15).astype(np.float32)
+
+        concrete = esip_util.concretise_symbolic_bounds_jit(input_bounds, symbolic_bounds)
+        errors = esip_util.sum_error_jit(error_matrix)
+
+        try:
+            for mode in ["parallel", "vectorised"]:
+                esip_util.set_kernel_mode(mode)
+                self.assertTrue(np.allclose(esip_util.concretise_symbolic_bounds(input_bounds, symbolic_bounds),
+                                            concrete, atol=1e-5))
+                self.assertTrue(np.allclose(esip_util.sum_error(error_matrix), errors, atol=1e-5))
+        finally:
+            esip_util.set_kernel_mode("serial")
+
+    def test_kernel_mode_num_threads(self):
+
+        """
+        Tests that the number of threads is only set for the parallel kernels and that numba versions without
+        numba.set_num_threads() are supported.
+        """
+
+        old_numba = types.SimpleNamespace(config=esip_util.numba.config,
+                                          threading_layer=esip_util.numba.threading_layer)
+
+        try:
+            with mock.patch.object(esip_util, "numba", old_numba):
+                esip_util.set_kernel_mode("serial", num_threads=2)
+                esip_util.set_kernel_mode("parallel", num_threads=2)
+                self.assertEqual(esip_util.get_kernel_mode(), "parallel")
+
+            with mock.patch.object(esip_util.numba, "set_num_threads", create=True) as set_num_threads:
+                esip_util.set_kernel_mode("serial", num_threads=2)
+                set_num_threads.assert_not_called()
+                esip_util.set_kernel_mode("parallel", num_threads=1)
+                set_num_threads.assert_called_once_with(1)
+        finally:
+            esip_util.set_kernel_mode("serial")
+
+    def test_kernel_mode_threading_layer(self):
+
+        """
+        Tests that the parallel kernels select the fork-safe workqueue threading layer, unless the user chose a layer
+        or the parallel kernels were already launched.
+        """
+
+        not_launched = mock.Mock(side_effect=ValueError)
+
+        try:
+            with mock.patch.object(esip_util.numba.config, "THREADING_LAYER", "default"), \
+                    mock.patch.object(esip_util.numba, "threading_layer", not_launched):
+                esip_util.set_kernel_mode("serial")
+                self.assertEqual(esip_util.numba.config.THREADING_LAYER, "default")
+                esip_util.set_kernel_mode("parallel")
+                self.assertEqual(esip_util.numba.config.THREADING_LAYER, "workqueue")
+
+            with mock.patch.object(esip_util.numba.config, "THREADING_LAYER", "tbb"), \
+                    mock.patch.object(esip_util.numba, "threading_layer", not_launched):
+                esip_util.set_kernel_mode("parallel")
+                self.assertEqual(esip_util.numba.config.THREADING_LAYER, "tbb")
+
+            with mock.patch.object(esip_util.numba.config, "THREADING_LAYER", "default"), \
+                    mock.patch.object(esip_util.numba, "threading_layer", return_value="tbb"):
+                esip_util.set_kernel_mode("parallel")
+                self.assertEqual(esip_util.numba.config.THREADING_LAYER, "default")
+        finally:
+            esip_util.set_kernel_mode("serial")
+
+    def test_weighted_error_top_k(self):
+
+        """
+        Tests the fused weighted error kernel against the numpy version and the top-k selection against sorting.
+        """
+
+        np.random.seed(0)
+        error_matrix = np.random.randn(10, 50).astype(np.float32)
+        output_weights = np.random.rand(10, 2)
+        error_matrix[:, 10] = error_matrix[:, 20]
+
+        expected = (-np.minimum(error_matrix, 0) * output_weights[:, 0:1] +
+                    np.maximum(error_matrix, 0) * output_weights[:, 1:2]).sum(axis=0)
+
+        for k in [0, 1, 5, 50, 60]:
+            weighted_error, top_k = esip_util.weighted_error_top_k_jit(error_matrix, output_weights, k)
+            self.assertTrue(np.allclose(weighted_error, expected, atol=1e-5))
+            self.assertEqual(list(top_k), list(np.argsort(-weighted_error, kind="stable")[:k]))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,126 @@
+"""
+Unit-tests for the frontiers ordering the open branches of the VeriNetWorker
+"""
+
+import unittest
+import warnings
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from src.algorithm.frontier import BestFirstFrontier, HybridFrontier, get_frontier
+from src.algorithm.verinet_util import Branch, Status
+from src.algorithm.verinet_worker import VeriNetWorker
+from src.algorithm.verification_objectives import LocalRobustnessObjective
+from src.neural_networks.verinet_nn import VeriNetNN
+
+
+def _branch(depth: int, priority: float) -> Branch:
+
+    branch = Branch(depth, None, [])
+    branch.priority = priority
+
+    return branch
+
+
+class TestFrontier(unittest.TestCase):
+
+    def setUp(self):
+
+        warnings.filterwarnings("ignore", message="numpy.ufunc size changed")
+
+    def test_best_first(self):
+
+        """
+        Tests that the branch with the smallest priority is popped, the newest first for equal priorities, and that
+        popleft() returns the oldest branch.
+        """
+
+        branches = [_branch(0, None), _branch(1, 2.), _branch(1, 2.), _branch(2, -1.), _branch(2, 3.)]
+        frontier = BestFirstFrontier()
+        for branch in branches:
+            frontier.append(branch)
+
+        self.assertIs(frontier.popleft(), branches[0])
+        frontier.appendleft(branches[0])
+
+        self.assertEqual(len(frontier), 5)
+        self.assertEqual([frontier.pop() for _ in range(4)], [branches[0], branches[3], branches[2], branches[1]])
+        self.assertIs(frontier.popleft(), branches[4])
+        self.assertRaises(IndexError, frontier.pop)
+
+    def test_best_first_mixed(self):
+
+        """
+        Tests that mixed pop() and popleft() calls return the same branches as sorting the open branches, also after
+        the removed entries are dropped.
+        """
+
+        random = np.random.RandomState(0)
+        frontier = BestFirstFrontier()
+        open_branches = []
+
+        for _ in range(500):
+
+            if len(open_branches) == 0 or random.uniform() < 0.5:
+                branch = _branch(0, float(random.randint(5)))
+                frontier.append(branch)
+                open_branches.append(branch)
+            elif random.uniform() < 0.5:
+                self.assertIs(frontier.popleft(), open_branches.pop(0))
+            else:
+                best = min(range(len(open_branches)), key=lambda i: (open_branches[i].priority, -i))
+                self.assertIs(frontier.pop(), open_branches.pop(best))
+
+            self.assertEqual(len(frontier), len(open_branches))
+
+    def test_hybrid(self):
+
+        """
+        Tests that the hybrid frontier pops depth-first, except for every restart_interval pop.
+        """
+
+        branches = [_branch(1, 2.), _branch(1, -1.), _branch(2, 0.), _branch(2, 1.)]
+        frontier = HybridFrontier(restart_interval=2)
+        for branch in branches:
+            frontier.append(branch)
+
+        self.assertEqual([frontier.pop() for _ in range(4)], [branches[3], branches[1], branches[2], branches[0]])
+        self.assertRaises(ValueError, get_frontier, "unknown")
+
+    def test_common_depth(self):
+
+        splits = [{"layer": 1, "node": i, "split_x": 0., "upper": True} for i in range(3)]
+        other_split = {"layer": 1, "node": 1, "split_x": 0., "upper": False}
+
+        self.assertEqual(Branch.common_depth(splits, splits[:2]), 2)
+        self.assertEqual(Branch.common_depth(splits, [splits[0], other_split]), 1)
+        self.assertEqual(Branch.common_depth([], splits), 0)
+
+    def test_verify(self):
+
+        """
+        Tests that all frontiers verify a property that needs branching with the same number of branches.
+        """
+
+        torch.manual_seed(0)
+        model = VeriNetNN([nn.Linear(8, 32), nn.ReLU(), nn.Linear(32, 32), nn.ReLU(), nn.Linear(32, 3)])
+        model.eval()
+
+        x = np.random.RandomState(0).uniform(-1, 1, (7, 8)).astype(np.float32)[6]
+        correct_class = int(model(torch.Tensor(x).reshape(1, -1)).argmax())
+        input_bounds = np.zeros((8, 2), dtype=np.float32)
+        input_bounds[:, 0] = x - 0.17
+        input_bounds[:, 1] = x + 0.17
+
+        branches_explored = []
+        for frontier in ["dfs", "best_first", "hybrid"]:
+            solver = VeriNetWorker(model, LocalRobustnessObjective(correct_class, input_bounds, output_size=3),
+                                   verbose=False, strategy="default", frontier=frontier)
+
+            self.assertEqual(solver.verify(Branch(0, None, []), None, None, None, 0), Status.Safe)
+            branches_explored.append(solver.branches_explored)
+
+        self.assertGreater(branches_explored[0], 1)
+        self.assertEqual(len(set(branches_explored)), 1)
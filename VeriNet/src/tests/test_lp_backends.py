@@ -0,0 +1,203 @@
+"""
+Unit-tests for the LP backends
+"""
+
+import unittest
+import warnings
+from unittest import mock
+
+import numpy as np
+
+from src.algorithm.lp_backends import LPBackendNotAvailableException, create_lp_backend, grb
+from src.algorithm.lp_solver import LPSolver
+
+
+class TestLPBackends(unittest.TestCase):
+
+    def setUp(self):
+
+        warnings.filterwarnings("ignore", message="numpy.ufunc size changed")
+
+        self.backends = ["scipy"] if grb is None else ["scipy", "gurobi"]
+
+    def test_feasibility(self):
+
+        """
+        Tests that adding and removing constraints changes the feasibility as expected.
+        """
+
+        for name in self.backends:
+            backend = create_lp_backend(name, 3)
+            backend.set_bounds(np.arange(3), np.array([0, 0, -1]), np.array([1, 1, 1]))
+
+            constr = backend.add_constraint(np.array([0, 1]), np.array([1, 1]), ">=", 1.5)
+            self.assertTrue(backend.solve(), name)
+
+            values = backend.get_values()
+            self.assertGreaterEqual(values[0] + values[1], 1.5 - 1e-6, name)
+            self.assertTrue(((values >= np.array([0, 0, -1]) - 1e-6) & (values <= 1 + 1e-6)).all(), name)
+
+            infeasible = backend.add_constraint(np.array([0]), np.array([1]), "<=", 0.2)
+            self.assertFalse(backend.solve(), name)
+
+            backend.remove_constraint(infeasible)
+            backend.remove_constraint(constr)
+            backend.set_bounds(np.array([2]), np.array([0.5]), np.array([0.7]))
+            self.assertTrue(backend.solve(), name)
+            self.assertTrue(np.allclose(backend.get_bounds(np.array([2])), ([0.5], [0.7])), name)
+
+            constrs = backend.add_constraints(np.array([0, 1]), np.array([[1, 0], [1, 1]]), [">=", "<="],
+                                              np.array([0.8, 0.5]))
+            self.assertFalse(backend.solve(), name)
+            backend.remove_constraint(constrs[1])
+            self.assertTrue(backend.solve(), name)
+            self.assertGreaterEqual(backend.get_values()[0], 0.8 - 1e-6, name)
+
+    def test_solve_each(self):
+
+        """
+        Tests that solve_each() gives the same results as adding each constraint separately, for one and several
+        threads, and that the constraints aren't kept.
+        """
+
+        coeffs = np.array([[1, 1], [1, 0], [-1, 1]])
+        senses = [">=", "<=", ">="]
+        rhs = np.array([2.5, -0.5, 0.5])
+
+        for name in self.backends:
+            backend = create_lp_backend(name, 3)
+            backend.set_bounds(np.arange(3), np.zeros(3), np.ones(3))
+
+            for num_threads in [1, 2]:
+                results = backend.solve_each(np.array([0, 1]), coeffs, senses, rhs, num_threads=num_threads)
+
+                self.assertEqual([feasible for feasible, _ in results], [False, False, True], name)
+                self.assertIsNone(results[0][1], name)
+                self.assertGreaterEqual(results[2][1][1] - results[2][1][0], 0.5 - 1e-6, name)
+
+            self.assertTrue(backend.solve(), name)
+
+    def test_solve_each_repeated(self):
+
+        """
+        Tests that repeated solve_each() calls with several threads match one thread while the bounds and
+        constraints change between the calls.
+        """
+
+        rng = np.random.default_rng(0)
+
+        for name in self.backends:
+            backend = create_lp_backend(name, 4)
+            backend.set_bounds(np.arange(4), -np.ones(4), np.ones(4))
+            constrs = []
+
+            for _ in range(50):
+                lower = rng.uniform(-1, 0, 4)
+                backend.set_bounds(np.arange(4), lower, lower + rng.uniform(0.1, 1, 4))
+                if len(constrs) > 2 or (len(constrs) > 0 and rng.random() < 0.5):
+                    backend.remove_constraint(constrs.pop(0))
+                else:
+                    constrs.append(backend.add_constraint(np.arange(4), rng.uniform(-1, 1, 4), "<=",
+                                                          rng.uniform(-0.5, 0.5)))
+
+                coeffs = rng.uniform(-1, 1, (6, 3))
+                senses = list(rng.choice([">=", "<="], 6))
+                rhs = rng.uniform(-1, 1, 6)
+
+                expected = backend.solve_each(np.arange(3), coeffs, senses, rhs, num_threads=1)
+                results = backend.solve_each(np.arange(3), coeffs, senses, rhs, num_threads=3)
+
+                self.assertEqual([feasible for feasible, _ in results], [feasible for feasible, _ in expected], name)
+
+    def test_minimize(self):
+
+        """
+        Tests minimize() with and without constraints, and that an infeasible problem returns None.
+        """
+
+        for name in self.backends:
+            backend = create_lp_backend(name, 3)
+            backend.set_bounds(np.arange(3), np.array([0, -1, 0]), np.array([1, 1, 1]))
+
+            self.assertAlmostEqual(backend.minimize(np.array([0, 1]), np.array([1, 2])), -2, places=5, msg=name)
+
+            constr = backend.add_constraint(np.array([1]), np.array([1]), ">=", 0.5)
+            self.assertAlmostEqual(backend.minimize(np.array([0, 1]), np.array([1, 2])), 1, places=5, msg=name)
+
+            backend.add_constraint(np.array([0]), np.array([1]), ">=", 2)
+            self.assertIsNone(backend.minimize(np.array([0, 1]), np.array([1, 2])), name)
+
+            backend.remove_constraint(constr)
+            self.assertFalse(backend.solve(), name)
+
+    def test_unknown_backend(self):
+
+        with self.assertRaises(ValueError):
+            create_lp_backend("unknown", 1)
+
+    @unittest.skipIf(grb is None, "gurobipy not installed")
+    def test_gurobi_version(self):
+
+        """
+        Tests that gurobipy versions without the matrix API are rejected with a clear error.
+        """
+
+        with mock.patch.object(grb.gurobi, "version", return_value=(8, 1, 1)):
+            self.assertRaises(LPBackendNotAvailableException, create_lp_backend, "gurobi", 3)
+
+    @unittest.skipIf(grb is None, "gurobipy not installed")
+    def test_warm_start(self):
+
+        """
+        Tests that a stored basis warm starts the gurobi backend, also after adding a constraint.
+        """
+
+        np.random.seed(0)
+        backend = create_lp_backend("gurobi", 20)
+        backend.set_bounds(np.arange(20), -np.ones(20), np.ones(20))
+        for _ in range(10):
+            backend.add_constraint(np.arange(20), np.random.randn(20), ">=", 0.5)
+
+        self.assertTrue(backend.solve())
+        basis = backend.get_basis()
+        self.assertIsNotNone(basis)
+
+        backend.reset_basis()
+        backend.set_basis(basis)
+        self.assertTrue(backend.solve())
+        self.assertEqual(backend.iterations, 0)
+
+        backend.add_constraint(np.arange(20), np.random.randn(20), ">=", 1.0)
+        backend.reset_basis()
+        self.assertTrue(backend.solve())
+        cold_iterations = backend.iterations
+
+        backend.reset_basis()
+        backend.set_basis(basis)
+        self.assertTrue(backend.solve())
+        self.assertLess(backend.iterations, cold_iterations)
+
+    @unittest.skipIf(grb is None, "gurobipy not installed")
+    def test_solver_basis_reset(self):
+
+        """
+        Tests that the LPSolver without warm start keeps the basis of the backend between solves unless it is
+        explicitly reset.
+        """
+
+        np.random.seed(0)
+        solver = LPSolver(20, 1)
+        solver.backend.set_bounds(np.arange(21), -np.ones(21), np.ones(21))
+        for _ in range(10):
+            solver.backend.add_constraint(np.arange(20), np.random.randn(20), ">=", 0.5)
+
+        self.assertFalse(solver.warm_start)
+        self.assertTrue(solver.solve())
+        self.assertGreater(solver.backend.iterations, 0)
+
+        self.assertTrue(solver.solve())
+        self.assertEqual(solver.backend.iterations, 0)
+
+        solver.reset_basis()
+        self.assertTrue(solver.solve())
+        self.assertGreater(solver.backend.iterations, 0)
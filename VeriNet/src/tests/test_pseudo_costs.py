@@ -0,0 +1,112 @@
+"""
+Unit-tests for the pseudo-cost branching strategy
+"""
+
+import multiprocessing as mp
+import os
+import tempfile
+import unittest
+import warnings
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from src.algorithm.esip import ESIP
+from src.algorithm.pseudo_costs import PSEUDO_COST_SLOTS, PSEUDO_COST_STATS_SIZE, PseudoCosts
+from src.algorithm.splitmans import Splitmans
+from src.algorithm.strategist import Strategist
+from src.algorithm.verification_objectives import LocalRobustnessObjective
+from src.neural_networks.verinet_nn import VeriNetNN
+
+
+class TestPseudoCosts(unittest.TestCase):
+
+    def setUp(self):
+
+        warnings.filterwarnings("ignore", message="numpy.ufunc size changed")
+
+    def test_costs(self):
+
+        """
+        Tests the mean improvements and that nodes without observations get the mean of the observed nodes.
+        """
+
+        pseudo_costs = PseudoCosts()
+        pseudo_costs.record(1, 0, 1.)
+        pseudo_costs.record(1, 0, 0.5)
+        pseudo_costs.record(3, 2, 0.25)
+
+        costs = pseudo_costs.costs(np.array([[1, 0], [3, 2], [3, 5]]))
+        self.assertTrue(np.allclose(costs, [0.75, 0.25, 0.5]))
+        self.assertTrue(np.allclose(PseudoCosts().costs(np.array([[1, 0]])), [0]))
+
+    def test_colliding_nodes(self):
+
+        """
+        Tests that nodes hashed to the same slot, and nodes of large layers, keep separate statistics.
+        """
+
+        pseudo_costs = PseudoCosts()
+        first_slot = pseudo_costs._first_slots(pseudo_costs._keys_of(1, 0))[0]
+        nodes = np.arange(1, 10**6)
+        colliding = nodes[pseudo_costs._first_slots(pseudo_costs._keys_of(np.ones_like(nodes), nodes)) == first_slot]
+        self.assertGreater(len(colliding), 1)
+
+        pseudo_costs.record(1, 0, 1.)
+        pseudo_costs.record(1, colliding[0], 0.)
+        pseudo_costs.record(1, PSEUDO_COST_SLOTS, 0.5)
+        pseudo_costs.record(2, 0, 0.5)
+
+        costs = pseudo_costs.costs(np.array([[1, 0], [1, colliding[0]], [1, colliding[1]], [2, PSEUDO_COST_SLOTS]]))
+        self.assertTrue(np.allclose(costs, [1., 0., 0.5, 0.5]))
+        self.assertEqual(len(np.unique(pseudo_costs._slots(np.array([1, 1, 1, 2]),
+                                                           np.array([0, colliding[0], PSEUDO_COST_SLOTS, 0])))), 4)
+
+    def test_shared_and_persisted(self):
+
+        """
+        Tests that the statistics are shared through the array and survive a save and load.
+        """
+
+        shared_stats = mp.Array("d", PSEUDO_COST_STATS_SIZE)
+        PseudoCosts(shared_stats=shared_stats).record(1, 4, 0.5)
+        pseudo_costs = PseudoCosts(shared_stats=shared_stats)
+        self.assertEqual(pseudo_costs.num_observations, 1)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "pseudo_costs.npy")
+            pseudo_costs.save(path)
+
+            loaded = PseudoCosts()
+            self.assertTrue(loaded.load(path))
+            self.assertFalse(loaded.load(os.path.join(tmp_dir, "missing.npy")))
+
+        self.assertTrue(np.allclose(loaded.costs(np.array([[1, 4]])), [0.5]))
+
+    def test_strategy(self):
+
+        """
+        Tests that a node with a large pseudo-cost is preferred over the node with the largest weighted error.
+        """
+
+        torch.manual_seed(0)
+        model = VeriNetNN([nn.Linear(4, 16), nn.ReLU(), nn.Linear(16, 3)])
+        model.eval()
+
+        input_bounds = np.zeros((4, 2), dtype=np.float32)
+        input_bounds[:, 0] = -1
+        input_bounds[:, 1] = 1
+        objective = LocalRobustnessObjective(0, input_bounds, output_size=3)
+
+        bounds = ESIP(model, input_shape=4)
+        bounds.calc_bounds(objective.input_bounds_flat)
+        candidates = Strategist.largest_error_split_node(bounds, 2,
+                                                         output_weights=objective.output_refinement_weights(bounds))
+
+        pseudo_costs = PseudoCosts(weight=10.)
+        self.assertEqual(tuple(pseudo_costs(bounds, objective, Splitmans())), tuple(candidates[0]))
+
+        pseudo_costs.record(*candidates[0], 0.)
+        pseudo_costs.record(*candidates[1], 1.)
+        self.assertEqual(tuple(pseudo_costs(bounds, objective, Splitmans())), tuple(candidates[1]))
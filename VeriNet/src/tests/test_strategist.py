@@ -0,0 +1,176 @@
+"""
+Unit-tests for the lookahead and memory-based branching strategies and the registered strategies
+"""
+
+import unittest
+import warnings
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from src.algorithm.esip import ESIP
+from src.algorithm.splitmans import Splitmans
+from src.algorithm.strategist import STRATEGIES, Strategist
+from src.algorithm.verification_objectives import LocalRobustnessObjective
+from src.neural_networks.verinet_nn import VeriNetNN
+
+
+class TestLookahead(unittest.TestCase):
+
+    def setUp(self):
+
+        warnings.filterwarnings("ignore", message="numpy.ufunc size changed")
+
+        torch.manual_seed(11)
+        self.model = VeriNetNN([nn.Linear(4, 16), nn.ReLU(), nn.Linear(16, 16), nn.ReLU(), nn.Linear(16, 3)])
+        self.model.eval()
+
+        input_bounds = np.zeros((4, 2), dtype=np.float32)
+        input_bounds[:, 0] = -1
+        input_bounds[:, 1] = 1
+        self.objective = LocalRobustnessObjective(0, input_bounds, output_size=3)
+
+    def _worst_case_margin(self, layer: int, node: int) -> float:
+
+        """
+        Calculates the worst-case margin of the two halves of a split with a separate ESIP object.
+        """
+
+        margins = []
+        for bound_idx in (0, 1):
+            bounds = ESIP(self.model, input_shape=4)
+            bounds.calc_bounds(self.objective.input_bounds_flat)
+
+            lower, upper = bounds.bounds_concrete[layer - 1][node]
+            bounds.forced_input_bounds[layer - 1] = bounds.bounds_concrete[layer - 1].copy()
+            bounds.forced_input_bounds[layer - 1][node, bound_idx] = bounds.mappings[layer].split_point(lower, upper)
+
+            if bounds.calc_bounds(self.objective.input_bounds_flat):
+                margins.append(self.objective.output_margin(bounds.bounds_concrete[-1]))
+            else:
+                margins.append(np.inf)
+
+        return min(margins)
+
+    def test_output_margin(self):
+
+        output_bounds = np.array([[1, 2], [-1, 0.5], [0, 0.8]])
+        self.assertAlmostEqual(self.objective.output_margin(output_bounds), 0.2)
+
+        self.objective._safe_classes = [1, 2]
+        self.assertEqual(self.objective.output_margin(output_bounds), np.inf)
+
+    def test_lookahead(self):
+
+        """
+        Tests that the candidate with the best worst-case margin is selected, which for this network isn't the
+        candidate with the largest error effect selected by the default strategy.
+        """
+
+        bounds = ESIP(self.model, input_shape=4)
+        bounds.calc_bounds(self.objective.input_bounds_flat)
+
+        output_weights = self.objective.output_refinement_weights(bounds)
+        candidates = Strategist.largest_error_split_node(bounds, 4, output_weights=output_weights)
+        self.assertEqual(len(candidates), 4)
+
+        split = Strategist.lookahead(bounds, self.objective, Splitmans(), num_candidates=4)
+
+        margins = [self._worst_case_margin(layer, node) for layer, node in candidates]
+        self.assertIn(tuple(split), [tuple(candidate) for candidate in candidates])
+        self.assertAlmostEqual(self._worst_case_margin(*split), max(margins), places=4)
+        self.assertNotEqual(tuple(split), tuple(candidates[0]))
+
+
+class TestMemoryStrategies(unittest.TestCase):
+
+    def setUp(self):
+
+        warnings.filterwarnings("ignore", message="numpy.ufunc size changed")
+
+        torch.manual_seed(11)
+        self.model = VeriNetNN([nn.Linear(4, 16), nn.ReLU(), nn.Linear(16, 16), nn.ReLU(), nn.Linear(16, 3)])
+        self.model.eval()
+
+        input_bounds = np.zeros((4, 2), dtype=np.float32)
+        input_bounds[:, 0] = -1
+        input_bounds[:, 1] = 1
+        self.objective = LocalRobustnessObjective(0, input_bounds, output_size=3)
+
+    def test_weighted_error_cached(self):
+
+        """
+        Tests that the weighted error is reused until the final error matrix is recalculated.
+        """
+
+        bounds = ESIP(self.model, input_shape=4)
+        bounds.calc_bounds(self.objective.input_bounds_flat)
+        output_weights = self.objective.output_refinement_weights(bounds)
+
+        weighted_error = Strategist.weighted_error(bounds, output_weights=output_weights)
+        self.assertIs(Strategist.weighted_error(bounds, output_weights=output_weights.copy()), weighted_error)
+        self.assertIsNot(Strategist.weighted_error(bounds, output_weights=output_weights * 2), weighted_error)
+
+        bounds.calc_bounds(self.objective.input_bounds_flat)
+        self.assertIsNot(Strategist.weighted_error(bounds, output_weights=output_weights), weighted_error)
+
+    def test_refresh_memory(self):
+
+        """
+        Tests that a remembered node that was split in an earlier branch is dropped instead of being popped again.
+        """
+
+        bounds = ESIP(self.model, input_shape=4)
+        bounds.calc_bounds(self.objective.input_bounds_flat)
+        candidates = Strategist.largest_error_split_node(
+            bounds, 3, output_weights=self.objective.output_refinement_weights(bounds))
+
+        splitmans = Splitmans(memory_size=3)
+        split = Strategist.pop_first(bounds, self.objective, splitmans)
+        self.assertEqual(tuple(split), tuple(candidates[0]))
+
+        # Split the second candidate, which makes it stable in this branch
+        layer, node = candidates[1]
+        bounds.forced_input_bounds[layer - 1] = bounds.bounds_concrete[layer - 1].copy()
+        bounds.forced_input_bounds[layer - 1][node, 0] = 0
+        self.assertTrue(bounds.calc_bounds(self.objective.input_bounds_flat, from_layer=layer))
+
+        self.assertFalse(Strategist.valid_splits(bounds, self.objective, candidates[1:2])[0])
+        self.assertEqual(tuple(Strategist.pop_first(bounds, self.objective, splitmans)), tuple(candidates[2]))
+        self.assertNotIn(tuple(candidates[1]), [tuple(node) for node in splitmans.memory])
+
+    def test_no_unstable_nodes(self):
+
+        """
+        Tests that all registered strategies return None instead of failing when no node is unstable.
+        """
+
+        input_bounds = np.zeros((4, 2), dtype=np.float32)
+        input_bounds[:, 1] = 1e-6
+        objective = LocalRobustnessObjective(0, input_bounds, output_size=3)
+
+        bounds = ESIP(self.model, input_shape=4)
+        bounds.calc_bounds(objective.input_bounds_flat)
+        self.assertEqual(bounds.error_matrix[-1].shape[1], 0)
+
+        for name, strategy in STRATEGIES.items():
+            self.assertIsNone(strategy(bounds, objective, Splitmans(memory_size=3)), name)
+
+    def test_best_by_layer_no_unstable_nodes(self):
+
+        """
+        Tests that the semi-hierarchical strategy keeps its layer and returns None when no node is unstable.
+        """
+
+        input_bounds = np.zeros((4, 2), dtype=np.float32)
+        input_bounds[:, 1] = 1e-6
+        objective = LocalRobustnessObjective(0, input_bounds, output_size=3)
+
+        bounds = ESIP(self.model, input_shape=4)
+        bounds.calc_bounds(objective.input_bounds_flat)
+        self.assertEqual(bounds._error_matrix_to_node_indices[-1].shape[0], 0)
+
+        splitmans = Splitmans(layer=1)
+        self.assertIsNone(Strategist.get_best_by_layer(bounds, objective, splitmans))
+        self.assertEqual(splitmans.layer, 1)
@@ -0,0 +1,56 @@
+"""
+Unit-tests for the bandit based strategy selection
+"""
+
+import multiprocessing as mp
+import unittest
+import warnings
+
+from src.algorithm.strategy_bandit import StrategyBandit
+
+
+class TestStrategyBandit(unittest.TestCase):
+
+    def setUp(self):
+
+        warnings.filterwarnings("ignore", message="numpy.ufunc size changed")
+
+    def test_select(self):
+
+        """
+        Tests that each arm is tried once and that the arm with the best rewards is selected afterwards.
+        """
+
+        bandit = StrategyBandit(arms=("default", "best_by_layer"), exploration=0.1)
+
+        self.assertEqual(bandit.select(), 0)
+        bandit.reward(0, 1.)
+        self.assertEqual(bandit.select(), 1)
+        bandit.reward(1, 0.)
+
+        for _ in range(10):
+            arm = bandit.select()
+            self.assertEqual(arm, 0)
+            bandit.reward(arm, 1.)
+
+        self.assertEqual(bandit.stats["default"], {"count": 11, "mean_reward": 1.})
+        self.assertEqual(bandit.stats["best_by_layer"], {"count": 1, "mean_reward": 0.})
+
+    def test_merge(self):
+
+        """
+        Tests that the statistics of several bandits are merged through the shared array.
+        """
+
+        shared_stats = mp.Array("d", 4)
+        bandits = [StrategyBandit(arms=("default", "best_by_layer"), shared_stats=shared_stats, merge_interval=2)
+                   for _ in range(2)]
+
+        bandits[0].reward(0, 1.)
+        self.assertEqual(shared_stats[0], 0)
+        bandits[0].reward(1, 0.)
+        bandits[1].reward(0, 1.)
+        bandits[1].merge()
+
+        self.assertEqual(list(shared_stats), [2, 1, 2, 0])
+        self.assertEqual(bandits[1].stats["default"], {"count": 2, "mean_reward": 1.})
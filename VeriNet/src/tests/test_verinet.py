@@ -0,0 +1,435 @@
+"""
+Unit-tests for the VeriNet main process
+"""
+
+import time
+import types
+import unittest
+import warnings
+from unittest import mock
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from src.algorithm.verinet import VeriNet
+from src.algorithm.verinet_util import Branch, Status
+from src.algorithm.verification_objectives import LocalRobustnessObjective
+from src.neural_networks.verinet_nn import VeriNetNN
+
+
+def _stub_verify(solver: VeriNet, safe_eps: float, unsafe_eps: float, calls: list, sleep: float = 0.):
+
+    """
+    Returns a replacement for solver.verify() which is Safe for epsilons up to safe_eps, Unsafe with the counter
+    example [eps] from unsafe_eps and times out in between. The epsilon and timeout of each call is added to calls.
+    """
+
+    def verify(objective, timeout: float = 3600, **kwargs) -> Status:
+
+        calls.append((objective.eps, timeout))
+        time.sleep(sleep)
+
+        if objective.eps <= safe_eps:
+            solver._status.value = Status.Safe.value
+            solver._counter_example = None
+        elif objective.eps >= unsafe_eps:
+            solver._status.value = Status.Unsafe.value
+            solver._counter_example = np.array([objective.eps])
+        else:
+            solver._status.value = Status.Undecided.value
+            solver._counter_example = None
+
+        return solver.status
+
+    return verify
+
+
+def _create_objective(eps: float):
+    return types.SimpleNamespace(eps=eps)
+
+
+class _ListInbox:
+
+    """
+    An in-process replacement for the worker inboxes, see BranchQueue in branch_transport.py.
+    """
+
+    def __init__(self, items: list = None):
+        self.items = [] if items is None else items
+
+    def put(self, branch: Branch, job_id: int):
+        self.items.append((job_id, branch))
+
+    def get(self) -> tuple:
+        return self.items.pop(0)
+
+
+class TestVeriNetWorkers(unittest.TestCase):
+
+    """
+    Tests the worker processes and their bookkeeping on a small network.
+    """
+
+    def setUp(self):
+
+        warnings.filterwarnings("ignore", message="numpy.ufunc size changed")
+
+        torch.manual_seed(2)
+        self.model = VeriNetNN([nn.Linear(4, 16), nn.ReLU(), nn.Linear(16, 16), nn.ReLU(), nn.Linear(16, 3)])
+        self.model.eval()
+
+        # (input, epsilon) pairs which are Safe or Unsafe after branching
+        self.inputs = np.random.RandomState(0).uniform(-1, 1, (10, 4)).astype(np.float32)
+        self.cases = [(3, 0.45), (5, 0.25), (3, 0.5), (8, 0.3)]
+
+    def _objective(self, i: int, eps: float) -> LocalRobustnessObjective:
+
+        x = self.inputs[i]
+        correct_class = int(self.model(torch.Tensor(x).reshape(1, -1)).argmax())
+        input_bounds = np.zeros((4, 2), dtype=np.float32)
+        input_bounds[:, 0] = x - eps
+        input_bounds[:, 1] = x + eps
+
+        return LocalRobustnessObjective(correct_class, input_bounds, output_size=3)
+
+    def _verify_cases(self, solver: VeriNet) -> list:
+
+        """
+        Returns (status, branches_explored, counter_example) for each case.
+        """
+
+        results = []
+        for i, eps in self.cases:
+            status = solver.verify(self._objective(i, eps), timeout=60, verbose=False)
+            results.append((status, solver.branches_explored, solver.counter_example))
+
+        return results
+
+    def test_pool_reuse(self):
+
+        """
+        Tests that repeated calls to verify() on one started pool of two workers give the same statuses as one
+        worker, with valid counter examples, and that close() stops the workers.
+        """
+
+        with VeriNet(self.model, max_procs=1) as solver:
+            expected = self._verify_cases(solver)
+
+        self.assertFalse(solver.is_running)
+        self.assertEqual([status for status, _, _ in expected],
+                         [Status.Safe, Status.Safe, Status.Unsafe, Status.Unsafe])
+        self.assertTrue(all(branches > 1 for _, branches, _ in expected))
+
+        solver = VeriNet(self.model, max_procs=2)
+        solver.start()
+        workers = list(solver._workers)
+
+        try:
+            for _ in range(2):
+
+                results = self._verify_cases(solver)
+
+                self.assertTrue(solver.is_running)
+                self.assertEqual(solver._workers, workers)
+
+                for (i, eps), (status, branches, counter_example), (expected_status, expected_branches,
+                                                                     expected_counter_example) in \
+                        zip(self.cases, results, expected):
+
+                    self.assertEqual(status, expected_status)
+                    self.assertGreater(branches, 1)
+
+                    if status == Status.Unsafe:
+                        # The workers race for the counter example, so it may come from another branch
+                        self.assertTrue(solver._is_counter_example(self._objective(i, eps), counter_example))
+                        self.assertTrue(solver._is_counter_example(self._objective(i, eps), expected_counter_example))
+                    else:
+                        # The whole branch tree is explored, however it is divided between the workers
+                        self.assertEqual(branches, expected_branches)
+                        self.assertIsNone(counter_example)
+
+            # A Safe job only finishes when all workers are idle. After an Unsafe job, a worker may still be marked
+            # busy by a donation it dropped, which is reset by the next job.
+            self.assertEqual(solver.verify(self._objective(*self.cases[0]), timeout=60, verbose=False), Status.Safe)
+            self.assertEqual(solver._num_idle.value, 2)
+            self.assertEqual(list(solver._idle_flags), [1, 1])
+
+        finally:
+            solver.close()
+
+        self.assertFalse(solver.is_running)
+        self.assertTrue(all(worker.exitcode == 0 for worker in workers))
+
+        # verify() on a closed pool starts and closes its own workers
+        self.assertEqual(solver.verify(self._objective(*self.cases[0]), timeout=60, verbose=False), Status.Safe)
+        self.assertFalse(solver.is_running)
+
+    def test_portfolio_logger(self):
+
+        """
+        Tests that the racers of a portfolio share the log file handler instead of adding one each.
+        """
+
+        solver = VeriNet(self.model, max_procs=2, portfolio=["default", "best_by_layer"])
+        num_handlers = len(solver.logger.handlers)
+        racers = solver._get_racers()
+
+        self.assertEqual(len(racers), 2)
+        self.assertTrue(all(racer.logger is solver.logger for racer in racers.values()))
+        self.assertEqual(len(solver.logger.handlers), num_handlers)
+        self.assertEqual(len(VeriNet(self.model, max_procs=1).logger.handlers), num_handlers)
+
+    def _bookkeeping_solver(self, inbox_items: list = None) -> VeriNet:
+
+        """
+        Returns a VeriNet with the state of worker 0 of two workers, without starting any processes.
+        """
+
+        solver = VeriNet(self.model, max_procs=2)
+        solver._worker_id = 0
+        solver._job_id = 2
+        solver._inboxes = [_ListInbox(inbox_items), _ListInbox()]
+        solver._worker_results = {}
+
+        return solver
+
+    def test_finished_subtree(self):
+
+        """
+        Tests that finished subtrees mark the worker idle and that the job finishes when all workers are idle.
+        """
+
+        solver = self._bookkeeping_solver()
+
+        solver._finished_subtree(3, 10, Status.Safe)
+        self.assertEqual(list(solver._idle_flags), [1, 0])
+        self.assertEqual(solver._num_idle.value, 1)
+        self.assertFalse(solver._finished_flag.is_set())
+
+        solver._worker_id = 1
+        solver._finished_subtree(5, 7, Status.Safe)
+        self.assertEqual(solver._num_idle.value, 2)
+        self.assertTrue(solver._finished_flag.is_set())
+        self.assertEqual(solver.max_depth, 5)
+        self.assertEqual(solver.branches_explored, 17)
+        self.assertEqual(solver.status, Status.Undecided)
+
+    def test_finished_subtree_unsafe(self):
+
+        """
+        Tests that an Unsafe subtree finishes the job and stores the counter example.
+        """
+
+        solver = self._bookkeeping_solver()
+        counter_example = np.zeros(4)
+
+        solver._finished_subtree(3, 10, Status.Unsafe, counter_example)
+
+        self.assertTrue(solver._finished_flag.is_set())
+        self.assertEqual(solver.status, Status.Unsafe)
+        self.assertIs(solver._worker_results["counter_example"], counter_example)
+
+    def test_put_branch(self):
+
+        """
+        Tests that branches are only donated to idle workers, tagged with the current job id.
+        """
+
+        solver = self._bookkeeping_solver()
+        branch = Branch(1, None, [])
+
+        self.assertFalse(solver._needs_branches())
+        self.assertFalse(solver._put_branch(branch))
+
+        solver._idle_flags[1] = 1
+        solver._num_idle.value = 1
+        self.assertTrue(solver._needs_branches())
+        self.assertTrue(solver._put_branch(branch))
+
+        self.assertEqual(solver._inboxes[1].items, [(2, branch)])
+        self.assertEqual(list(solver._idle_flags), [0, 0])
+        self.assertEqual(solver._num_idle.value, 0)
+
+        # Donations after the job finished are accepted and dropped
+        solver._finished_flag.set()
+        self.assertTrue(solver._put_branch(branch))
+        self.assertEqual(len(solver._inboxes[1].items), 1)
+
+    def test_run_job(self):
+
+        """
+        Tests that the worker drops branches donated for a previous job, verifies the branches of the current job and
+        finishes the job at the poison pill.
+        """
+
+        branch = Branch(1, None, [])
+        solver = self._bookkeeping_solver([(1, Branch(2, None, [])), (2, branch), (1, None), (2, None)])
+        solver._active_procs.value = 1
+
+        worker_solver = mock.Mock(max_depth=4, branches_explored=6, status=Status.Safe, counter_example=None)
+        worker_solver.bounds.snapshot_stats = None
+
+        solver._run_job(worker_solver)
+
+        self.assertEqual(worker_solver.verify.call_count, 1)
+        self.assertIs(worker_solver.verify.call_args[0][0], branch)
+        self.assertEqual(solver._inboxes[0].items, [])
+        self.assertEqual(solver.branches_explored, 6)
+        self.assertEqual(list(solver._idle_flags), [1, 0])
+        self.assertEqual(solver._active_procs.value, 0)
+        self.assertTrue(solver._all_children_done.is_set())
+
+
+class TestVeriNetSearch(unittest.TestCase):
+
+    """
+    Tests the epsilon searches of VeriNet with verify() replaced by a stub, see _stub_verify().
+    """
+
+    def setUp(self):
+
+        warnings.filterwarnings("ignore", message="numpy.ufunc size changed")
+
+        torch.manual_seed(0)
+        self.solver = VeriNet(VeriNetNN([nn.Linear(4, 8), nn.ReLU(), nn.Linear(8, 3)]), max_procs=1)
+        self.calls = []
+
+        # The counter example [eps] is a counter example for all epsilons >= eps
+        self.solver._is_counter_example = lambda objective, x: objective.eps >= x[0]
+
+    def test_epsilon_ladder(self):
+
+        """
+        Tests that a Safe result is inferred for all smaller epsilons, an Unsafe result and its counter example for
+        all larger epsilons and that the inferred epsilons aren't verified.
+        """
+
+        epsilons = [0.8, 0.1, 0.5, 0.3, 0.7, 0.2, 0.6, 0.4]
+        self.solver.verify = _stub_verify(self.solver, safe_eps=0.35, unsafe_eps=0.55, calls=self.calls)
+
+        results = self.solver.verify_epsilon_ladder(_create_objective, epsilons, verbose=False)
+        verified = [eps for eps, _ in self.calls]
+
+        self.assertEqual(sorted(results), sorted(epsilons))
+        self.assertEqual(len(set(verified)), len(verified))
+        self.assertLess(len(verified), len(epsilons))
+
+        for eps, result in results.items():
+
+            expected = Status.Safe if eps <= 0.35 else (Status.Unsafe if eps >= 0.55 else Status.Undecided)
+            self.assertEqual(result["status"], expected)
+
+            if result["implied_by"] is None:
+                self.assertIn(eps, verified)
+                continue
+
+            self.assertNotIn(eps, verified)
+            self.assertIn(result["implied_by"], verified)
+            self.assertEqual(results[result["implied_by"]]["status"], result["status"])
+
+            if result["status"] == Status.Safe:
+                self.assertGreater(result["implied_by"], eps)
+                self.assertIsNone(result["counter_example"])
+            else:
+                self.assertLess(result["implied_by"], eps)
+                self.assertIs(result["counter_example"], results[result["implied_by"]]["counter_example"])
+
+    def test_epsilon_ladder_known_status(self):
+
+        """
+        Tests that the known statuses are used for inference without verifying these epsilons again, and that known
+        Undecided statuses are verified.
+        """
+
+        epsilons = [0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8]
+        known_status = {0.3: Status.Safe, 0.4: Status.Undecided, 0.6: Status.Unsafe}
+        self.solver.verify = _stub_verify(self.solver, safe_eps=0.35, unsafe_eps=0.55, calls=self.calls)
+
+        results = self.solver.verify_epsilon_ladder(_create_objective, epsilons, known_status=known_status,
+                                                    verbose=False)
+
+        self.assertEqual(sorted(eps for eps, _ in self.calls), [0.4, 0.5])
+
+        for eps in [0.3, 0.6]:
+            self.assertEqual(results[eps]["status"], known_status[eps])
+            self.assertIsNone(results[eps]["implied_by"])
+        for eps in [0.1, 0.2]:
+            self.assertEqual(results[eps]["status"], Status.Safe)
+            self.assertEqual(results[eps]["implied_by"], 0.3)
+        for eps in [0.7, 0.8]:
+            self.assertEqual(results[eps]["status"], Status.Unsafe)
+            self.assertEqual(results[eps]["implied_by"], 0.6)
+        for eps in [0.4, 0.5]:
+            self.assertEqual(results[eps]["status"], Status.Undecided)
+
+    def test_certified_radius(self):
+
+        """
+        Tests that Safe probes increase the lower bound, Unsafe probes set attack_upper and that probes timing out
+        shrink the search interval without changing attack_upper.
+        """
+
+        self.solver.verify = _stub_verify(self.solver, safe_eps=0.3, unsafe_eps=0.6, calls=self.calls)
+
+        lower, attack_upper = self.solver.certified_radius(_create_objective, max_epsilon=1., tolerance=1e-3)
+        probes = [eps for eps, _ in self.calls]
+
+        # The probe at max_epsilon is the only Unsafe one, all later probes are below 0.6
+        self.assertEqual(probes[0], 1.)
+        self.assertTrue(all(eps < 0.6 for eps in probes[1:]))
+        self.assertEqual(attack_upper, 1.)
+
+        self.assertEqual(lower, max(eps for eps in probes if eps <= 0.3))
+        self.assertLessEqual(lower, 0.3)
+        self.assertGreater(lower, 0.3 - 1e-3)
+
+    def test_certified_radius_safe(self):
+
+        """
+        Tests that the search stops after one probe if max_epsilon is Safe.
+        """
+
+        self.solver.verify = _stub_verify(self.solver, safe_eps=1., unsafe_eps=2., calls=self.calls)
+
+        self.assertEqual(self.solver.certified_radius(_create_objective, max_epsilon=1.), (1., np.inf))
+        self.assertEqual(len(self.calls), 1)
+
+    def test_certified_radius_time_budget(self):
+
+        """
+        Tests that the search stops when the time budget is used and that each probe gets the remaining budget as
+        timeout.
+        """
+
+        self.solver.verify = _stub_verify(self.solver, safe_eps=0., unsafe_eps=2., calls=self.calls, sleep=0.05)
+
+        start = time.time()
+        lower, attack_upper = self.solver.certified_radius(_create_objective, max_epsilon=1., tolerance=1e-6,
+                                                           time_budget=0.2)
+
+        self.assertLess(time.time() - start, 0.2 + 0.1)
+        self.assertEqual((lower, attack_upper), (0., np.inf))
+        self.assertLess(len(self.calls), 10)
+
+        timeouts = [timeout for _, timeout in self.calls]
+        self.assertTrue(all(0 < timeout <= 0.2 for timeout in timeouts))
+        self.assertEqual(timeouts, sorted(timeouts, reverse=True))
+
+    def test_certified_radii(self):
+
+        """
+        Tests that the workers are started once for all inputs and closed afterwards.
+        """
+
+        self.solver.verify = _stub_verify(self.solver, safe_eps=0.3, unsafe_eps=0.6, calls=self.calls)
+
+        with mock.patch.object(self.solver, "start") as start, mock.patch.object(self.solver, "close") as close:
+            radii = self.solver.certified_radii([_create_objective, _create_objective], max_epsilon=1.,
+                                                tolerance=1e-3)
+
+        self.assertEqual(start.call_count, 1)
+        self.assertEqual(close.call_count, 1)
+        self.assertEqual(len(radii), 2)
+        self.assertEqual(radii[0], radii[1])
+        self.assertEqual(radii[0][1], 1.)
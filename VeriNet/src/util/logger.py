@@ -14,6 +14,9 @@ def get_logger(level, name: str, directory: str, filename: str):
     """
     Returns a logger saving log to file
 
+    The file handler is only added the first time the logger is requested for the file, so creating several objects
+    using the same logger, like the racers of a VeriNet portfolio, doesn't write each line several times.
+
     Args:
         level       (Logger level): Severity of the logger
         name:       (String):       Name of the logger
@@ -28,7 +31,13 @@ def get_logger(level, name: str, directory: str, filename: str):
 
     logger = logging.getLogger(name)
     logger.setLevel(level)
-    handler = logging.FileHandler(directory + filename)
+
+    path = os.path.abspath(directory + filename)
+    for handler in logger.handlers:
+        if isinstance(handler, logging.FileHandler) and handler.baseFilename == path:
+            return logger
+
+    handler = logging.FileHandler(path)
     handler.setLevel(level)
     formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     handler.setFormatter(formatter)